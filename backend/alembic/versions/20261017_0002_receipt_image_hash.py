@@ -0,0 +1,29 @@
+"""receipt image hash for near-duplicate detection
+
+Revision ID: 20261017_0002
+Revises: 20250823_0001
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '20261017_0002'
+down_revision: Union[str, None] = '20250823_0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('receipts', sa.Column('image_hash', sa.String(), nullable=True))
+    op.add_column('receipts', sa.Column('duplicate_of', sa.String(), nullable=True))
+    op.create_index('ix_receipts_image_hash', 'receipts', ['image_hash'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_receipts_image_hash', table_name='receipts')
+    op.drop_column('receipts', 'duplicate_of')
+    op.drop_column('receipts', 'image_hash')
@@ -0,0 +1,27 @@
+"""receipt content hash for reusing the results of identical uploads
+
+Revision ID: 20261017_0003
+Revises: 20261017_0002
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '20261017_0003'
+down_revision: Union[str, None] = '20261017_0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('receipts', sa.Column('content_hash', sa.String(), nullable=True))
+    op.create_index('ix_receipts_content_hash', 'receipts', ['content_hash'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_receipts_content_hash', table_name='receipts')
+    op.drop_column('receipts', 'content_hash')
@@ -0,0 +1,21 @@
+from fastapi import APIRouter
+# AUTHENTICATION DISABLED FOR DEVELOPMENT
+# from api.auth import get_current_firebase_user
+from typing import Dict, Any
+from services.ocr import ocr_service
+
+router = APIRouter(
+    prefix="/api/v1/admin",
+    tags=["admin"],
+)
+
+
+@router.get("/ocr/strategy-stats")
+def get_ocr_strategy_stats() -> Dict[str, Any]:
+    """
+    Historical OCR strategy statistics: per image-feature bucket, how often each
+    preprocessor/PSM candidate was tried and how often it won.
+    """
+    if ocr_service.strategy_stats is None:
+        return {"enabled": False, "buckets": {}}
+    return {"enabled": True, **ocr_service.strategy_stats.snapshot()}
@@ -2,22 +2,29 @@
 # from services.ocr import OCRService
 # svc = OCRService()
 # text = svc.extract_text_from_image(receipt_image_path_or_bytes)
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status, Query, Body, Form
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status, Query, Body, Form, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse
 # AUTHENTICATION DISABLED FOR DEVELOPMENT
 # from api.auth import get_current_firebase_user
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import select, func, or_, and_
 from database.session import get_db
 from models.entities import Receipt
-from services.ocr import ocr_service
+from services.image_hash import DEFAULT_MAX_DISTANCE, DuplicateIndex, content_hash, hamming, image_hash
+from services.ocr import Deadline, OCRResult, ReceiptSegment, ocr_service
 from services.parser import ParserService
+import asyncio
 import uuid
 import io
+import logging
+import os
 import shutil
 from pathlib import Path
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(
     prefix="/api/v1/receipts",
     tags=["receipts"],
@@ -27,6 +34,31 @@ router = APIRouter(
 UPLOADS_DIR = Path("uploads")
 UPLOADS_DIR.mkdir(exist_ok=True)
 
+# Seconds the OCR of one file of a batch may take
+BATCH_ITEM_TIMEOUT = float(os.getenv("OCR_BATCH_ITEM_TIMEOUT", "60"))
+# Seconds the OCR of a single upload may take before the best result so far is used
+REQUEST_OCR_TIMEOUT = float(os.getenv("OCR_REQUEST_TIMEOUT", "60"))
+# How often a running OCR checks whether the client is still connected
+DISCONNECT_POLL_INTERVAL = 0.5
+
+# Image hashes of stored receipts, loaded from the database on first use. Uploads
+# within DUPLICATE_MAX_DISTANCE bits of one are flagged as probable duplicates;
+# receipts printed from one template are that close too, so only identical
+# content (the same content hash) ever reuses a stored result.
+duplicate_index = DuplicateIndex(int(os.getenv("DUPLICATE_MAX_DISTANCE", str(DEFAULT_MAX_DISTANCE))))
+DUPLICATES_QUERY = Query(
+    "flag",
+    pattern="^(reuse|flag|ignore)$",
+    description="Duplicate uploads: flag near-duplicates of a stored receipt (stored with status "
+                "probable_duplicate and duplicate_of set), reuse the stored OCR and parse result for an "
+                "identical file (anything else is OCRed), or ignore matches",
+)
+SPLIT_QUERY = Query(
+    False,
+    description="An image may hold several receipts, e.g. a flatbed scan: each one found is cropped, "
+                "OCRed in parallel and stored as its own receipt. PDFs are always one receipt",
+)
+
 # Error model for consistent error responses
 def error_response(code: str, message: str, details: Any = None) -> Dict[str, Any]:
     response = {"error": {"code": code, "message": message}}
@@ -35,53 +67,233 @@ def error_response(code: str, message: str, details: Any = None) -> Dict[str, An
     return response
 
 
-# New endpoint for multiple file upload and batch processing
-@router.post("/batch", status_code=status.HTTP_201_CREATED)
-async def create_receipts_batch(
-    files: List[UploadFile] = File(...),
-    db: Session = Depends(get_db)
-) -> Dict[str, Any]:
+def run_ocr(file_path: Path, fast: bool = False, deadline: Optional[Deadline] = None) -> OCRResult:
+    """OCR an uploaded file; failures yield an empty result, as with extract_text_from_image."""
+    try:
+        return ocr_service.extract(str(file_path), fast=fast, deadline=deadline)
+    except Exception as e:
+        logger.error(f"OCR failed for {file_path.name}: {e}")
+        return OCRResult()
+
+
+async def run_until_disconnect(request: Request, deadline: Deadline, func, *args, **kwargs):
     """
-    Upload multiple receipt images, run OCR and parser, and return batch results as JSON.
-    Returns individual success/error status for each file.
+    Run blocking OCR work in the threadpool with ``deadline`` passed to it, and
+    cancel the deadline if the client disconnects so the worker is freed early.
     """
-    allowed_types = {"image/png", "image/jpeg", "image/jpg", "image/webp", "application/pdf"}
-    max_size = 10 * 1024 * 1024  # 10 MB per file
-    max_files = 10  # Maximum files per batch
-    parser = ParserService()
-    results = []
-    errors = []
+    task = asyncio.ensure_future(run_in_threadpool(func, *args, deadline=deadline, **kwargs))
+    while not task.done():
+        done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+        if not done and not deadline.cancelled and await request.is_disconnected():
+            logger.info("Client disconnected, cancelling OCR")
+            deadline.cancel()
+    return task.result()
+
+
+def find_duplicate(db: Session, hash_value: Optional[str]) -> Optional[Tuple[Receipt, int]]:
+    """Stored receipt whose image is a near-duplicate of ``hash_value``, with the distance in bits."""
+    if not hash_value:
+        return None
+    duplicate_index.load(lambda: db.execute(
+        select(Receipt.id, Receipt.image_hash).where(Receipt.image_hash.is_not(None))
+    ).all())
+    match = duplicate_index.nearest(hash_value)
+    if match is None:
+        return None
+    original = db.get(Receipt, match[0])
+    if original is None:
+        # Deleted by another worker process
+        duplicate_index.discard(match[0])
+        return find_duplicate(db, hash_value)
+    return original, match[1]
+
+
+def find_identical(db: Session, digest: str) -> Optional[Receipt]:
+    """A stored receipt with exactly the content of ``digest`` (see ``content_hash``)."""
+    return db.execute(select(Receipt).where(Receipt.content_hash == digest).limit(1)).scalars().first()
+
+
+def find_match(db: Session, duplicates: str, hash_value: Optional[str], digest: str) -> Optional[Tuple[Receipt, int]]:
+    """
+    Stored receipt an upload duplicates under the ``duplicates`` policy, with the
+    distance in bits: a near-duplicate for "flag", an identical upload for "reuse".
+    """
+    if duplicates == "flag":
+        return find_duplicate(db, hash_value)
+    if duplicates == "reuse":
+        original = find_identical(db, digest)
+        return (original, 0) if original is not None else None
+    return None
 
-    # Limit number of files
-    files_to_process = files[:max_files]
-    if len(files) > max_files:
-        errors.append({"error": f"Only first {max_files} files will be processed"})
 
-    for file in files_to_process:
-        if not file or not file.filename:
-            errors.append({"filename": None, "error": "No file uploaded"})
-            continue
-        if file.content_type not in allowed_types:
-            errors.append({"filename": file.filename, "error": f"File type {file.content_type} not allowed"})
+def copy_receipt(
+    original: Receipt, filename: str, mime_type: Optional[str], hash_value: Optional[str], digest: str
+) -> Receipt:
+    """New receipt for an identical upload, reusing the parse result of ``original`` without OCR."""
+    return Receipt(
+        id=str(uuid.uuid4()),
+        vendor=original.vendor,
+        date=original.date,
+        amount=original.amount,
+        currency=original.currency,
+        category=original.category,
+        gstin=original.gstin,
+        invoice_number=original.invoice_number,
+        cgst=original.cgst,
+        sgst=original.sgst,
+        igst=original.igst,
+        hsn_codes=original.hsn_codes,
+        tax_amount=original.tax_amount,
+        status="needs_review",
+        filename=filename,
+        mime_type=mime_type,
+        extracted=original.extracted,
+        image_hash=hash_value,
+        content_hash=digest,
+        duplicate_of=original.id,
+    )
+
+
+def ocr_summary(result: OCRResult) -> Dict[str, Any]:
+    """How the OCR text was produced, for auditing routing decisions."""
+    return {
+        "strategy": result.strategy,
+        "confidence": round(result.confidence, 1),
+        "candidates_tried": result.candidates_tried,
+        "partial": result.partial,
+        "deadline_hit": result.deadline_hit,
+        "triage": result.triage,
+    }
+
+
+async def process_uploads(
+    request: Request,
+    saved: List[Tuple[UploadFile, Path]],
+    duplicates: str,
+    db: Session,
+    split: bool,
+    timeout: float,
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    OCR, parse and store saved uploads, returning (results, errors) with one entry
+    per receipt. With ``split`` every image is first cut into the receipts it holds
+    (``segment_receipts``) and each one becomes its own receipt; an image holding a
+    single receipt, and any PDF, is OCRed whole. Duplicates of stored receipts, or of an earlier
+    receipt of the upload, are stored flagged or reused without OCR (see ``duplicates``).
+    """
+    # One item per receipt: (upload, saved file, segment or None for the whole file)
+    items: List[Tuple[UploadFile, Path, Optional[ReceiptSegment]]] = []
+    errors: List[Dict[str, Any]] = []
+    for file, file_path in saved:
+        if not split:
+            items.append((file, file_path, None))
             continue
         try:
-            file.file.seek(0, io.SEEK_END)
-            size = file.file.tell()
-            file.file.seek(0)
-        except Exception:
-            size = 0
-        if size > max_size:
-            errors.append({"filename": file.filename, "error": "File too large (max 10MB)"})
+            segments = await run_in_threadpool(ocr_service.segment_receipts, file_path)
+        except Exception as e:
+            file_path.unlink()
+            errors.append({"success": False, "filename": file.filename, "error": str(e)})
             continue
+        if len(segments) < 2:
+            items.append((file, file_path, None))
+        else:
+            items.extend((file, file_path, segment) for segment in segments)
+
+    # The saved file is shared by the receipts cut from it, so it is only removed once none of them was stored
+    def discard(position: int) -> None:
+        file_path, segment = items[position][1], items[position][2]
+        if segment is None and file_path.exists():
+            file_path.unlink()
 
-        # Save file
-        file_path = UPLOADS_DIR / f"{uuid.uuid4()}_{file.filename}"
-        try:
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
+    def source(position: int):
+        _, file_path, segment = items[position]
+        return str(file_path) if segment is None else segment.image
+
+    # Duplicates: position -> (stored receipt or position of an earlier item, distance)
+    hashes, digests = await run_in_threadpool(lambda: (
+        [image_hash(source(position)) for position in range(len(items))],
+        [content_hash(source(position)) for position in range(len(items))],
+    ))
+    matches: Dict[int, Tuple[Any, int]] = {}
+    for position, hash_value in enumerate(hashes):
+        match = find_match(db, duplicates, hash_value, digests[position])
+        if match is None and duplicates == "flag" and hash_value:
+            earlier = [
+                (hamming(int(hash_value, 16), int(hashes[other], 16)), other)
+                for other in range(position) if hashes[other] and other not in matches
+            ]
+            close = [(distance, other) for distance, other in earlier if distance <= duplicate_index.max_distance]
+            match = (min(close)[1], min(close)[0]) if close else None
+        elif match is None and duplicates == "reuse":
+            same = [other for other in range(position) if digests[other] == digests[position] and other not in matches]
+            match = (same[0], 0) if same else None
+        if match is not None:
+            matches[position] = match
+
+    # OCR processing, all items but reused ones concurrently with a timeout per item
+    ocr_positions = [position for position in range(len(items)) if duplicates != "reuse" or position not in matches]
+    deadline = Deadline()
+    ocr_items = await run_until_disconnect(
+        request, deadline, ocr_service.extract_batch, [source(position) for position in ocr_positions], timeout=timeout,
+    )
+    if deadline.cancelled:
+        # The client is gone: store nothing, not even the duplicates that needed no OCR
+        logger.info(f"Client disconnected, discarding {len(items)} receipt(s)")
+        for file_path in {file_path for _, file_path, _ in items}:
+            if file_path.exists():
+                file_path.unlink()
+        errors.extend({
+            "success": False,
+            "filename": file.filename,
+            "error": "Cancelled: the client disconnected",
+            "segment": segment.describe() if segment else None,
+        } for file, _, segment in items)
+        return [], errors
+    ocr_by_position = dict(zip(ocr_positions, ocr_items))
+    parser = ParserService()
+    results: List[Dict[str, Any]] = []
+    created: Dict[int, Receipt] = {}
 
-            # OCR processing
-            text = ocr_service.extract_text_from_image(str(file_path))
+    for position, (file, file_path, segment) in enumerate(items):
+        try:
+            duplicate_of = None
+            if position in matches:
+                original, distance = matches[position]
+                if isinstance(original, int):
+                    if original not in created and duplicates == "reuse":
+                        raise RuntimeError(f"Duplicate of {items[original][0].filename}, which failed")
+                    original = created.get(original)
+                if original is not None:
+                    duplicate_of = {"id": original.id, "distance": distance}
+            if duplicate_of is not None and duplicates == "reuse":
+                receipt = copy_receipt(original, file.filename, file.content_type, hashes[position], digests[position])
+                db.add(receipt)
+                db.commit()
+                db.refresh(receipt)
+                duplicate_index.add(receipt.id, receipt.image_hash)
+                created[position] = receipt
+                results.append({
+                    "success": True,
+                    "id": receipt.id,
+                    "filename": file.filename,
+                    "vendor": receipt.vendor,
+                    "date": receipt.date,
+                    "amount": receipt.amount,
+                    "currency": receipt.currency,
+                    "category": receipt.category,
+                    "gstin": receipt.gstin,
+                    "status": receipt.status,
+                    "extracted": receipt.extracted or {},
+                    "ocr": None,
+                    "duplicate_of": duplicate_of,
+                    "segment": segment.describe() if segment else None,
+                })
+                continue
+
+            ocr_item = ocr_by_position[position]
+            if not ocr_item.ok:
+                raise RuntimeError(f"OCR failed: {ocr_item.error}")
+            text = ocr_item.text
             parsed = parser.parse(text)
 
             # Clean amount for database
@@ -103,15 +315,20 @@ async def create_receipts_batch(
                 igst=float(parsed["igst"]) if parsed.get("igst") else None,
                 hsn_codes=parsed.get("hsn_codes"),
                 tax_amount=None,
-                status="needs_review",
+                status="needs_review" if duplicate_of is None else "probable_duplicate",
                 filename=file.filename,
                 mime_type=file.content_type,
-                extracted=parsed
+                extracted=parsed,
+                image_hash=hashes[position],
+                content_hash=digests[position],
+                duplicate_of=duplicate_of["id"] if duplicate_of else None,
             )
 
             db.add(receipt)
             db.commit()
             db.refresh(receipt)
+            duplicate_index.add(receipt.id, receipt.image_hash)
+            created[position] = receipt
 
             results.append({
                 "success": True,
@@ -124,19 +341,88 @@ async def create_receipts_batch(
                 "category": receipt.category,
                 "gstin": receipt.gstin,
                 "status": receipt.status,
-                "extracted": receipt.extracted or {}
+                "extracted": receipt.extracted or {},
+                "ocr": ocr_summary(ocr_item.result),
+                "duplicate_of": duplicate_of,
+                "segment": segment.describe() if segment else None,
             })
 
         except Exception as e:
             # Clean up file on error
-            if file_path.exists():
-                file_path.unlink()
+            discard(position)
             errors.append({
                 "success": False,
                 "filename": file.filename,
-                "error": str(e)
+                "error": str(e),
+                "segment": segment.describe() if segment else None,
             })
 
+    stored = {items[position][1] for position in created}
+    for file_path in {file_path for _, file_path, segment in items if segment is not None} - stored:
+        file_path.unlink()
+    return results, errors
+
+
+# New endpoint for multiple file upload and batch processing
+@router.post("/batch", status_code=status.HTTP_201_CREATED)
+async def create_receipts_batch(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    duplicates: str = DUPLICATES_QUERY,
+    split: bool = SPLIT_QUERY,
+    db: Session = Depends(get_db)
+) -> Dict[str, Any]:
+    """
+    Upload multiple receipt images, run OCR and parser, and return batch results as JSON.
+    Returns individual success/error status for each file. Duplicates of stored
+    receipts, or of an earlier file of the batch, are stored flagged (the default) or,
+    when identical, reuse the earlier result without OCR (see ``duplicates``).
+    With ``split=true`` an image holding several receipts yields one result per receipt,
+    each with its ``segment`` (pixel box).
+    """
+    allowed_types = {"image/png", "image/jpeg", "image/jpg", "image/webp", "application/pdf"}
+    max_size = 10 * 1024 * 1024  # 10 MB per file
+    max_files = 10  # Maximum files per batch
+    errors = []
+
+    # Limit number of files
+    files_to_process = files[:max_files]
+    if len(files) > max_files:
+        errors.append({"error": f"Only first {max_files} files will be processed"})
+
+    saved = []
+    for file in files_to_process:
+        if not file or not file.filename:
+            errors.append({"filename": None, "error": "No file uploaded"})
+            continue
+        if file.content_type not in allowed_types:
+            errors.append({"filename": file.filename, "error": f"File type {file.content_type} not allowed"})
+            continue
+        try:
+            file.file.seek(0, io.SEEK_END)
+            size = file.file.tell()
+            file.file.seek(0)
+        except Exception:
+            size = 0
+        if size > max_size:
+            errors.append({"filename": file.filename, "error": "File too large (max 10MB)"})
+            continue
+
+        # Save file
+        file_path = UPLOADS_DIR / f"{uuid.uuid4()}_{file.filename}"
+        try:
+            with open(file_path, "wb") as buffer:
+                shutil.copyfileobj(file.file, buffer)
+        except Exception as e:
+            if file_path.exists():
+                file_path.unlink()
+            errors.append({"success": False, "filename": file.filename, "error": str(e)})
+            continue
+        saved.append((file, file_path))
+
+    results, item_errors = await process_uploads(request, saved, duplicates, db, split, BATCH_ITEM_TIMEOUT)
+    errors.extend(item_errors)
+
     return {
         "total": len(files_to_process),
         "successful": len(results),
@@ -149,11 +435,22 @@ async def create_receipts_batch(
 # Single file upload endpoint
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_receipt(
+    request: Request,
     file: UploadFile = File(...),
+    fast: bool = Query(False, description="Only OCR the header and totals (vendor, date, GSTIN, total); the result is partial"),
+    duplicates: str = DUPLICATES_QUERY,
+    split: bool = SPLIT_QUERY,
     db: Session = Depends(get_db)
 ) -> Dict[str, Any]:
     """
     Upload a single receipt image, run OCR and parser, and return the result.
+    With ``fast=true`` the item table is not OCRed and the response is marked partial.
+    A near-duplicate of a stored receipt is OCRed and stored with status
+    ``probable_duplicate`` and ``duplicate_of`` set, for review. With
+    ``duplicates=reuse`` an identical file reuses the stored result without OCR
+    (``duplicate_of`` is set) and anything else is OCRed as a new receipt.
+    With ``split=true`` an image may hold several receipts and the response lists
+    one result per receipt, as the batch endpoint does (``fast`` is ignored).
     """
     allowed_types = {"image/png", "image/jpeg", "image/jpg", "image/webp", "application/pdf"}
     max_size = 10 * 1024 * 1024  # 10 MB
@@ -176,10 +473,61 @@ async def create_receipt(
     file_path = UPLOADS_DIR / f"{uuid.uuid4()}_{file.filename}"
     with open(file_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
+
+    if split:
+        results, errors = await process_uploads(request, [(file, file_path)], duplicates, db, True, REQUEST_OCR_TIMEOUT)
+        return {
+            "filename": file.filename,
+            "total": len(results) + len(errors),
+            "successful": len(results),
+            "failed": len(errors),
+            "results": results,
+            "errors": errors,
+        }
     
+    hash_value, digest = await run_in_threadpool(lambda: (image_hash(file_path), content_hash(file_path)))
+    match = find_match(db, duplicates, hash_value, digest)
+    duplicate_of = None
+    if match is not None:
+        original, distance = match
+        duplicate_of = {"id": original.id, "distance": distance}
+    if duplicate_of is not None and duplicates == "reuse":
+        receipt = copy_receipt(original, file.filename, file.content_type, hash_value, digest)
+        db.add(receipt)
+        db.commit()
+        db.refresh(receipt)
+        duplicate_index.add(receipt.id, receipt.image_hash)
+        logger.info(f"{file.filename} is identical to receipt {original.id}, OCR skipped")
+        return {
+            "id": receipt.id,
+            "vendor": receipt.vendor,
+            "date": receipt.date,
+            "amount": receipt.amount,
+            "currency": receipt.currency,
+            "category": receipt.category,
+            "gstin": receipt.gstin,
+            "tax_amount": receipt.tax_amount,
+            "status": receipt.status,
+            "filename": receipt.filename,
+            "mime_type": receipt.mime_type,
+            "extracted": receipt.extracted or {},
+            "ocr_text": None,
+            "partial": False,
+            "ocr": None,
+            "duplicate_of": duplicate_of,
+        }
+
+    # Run OCR
+    deadline = Deadline(REQUEST_OCR_TIMEOUT)
+    ocr_result = await run_until_disconnect(request, deadline, run_ocr, file_path, fast=fast)
+    if deadline.cancelled:
+        # The client is gone: do not store a receipt from a partial or empty OCR result
+        logger.info(f"Client disconnected, discarding {file.filename}")
+        file_path.unlink()
+        raise HTTPException(status_code=499, detail=error_response("CLIENT_DISCONNECTED", "OCR cancelled: the client disconnected"))
+
     try:
-        # Run OCR
-        text = ocr_service.extract_text_from_image(str(file_path))
+        text = ocr_result.text
         
         # Parse the extracted text
         parser = ParserService()
@@ -204,15 +552,19 @@ async def create_receipt(
             igst=float(parsed["igst"]) if parsed.get("igst") else None,
             hsn_codes=parsed.get("hsn_codes"),
             tax_amount=parsed.get("tax_amount"),
-            status="needs_review",
+            status="needs_review" if duplicate_of is None else "probable_duplicate",
 filename=file.filename,
             mime_type=file.content_type,
-            extracted=parsed
+            extracted=parsed,
+            image_hash=hash_value,
+            content_hash=digest,
+            duplicate_of=duplicate_of["id"] if duplicate_of else None,
         )
         
         db.add(receipt)
         db.commit()
         db.refresh(receipt)
+        duplicate_index.add(receipt.id, receipt.image_hash)
         
         return {
             "id": receipt.id,
@@ -227,7 +579,10 @@ filename=file.filename,
             "filename": receipt.filename,
             "mime_type": receipt.mime_type,
             "extracted": receipt.extracted or {},
-            "ocr_text": text
+            "ocr_text": text,
+            "partial": ocr_result.partial,
+            "ocr": ocr_summary(ocr_result),
+            "duplicate_of": duplicate_of,
         }
     
     except Exception as e:
@@ -365,4 +720,5 @@ async def delete_receipt(
         raise HTTPException(status_code=404, detail=error_response("NOT_FOUND", f"Receipt with ID {id} not found"))
     db.delete(obj)
     db.commit()
+    duplicate_index.discard(id)
     return None
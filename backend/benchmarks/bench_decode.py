@@ -0,0 +1,137 @@
+"""
+Large photo benchmark, on synthetic phone photo JPEGs with an EXIF rotation: a
+receipt filling half the frame and a small one on a mostly empty desk.
+
+For each photo it reports:
+  - the loaders alone: the previous one (full PIL decode, RGB copy, BGR
+    conversion, then a resize to the OCR width) against the reduced-resolution
+    grayscale loader;
+  - ``OCRService.extract`` end to end: time, peak memory, the service's decode
+    and resize timings, the receipt crop and resize factor, and the largest
+    image (in pixels) sent to Tesseract, which is what text-height scaling can
+    blow up on large photos.
+
+Without the tesseract binary the Tesseract calls are recorded but not run; they
+return no words, so every candidate is tried and the preprocessing is timed in
+full. Peak memory is traced with tracemalloc, which sees numpy allocations and
+Pillow's Python-side buffers but not its internal decode buffer, so real peaks
+are somewhat larger than reported.
+
+Run from the backend directory:
+    python -m benchmarks.bench_decode [--width 4000] [--height 3000] [--runs 5]
+"""
+
+import argparse
+import io
+import json
+import shutil
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from benchmarks.bench_ocr import TimedEngine
+from benchmarks.corpus import render_receipt
+from services.ocr import OCRService, _autorotate_image, _load_image, _resize_to_optimal_dpi
+from services.ocr_engine import _DATA_KEYS
+
+OPTIMAL_WIDTH = 1000
+
+
+class DryRunEngine:
+    """Stands in for Tesseract when the binary is missing: every call finds no words."""
+
+    name = "dry-run"
+
+    def image_to_data(self, image: np.ndarray, config: str, timeout: float = 0):
+        return {key: [] for key in _DATA_KEYS}
+
+    def image_to_string(self, image: np.ndarray, config: str, timeout: float = 0) -> str:
+        return ""
+
+
+def make_photo(width: int, height: int, receipt_width: int) -> bytes:
+    """A receipt on a grey desk, stored sideways with EXIF orientation 6 like a phone photo."""
+    receipt, _ = render_receipt(0, width=receipt_width)
+    desk = np.full((width, height), 90, dtype=np.uint8)
+    top, left = (width - receipt.shape[0]) // 2, (height - receipt.shape[1]) // 2
+    desk[top:top + receipt.shape[0], left:left + receipt.shape[1]] = receipt
+    noise = np.random.default_rng(0).normal(0, 4, desk.shape)
+    photo = cv2.cvtColor(np.clip(desk + noise, 0, 255).astype(np.uint8), cv2.COLOR_GRAY2RGB)
+    # Stored rotated by 90 degrees; orientation 6 tells viewers to turn it back
+    stored = Image.fromarray(np.ascontiguousarray(np.rot90(photo, 1)))
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    buffer = io.BytesIO()
+    stored.save(buffer, "JPEG", quality=90, exif=exif)
+    return buffer.getvalue()
+
+
+def legacy_load(data: bytes) -> np.ndarray:
+    pil_img = _autorotate_image(Image.open(io.BytesIO(data)))
+    bgr = cv2.cvtColor(np.array(pil_img.convert("RGB")), cv2.COLOR_RGB2BGR)
+    return _resize_to_optimal_dpi(bgr, OPTIMAL_WIDTH)
+
+
+def reduced_load(data: bytes) -> np.ndarray:
+    gray, _ = _load_image(data, OPTIMAL_WIDTH, grayscale=True)
+    return _resize_to_optimal_dpi(gray, OPTIMAL_WIDTH)
+
+
+def timed(func, data: bytes, runs: int):
+    """(last output, mean milliseconds over ``runs`` calls, traced peak MB of one more call)."""
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        output = func(data)
+        times.append((time.perf_counter() - started) * 1000)
+    tracemalloc.start()
+    func(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return output, round(float(np.mean(times)), 1), round(peak / 2 ** 20, 1)
+
+
+def measure(loader, data: bytes, runs: int) -> dict:
+    image, mean_ms, peak_mb = timed(loader, data, runs)
+    return {"mean_ms": mean_ms, "peak_mb": peak_mb, "output_shape": list(image.shape)}
+
+
+def measure_extract(data: bytes, runs: int) -> dict:
+    service = OCRService()
+    engine = TimedEngine(service.engine if shutil.which("tesseract") else DryRunEngine())
+    service.engine = engine
+    result, mean_ms, peak_mb = timed(service.extract, data, runs)
+    largest = max(engine.calls, key=lambda call: call["shape"][0] * call["shape"][1])["shape"]
+    return {
+        "engine": engine.name,
+        "mean_ms": mean_ms,
+        "peak_mb": peak_mb,
+        "decode_ms": result.timings.get("decode"),
+        "resize_ms": result.timings.get("resize"),
+        "crop": result.preprocessing.get("crop"),
+        "resize_factor": result.preprocessing.get("resize_factor"),
+        "tesseract_calls": len(engine.calls) // (runs + 1),
+        "largest_tesseract_image": largest,
+        "largest_tesseract_megapixels": round(largest[0] * largest[1] / 1e6, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    results = {}
+    for name, receipt_width in (("large_receipt", args.height // 2), ("small_receipt", args.height // 5)):
+        data = make_photo(args.width, args.height, receipt_width)
+        results[name] = {
+            "photo": f"{args.width}x{args.height} JPEG, {len(data) / 2 ** 20:.1f} MB, receipt {receipt_width} px wide",
+            "legacy_load": measure(legacy_load, data, args.runs),
+            "reduced_grayscale_load": measure(reduced_load, data, args.runs),
+            "extract": measure_extract(data, args.runs),
+        }
+    print(json.dumps(results, indent=2))
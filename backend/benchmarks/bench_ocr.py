@@ -0,0 +1,260 @@
+"""
+End-to-end OCR benchmark on the synthetic corpus: every variant of
+``corpus.VARIANTS`` (clean, rotation, blur, noise, perspective, thermal, pdf) for
+a range of seeds, with stage timings and field accuracy against ground truth.
+
+For each sample it reports:
+  - decode and resize, as timed by the OCR service;
+  - triage and every stage of the preprocessing graph (``_PreprocessGraph``)
+    the service runs for all pipelines, shared stages counted once, plus the
+    deskew of each pipeline;
+  - the full ``OCRService.extract`` with every Tesseract call timed (config and
+    milliseconds), plus the service's own stage timings;
+  - per-field accuracy of ``ParserService`` on the OCR text, and on the ground
+    truth text as the parser's upper bound.
+
+The OCR part needs the tesseract binary (and pdftoppm for the pdf variant); what
+cannot run is reported as skipped. Results are written as JSON together with the
+commit and OCR settings, and ``--compare`` prints the change against an earlier run.
+
+Run from the backend directory:
+    python -m benchmarks.bench_ocr [--seeds 5] [--variants clean,blur] [--ladder 0.6,1.0]
+                                   [--output bench.json] [--compare old.json]
+"""
+
+import argparse
+import json
+import platform
+import shutil
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from benchmarks.corpus import VARIANTS, make_variant
+from services.ocr import (
+    OCRResult,
+    OCRService,
+    _NOT_LOCATED,
+    _PREPROCESSORS,
+    _PreprocessGraph,
+    _convert_pdf_to_images,
+    _to_gray,
+    resolution_ladder_from_env,
+)
+from services.ocr_triage import locate_document, triage_image
+from services.parser import ParserService
+
+FIELDS = ["vendor", "date", "gstin", "invoice_number", "total", "cgst", "sgst"]
+AMOUNT_FIELDS = {"total", "cgst", "sgst"}
+
+
+class TimedEngine:
+    """Wraps an OCR engine and records the duration of every Tesseract call."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.name = engine.name
+        self.calls: List[Dict[str, object]] = []
+
+    def _timed(self, method: str, image: np.ndarray, config: str, timeout: float):
+        started = time.perf_counter()
+        try:
+            return getattr(self.engine, method)(image, config, timeout)
+        finally:
+            self.calls.append({"call": method, "config": config, "shape": list(image.shape[:2]),
+                               "ms": round((time.perf_counter() - started) * 1000, 2)})
+
+    def image_to_data(self, image: np.ndarray, config: str, timeout: float = 0):
+        return self._timed("image_to_data", image, config, timeout)
+
+    def image_to_string(self, image: np.ndarray, config: str, timeout: float = 0):
+        return self._timed("image_to_string", image, config, timeout)
+
+
+def field_matches(field: str, parsed: Optional[str], truth: str) -> bool:
+    if parsed is None:
+        return False
+    if field in AMOUNT_FIELDS:
+        try:
+            return abs(float(str(parsed).replace(",", "")) - float(truth)) < 0.005
+        except ValueError:
+            return False
+    return " ".join(str(parsed).split()).casefold() == " ".join(truth.split()).casefold()
+
+
+def field_accuracy(parser: ParserService, text: str, truth: Dict[str, object]) -> Dict[str, bool]:
+    parsed = parser.parse(text)
+    return {field: field_matches(field, parsed.get(field), truth[field]) for field in FIELDS}
+
+
+def tools() -> Dict[str, bool]:
+    return {"tesseract": shutil.which("tesseract") is not None, "pdftoppm": shutil.which("pdftoppm") is not None}
+
+
+def run_sample(service: OCRService, parser: ParserService, seed: int, variant: str, available: Dict[str, bool]) -> dict:
+    data, mime_type, truth = make_variant(seed, variant)
+    sample = {"seed": seed, "variant": variant, "mime_type": mime_type, "bytes": len(data), "stages": {}}
+    sample["parser_on_truth"] = field_accuracy(parser, "\n".join(truth["lines"]), truth)
+
+    if variant == "pdf":
+        if not available["pdftoppm"]:
+            sample["skipped"] = "pdftoppm not installed"
+            return sample
+        started = time.perf_counter()
+        image = _convert_pdf_to_images(data)[0]
+        sample["stages"]["render_pdf"] = round((time.perf_counter() - started) * 1000, 2)
+    else:
+        image = data
+
+    # Decode and resize as the service does them
+    prepared = OCRResult()
+    bgr, _ = service._prepare_image(image, prepared)
+    sample["stages"].update({stage: prepared.timings[stage] for stage in ("decode", "resize")})
+    sample["preprocessing"] = prepared.preprocessing
+
+    # Triage and the preprocessing graph as the service runs them: the corners
+    # located by triage are handed to the graph, and every pipeline shares its stages
+    quad = _NOT_LOCATED
+    if service.triage:
+        started = time.perf_counter()
+        quad = locate_document(_to_gray(bgr))
+        triage_image(bgr, quad)
+        sample["stages"]["triage"] = round((time.perf_counter() - started) * 1000, 2)
+    graph = _PreprocessGraph(bgr, service.denoise_budget_ms, document_quad=quad)
+    for name in _PREPROCESSORS:
+        graph.variant(name)
+    sample["stages"].update(graph.timings)
+
+    if not available["tesseract"]:
+        sample["ocr"] = "skipped: tesseract not installed"
+        return sample
+    engine = service.engine
+    timed = service.engine = TimedEngine(engine)
+    try:
+        result = service.extract(data)
+    finally:
+        service.engine = engine
+    sample["ocr"] = {
+        "elapsed_ms": round(result.elapsed * 1000, 2),
+        "confidence": round(result.confidence, 1),
+        "strategy": result.strategy,
+        "candidates_tried": result.candidates_tried,
+        "service_timings": result.timings,
+        "tesseract_calls": timed.calls,
+        "fields": field_accuracy(parser, result.text, truth),
+    }
+    return sample
+
+
+def summarize(samples: List[dict]) -> Dict[str, dict]:
+    summary: Dict[str, dict] = {}
+    for variant in sorted({sample["variant"] for sample in samples}, key=VARIANTS.index):
+        rows = [sample for sample in samples if sample["variant"] == variant]
+        stages: Dict[str, List[float]] = {}
+        for sample in rows:
+            for stage, ms in sample["stages"].items():
+                stages.setdefault(stage, []).append(ms)
+        entry = {
+            "samples": len(rows),
+            "skipped": sum(1 for sample in rows if "skipped" in sample),
+            "stages": {stage: {"mean_ms": round(float(np.mean(values)), 2),
+                               "p95_ms": round(float(np.percentile(values, 95)), 2)}
+                       for stage, values in stages.items()},
+            "parser_on_truth": {field: round(float(np.mean([sample["parser_on_truth"][field] for sample in rows])), 3)
+                                for field in FIELDS},
+        }
+        ocr_rows = [sample["ocr"] for sample in rows if isinstance(sample.get("ocr"), dict)]
+        if ocr_rows:
+            calls: Dict[str, List[float]] = {}
+            for ocr in ocr_rows:
+                for call in ocr["tesseract_calls"]:
+                    calls.setdefault(call["config"], []).append(call["ms"])
+            entry["ocr"] = {
+                "mean_ms": round(float(np.mean([ocr["elapsed_ms"] for ocr in ocr_rows])), 2),
+                "p95_ms": round(float(np.percentile([ocr["elapsed_ms"] for ocr in ocr_rows], 95)), 2),
+                "mean_confidence": round(float(np.mean([ocr["confidence"] for ocr in ocr_rows])), 1),
+                "tesseract_calls_per_image": round(sum(len(v) for v in calls.values()) / len(ocr_rows), 2),
+                "tesseract": {config: {"calls": len(values), "mean_ms": round(float(np.mean(values)), 2)}
+                              for config, values in calls.items()},
+                "fields": {field: round(float(np.mean([ocr["fields"][field] for ocr in ocr_rows])), 3)
+                           for field in FIELDS},
+            }
+            entry["ocr"]["all_fields"] = round(float(np.mean([all(ocr["fields"].values()) for ocr in ocr_rows])), 3)
+        summary[variant] = entry
+    return summary
+
+
+def compare(current: Dict[str, dict], previous: Dict[str, dict]) -> Dict[str, dict]:
+    """Ratio of mean stage times (current / previous) and the change in field accuracy, per variant."""
+    changes: Dict[str, dict] = {}
+    for variant, entry in current.items():
+        old = previous.get(variant)
+        if old is None:
+            continue
+        change = {"stage_time_ratio": {
+            stage: round(values["mean_ms"] / old["stages"][stage]["mean_ms"], 3)
+            for stage, values in entry["stages"].items()
+            if stage in old["stages"] and old["stages"][stage]["mean_ms"] > 0
+        }}
+        if "ocr" in entry and "ocr" in old:
+            change["ocr_time_ratio"] = round(entry["ocr"]["mean_ms"] / old["ocr"]["mean_ms"], 3) if old["ocr"]["mean_ms"] else None
+            change["field_accuracy_change"] = {field: round(entry["ocr"]["fields"][field] - old["ocr"]["fields"][field], 3)
+                                               for field in FIELDS}
+        changes[variant] = change
+    return changes
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(seeds: int, variants: List[str], ladder: Optional[List[float]] = None) -> dict:
+    available = tools()
+    service = OCRService(resolution_ladder=ladder)
+    parser = ParserService()
+    samples = [run_sample(service, parser, seed, variant, available) for variant in variants for seed in range(seeds)]
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "tools": available,
+            "seeds": seeds,
+            "variants": variants,
+            "ocr_settings": service.cache_settings(),
+        },
+        "summary": summarize(samples),
+        "samples": samples,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seeds", type=int, default=5)
+    parser.add_argument("--variants", default=",".join(VARIANTS), help="Comma separated subset of " + ", ".join(VARIANTS))
+    parser.add_argument("--ladder", help="Resolution ladder, e.g. 0.6,1.0 (default: OCR_RESOLUTION_LADDER as the "
+                                         "service reads it, a single full resolution pass when unset)")
+    parser.add_argument("--output", help="Write the full results (with every sample) to this JSON file")
+    parser.add_argument("--compare", help="Results JSON of an earlier run to compare against")
+    args = parser.parse_args()
+
+    variants = [variant.strip() for variant in args.variants.split(",") if variant.strip()]
+    ladder = [float(step) for step in args.ladder.split(",")] if args.ladder else resolution_ladder_from_env()
+    results = run(args.seeds, variants, ladder)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    report = {"meta": results["meta"], "summary": results["summary"]}
+    if args.compare:
+        with open(args.compare) as f:
+            report["comparison"] = compare(results["summary"], json.load(f)["summary"])
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,77 @@
+"""
+Parser throughput benchmark: ``ParserService.parse`` against the reference rules
+(``benchmarks.parser_reference``, the parser as first written, line by line) in
+texts per second, on single receipts and on long multi-page PDF text.
+
+PDF texts join synthetic receipt pages with the "--- Page N ---" markers of
+``OCRService.extract_pdf``; amounts carry a rupee sign on some pages, as OCR of
+Indian receipts does, so the texts are not pure ASCII. Every result is checked
+against the reference before timing.
+
+Run from the backend directory:
+    python -m benchmarks.bench_parser [--texts 200] [--pages 30] [--seconds 2]
+"""
+
+import argparse
+import json
+import time
+from typing import Callable, List
+
+from benchmarks.corpus import receipt_fields
+from benchmarks.parser_reference import reference_parse
+from services.parser import ParserService
+
+
+def receipt_text(seed: int) -> str:
+    lines = receipt_fields(seed)["lines"]
+    if seed % 2:
+        lines = [line.replace("Total: ", "Total: ₹") for line in lines]
+    return "\n".join(lines)
+
+
+def pdf_text(seed: int, pages: int) -> str:
+    return "\n\n".join(f"--- Page {page} ---\n{receipt_text(seed * pages + page)}" for page in range(1, pages + 1))
+
+
+def throughput(parse: Callable[[str], dict], texts: List[str], seconds: float) -> float:
+    """Texts per second, over whole passes through ``texts`` for at least ``seconds``."""
+    parsed = 0
+    started = time.perf_counter()
+    while True:
+        for text in texts:
+            parse(text)
+        parsed += len(texts)
+        elapsed = time.perf_counter() - started
+        if elapsed >= seconds:
+            return parsed / elapsed
+
+
+def run(texts: int, pages: int, seconds: float) -> dict:
+    parser = ParserService()
+    corpora = {
+        "receipt": [receipt_text(seed) for seed in range(texts)],
+        f"pdf_{pages}_pages": [pdf_text(seed, pages) for seed in range(max(1, texts // pages))],
+    }
+    results = {}
+    for name, corpus in corpora.items():
+        mismatches = sum(parser.parse(text) != reference_parse(text, parser) for text in corpus)
+        reference = throughput(lambda text: reference_parse(text, parser), corpus, seconds)
+        single_pass = throughput(parser.parse, corpus, seconds)
+        results[name] = {
+            "texts": len(corpus),
+            "mean_characters": round(sum(map(len, corpus)) / len(corpus)),
+            "mismatches": mismatches,
+            "reference_texts_per_s": round(reference, 1),
+            "parse_texts_per_s": round(single_pass, 1),
+            "speedup": round(single_pass / reference, 2),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=200)
+    parser.add_argument("--pages", type=int, default=30)
+    parser.add_argument("--seconds", type=float, default=2.0, help="Minimum timing per method and corpus")
+    args = parser.parse_args()
+    print(json.dumps(run(args.texts, args.pages, args.seconds), indent=2))
@@ -0,0 +1,128 @@
+"""
+Deterministic synthetic receipts for OCR benchmarks.
+
+Receipts are rendered with OpenCV's Hershey fonts from a seeded random
+generator, so the same seed always produces the same pixels and ground truth.
+``make_variant`` degrades them the way uploads are degraded (rotation, blur,
+sensor noise, a perspective photo, a faded thermal print, a scanned PDF) and
+encodes them as the file an employee would upload.
+"""
+
+from typing import Dict, List, Tuple
+import io
+import random
+
+import cv2
+import numpy as np
+from PIL import Image
+
+VENDORS = ["SuperMart Grocery", "Annapurna Cafe", "Tech Solutions Pvt Ltd", "City Medical Store", "Green Leaf Restaurant"]
+ITEMS = ["Milk", "Bread", "Eggs", "Coffee", "Paneer", "Rice 5kg", "Notebook", "Printer Paper", "Tea", "Biscuits"]
+
+
+def receipt_fields(seed: int) -> Dict[str, object]:
+    """Ground truth fields and printed lines of the receipt for ``seed``."""
+    rng = random.Random(seed)
+    items = [(rng.choice(ITEMS), rng.randint(1, 3), rng.randint(20, 900) + 0.5 * rng.randint(0, 1)) for _ in range(rng.randint(3, 8))]
+    subtotal = sum(qty * price for _, qty, price in items)
+    cgst = round(subtotal * 0.09, 2)
+    total = round(subtotal + 2 * cgst, 2)
+    date = f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2025"
+    vendor = rng.choice(VENDORS)
+    invoice = f"INV-{rng.randint(1000, 9999)}"
+    lines = [vendor, "GSTIN: 29AAFCT6192H1ZV", f"Invoice No: {invoice}", f"Date: {date}", ""]
+    lines += [f"{name:<14}{qty:>2} {qty * price:>10.2f}" for name, qty, price in items]
+    lines += ["", f"Subtotal: {subtotal:.2f}", f"CGST @ 9%: {cgst:.2f}", f"SGST @ 9%: {cgst:.2f}", f"Total: {total:.2f}"]
+    return {
+        "vendor": vendor,
+        "date": date,
+        "gstin": "29AAFCT6192H1ZV",
+        "invoice_number": invoice,
+        "total": f"{total:.2f}",
+        "cgst": f"{cgst:.2f}",
+        "sgst": f"{cgst:.2f}",
+        "lines": lines,
+    }
+
+
+def render_receipt(seed: int, width: int = 800, line_height: int = 40) -> Tuple[np.ndarray, Dict[str, object]]:
+    """Render the receipt for ``seed`` as a clean grayscale image; returns (image, ground truth)."""
+    truth = receipt_fields(seed)
+    lines: List[str] = truth["lines"]
+    height = line_height * (len(lines) + 2)
+    img = np.full((height, width), 255, dtype=np.uint8)
+    for i, line in enumerate(lines):
+        cv2.putText(img, line, (30, line_height * (i + 1) + 10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, 0, 2, cv2.LINE_AA)
+    return img, truth
+
+
+def rotate(img: np.ndarray, angle: float) -> np.ndarray:
+    """Rotate counter-clockwise by ``angle`` degrees, padding with white."""
+    h, w = img.shape[:2]
+    M = cv2.getRotationMatrix2D((w // 2, h // 2), angle, 1.0)
+    return cv2.warpAffine(img, M, (w, h), flags=cv2.INTER_CUBIC, borderValue=255)
+
+
+VARIANTS = ["clean", "rotation", "blur", "noise", "perspective", "thermal", "pdf"]
+
+
+def _encode(img: np.ndarray, fmt: str, **params) -> bytes:
+    buffer = io.BytesIO()
+    Image.fromarray(img).save(buffer, fmt, **params)
+    return buffer.getvalue()
+
+
+def photograph(img: np.ndarray, rng: np.random.Generator, desk: int = 70) -> np.ndarray:
+    """Place the receipt on a darker desk with each corner displaced, like a hand-held photo."""
+    h, w = img.shape[:2]
+    margin = max(h, w) // 4
+    canvas = (w + 2 * margin, h + 2 * margin)
+    src = np.float32([[0, 0], [w, 0], [w, h], [0, h]])
+    jitter = rng.uniform(-0.06, 0.06, (4, 2)) * np.float32([w, h])
+    dst = (src + margin + jitter).astype(np.float32)
+    M = cv2.getPerspectiveTransform(src, dst)
+    photo = np.full(canvas[::-1], desk, dtype=np.uint8)
+    mask = cv2.warpPerspective(np.full_like(img, 255), M, canvas) > 0
+    photo[mask] = cv2.warpPerspective(img, M, canvas, flags=cv2.INTER_CUBIC)[mask]
+    return photo
+
+
+def thermal_fade(img: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Faded thermal print: grey ink that fades further towards one end, on off-white paper."""
+    h, w = img.shape[:2]
+    ink = rng.uniform(110, 150)
+    fade = np.linspace(0, rng.uniform(40, 70), h, dtype=np.float32)[:, None]
+    if rng.random() < 0.5:
+        fade = fade[::-1]
+    darkness = (255 - img.astype(np.float32)) / 255.0
+    faded = 240 - darkness * (240 - ink - fade)
+    return cv2.GaussianBlur(np.clip(faded, 0, 255).astype(np.uint8), (3, 3), 0)
+
+
+def make_variant(seed: int, variant: str, width: int = 800) -> Tuple[bytes, str, Dict[str, object]]:
+    """
+    The receipt for ``seed`` degraded as ``variant`` (one of ``VARIANTS``) and
+    encoded as an upload. Returns (file bytes, mime type, ground truth); the
+    degradation parameters are drawn from ``seed`` too.
+    """
+    img, truth = render_receipt(seed, width=width)
+    rng = np.random.default_rng(seed)
+    if variant == "clean":
+        return _encode(img, "PNG"), "image/png", truth
+    if variant == "rotation":
+        angle = float(rng.choice([-1, 1]) * rng.uniform(2, 10))
+        return _encode(rotate(img, angle), "PNG"), "image/png", truth
+    if variant == "blur":
+        return _encode(cv2.GaussianBlur(img, (0, 0), rng.uniform(1.2, 2.2)), "PNG"), "image/png", truth
+    if variant == "noise":
+        paper = 30 + img.astype(np.float32) * (190 / 255)
+        noisy = np.clip(paper + rng.normal(0, rng.uniform(8, 15), img.shape), 0, 255).astype(np.uint8)
+        return _encode(noisy, "JPEG", quality=85), "image/jpeg", truth
+    if variant == "perspective":
+        return _encode(photograph(img, rng), "JPEG", quality=85), "image/jpeg", truth
+    if variant == "thermal":
+        return _encode(thermal_fade(img, rng), "JPEG", quality=85), "image/jpeg", truth
+    if variant == "pdf":
+        # A scan without a text layer, at the 200 dpi the OCR service renders PDFs at
+        return _encode(img, "PDF", resolution=200.0), "application/pdf", truth
+    raise ValueError(f"Unknown variant {variant!r}, expected one of {VARIANTS}")
@@ -0,0 +1,109 @@
+"""
+Reference rules of ``ParserService``: every field found line by line or with one
+regex over the whole text, as the parser was first written. ``parse`` must
+return exactly what ``reference_parse`` returns; the parser tests check it on
+random texts and ``bench_parser`` on the receipt corpus, and time both.
+"""
+
+import re
+from typing import Dict, List, Optional
+
+TOTAL_KEYWORDS = ['total', 'grand total', 'amount due', 'net amount', 'final amount']
+DATE_PATTERNS = [
+    r"\b(\d{1,2}[/-]\d{1,2}[/-]\d{4})\b",
+    r"\b(\d{1,2}[/-]\d{1,2}[/-]\d{2})\b",
+    r"\b(\d{2}\s+[A-Za-z]{3}\s+\d{4})\b",
+    r"\b(\d{4}[/-]\d{1,2}[/-]\d{1,2})\b",
+    r"(?i)(date|dated)[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",
+]
+VENDOR_SKIP_KEYWORDS = ['receipt', 'bill', 'invoice', 'date', 'time', 'total', 'amount']
+BUSINESS_INDICATORS = ['restaurant', 'cafe', 'coffee', 'shop', 'store', 'market', 'mart', 'ltd', 'inc', 'pvt']
+GSTIN_PATTERN = r'\b([0-9]{2}[A-Z]{5}[0-9]{4}[A-Z]{1}[1-9A-Z]{1}Z[0-9A-Z]{1})\b'
+LABELED_GSTIN_PATTERN = r'(?i)(?:GSTIN|GST\s*No|GST\s*Number)\s*[:\-]?\s*' + GSTIN_PATTERN
+TAX_PATTERN = r"(?i)(CGST|SGST|IGST)\s*(?:@\s*[\d.]+%?)?\s*[:\-]?\s*[₹$]?\s*([0-9,]+\.\d{2})"
+INVOICE_PATTERN = r"(?i)(?:Invoice\s*No|Inv\s*No|Bill\s*No|Receipt\s*#)\s*[:\-]?\s*([A-Za-z0-9/-]+)"
+HSN_PATTERN = r"\b(\d{4}|\d{6}|\d{8})\b"
+
+
+def _amounts(text: str) -> List[float]:
+    values = [float(amount.replace(',', '')) for amount in re.findall(r'([0-9,]+\.\d{2})', text)]
+    return [value for value in values if 1 <= value <= 100000]
+
+
+def reference_total(text: str) -> Optional[str]:
+    candidates = []
+    for line in text.splitlines():
+        if any(keyword in line.lower() for keyword in TOTAL_KEYWORDS):
+            candidates.extend(_amounts(line))
+    if not candidates:
+        candidates = _amounts(text)
+    return f"{max(candidates):.2f}" if candidates else None
+
+
+def reference_date(text: str) -> Optional[str]:
+    for pattern in DATE_PATTERNS:
+        match = re.search(pattern, text)
+        if match and len(match.group(1)) >= 6:
+            return match.group(1)
+    return None
+
+
+def reference_vendor(text: str) -> Optional[str]:
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    for line in lines[:5]:
+        if any(keyword in line.lower() for keyword in VENDOR_SKIP_KEYWORDS):
+            continue
+        if len(re.sub(r'[^a-zA-Z\s]', '', line)) < len(line) * 0.5 or len(line) < 3:
+            continue
+        if any(indicator in line.lower() for indicator in BUSINESS_INDICATORS):
+            return line
+        if 3 <= len(line) <= 50 and re.search(r'[a-zA-Z]{3,}', line):
+            return line
+    for line in lines:
+        if len(line) >= 3 and not line.isdigit():
+            return line
+    return None
+
+
+def reference_gstin(text: str, is_valid) -> Optional[str]:
+    for pattern in (LABELED_GSTIN_PATTERN, GSTIN_PATTERN):
+        for match in re.findall(pattern, text):
+            gstin = re.sub(r'[\s-]', '', match).upper()
+            if is_valid(gstin):
+                return gstin
+    return None
+
+
+def reference_tax_breakdown(text: str) -> Dict[str, Optional[str]]:
+    tax_data = {"cgst": None, "sgst": None, "igst": None}
+    for tax_type, amount in re.findall(TAX_PATTERN, text):
+        tax_key = tax_type.lower()
+        if tax_key in tax_data and tax_data[tax_key] is None:
+            tax_data[tax_key] = amount.replace(',', '')
+    return tax_data
+
+
+def reference_invoice_number(text: str) -> Optional[str]:
+    match = re.search(INVOICE_PATTERN, text)
+    if match and 2 <= len(match.group(1).strip()) <= 30:
+        return match.group(1).strip()
+    return None
+
+
+def reference_hsn_codes(text: str) -> List[str]:
+    # Order of appearance, without duplicates
+    return list(dict.fromkeys(code for code in re.findall(HSN_PATTERN, text) if not code.startswith(('19', '20'))))
+
+
+def reference_parse(text: str, parser) -> Dict[str, object]:
+    """What ``parser.parse(text)`` must return; the GSTIN checksum is the parser's own."""
+    parsed = {
+        "total": reference_total(text),
+        "date": reference_date(text),
+        "vendor": reference_vendor(text),
+        "gstin": reference_gstin(text, parser._is_valid_gstin),
+        "invoice_number": reference_invoice_number(text),
+        "hsn_codes": reference_hsn_codes(text),
+    }
+    parsed.update(reference_tax_breakdown(text))
+    return parsed
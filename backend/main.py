@@ -5,7 +5,8 @@ import logging
 import sys
 from typing import Dict, Any
 import os
-from fastapi import FastAPI
+import time
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 # Configure logging early
@@ -26,6 +27,11 @@ logger.info("=" * 50)
 # Routers
 from api.health import router as health_router
 from api.receipts import router as receipts_router
+from api.admin import router as admin_router
+from services.ocr import ocr_service
+from services.ocr_cache import OCRCache
+from services.ocr_stats import StrategyStats
+from services import ocr_metrics
 
 from api.auth import router as auth_router
 from models.entities import Base
@@ -67,6 +73,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def _record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template, not raw path, so receipt ids do not create new series
+        route = request.scope.get("route")
+        ocr_metrics.record_http(request.method, getattr(route, "path", "unmatched"), status,
+                                time.perf_counter() - started)
+
 # Attach config (optional access as app.state.settings)
 app.state.settings = {
     "DATABASE_URL": DATABASE_URL,
@@ -87,11 +107,37 @@ def _create_tables_if_missing() -> None:
         logger.error(f"Failed to create database tables: {e}")
         raise  # Don't silently swallow - let it fail visibly
 
+@app.on_event("startup")
+def _open_ocr_storage() -> None:
+    # Results and strategy statistics are kept on disk only when OCR_CACHE_PATH
+    # and OCR_STATS_PATH are set, in memory otherwise
+    ocr_service.use_cache(OCRCache(
+        os.getenv("OCR_CACHE_PATH") or None,
+        max_disk_entries=int(os.getenv("OCR_CACHE_MAX_ENTRIES", "10000")),
+        max_age=float(os.getenv("OCR_CACHE_MAX_AGE_DAYS", "30")) * 24 * 3600,
+    ))
+    ocr_service.strategy_stats = StrategyStats(os.getenv("OCR_STATS_PATH") or None)
+
+@app.on_event("shutdown")
+def _save_ocr_statistics() -> None:
+    if ocr_service.strategy_stats is not None:
+        ocr_service.strategy_stats.save()
+    if ocr_service.cache is not None:
+        ocr_service.cache.close()
+
 @app.get("/", tags=["root"])
 def root() -> Dict[str, Any]:
     return {"status": "ok", "service": "backend", "version": APP_VERSION}
 
+@app.get("/metrics", tags=["root"], include_in_schema=False)
+def metrics() -> Response:
+    body, content_type = ocr_metrics.render_latest()
+    if body is None:
+        return Response("prometheus_client is not installed\n", status_code=503, media_type="text/plain")
+    return Response(body, media_type=content_type)
+
 # Include API routers (already prefixed internally)
 app.include_router(health_router)
 app.include_router(receipts_router)
 app.include_router(auth_router)
+app.include_router(admin_router)
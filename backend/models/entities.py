@@ -52,6 +52,13 @@ class Receipt(Base):
     filename: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     mime_type: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     extracted: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    # Perceptual hash of the image (64 hex digits) for near-duplicate detection
+    image_hash: Mapped[Optional[str]] = mapped_column(String, nullable=True, index=True)
+    # SHA-256 of the uploaded file, or of the receipt's pixels when cut from a page;
+    # only an identical upload reuses this receipt's result
+    content_hash: Mapped[Optional[str]] = mapped_column(String, nullable=True, index=True)
+    # Receipt whose OCR and parse result was reused for this near-duplicate upload
+    duplicate_of: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(
@@ -0,0 +1,165 @@
+"""
+Perceptual hashing of receipt images for near-duplicate detection.
+
+Byte hashes miss the same receipt photographed twice, or uploaded once as a crop
+and once as the full photo. A 256-bit pHash (the 16x16 lowest frequency DCT
+coefficients of a 64x64 thumbnail against their median) of the located,
+perspective-corrected receipt stays within about ten bits for such pairs, and
+receipts of different layouts differ in 30 or more. Receipts printed from the
+same template are another matter: two that differ only in their total and date
+can be as few as 2-4 bits apart. A pHash match is therefore only a probable
+duplicate to flag for review. Reusing a stored result takes identical content,
+as compared by ``content_hash``.
+
+Hashes are indexed by multi-index hashing: each hash is split into
+``max_distance + 1`` chunks with one exact-match table per chunk. Two hashes
+within ``max_distance`` bits must agree on at least one whole chunk, so a lookup
+only verifies the few hashes sharing a chunk with the query. A BK-tree degrades
+to a near linear scan at this radius on 256-bit hashes.
+"""
+
+from __future__ import annotations
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+import cv2
+import numpy as np
+
+from .ocr import _correct_perspective, _is_pdf_bytes, _is_pdf_file, _load_image
+from .ocr_triage import locate_document
+
+logger = logging.getLogger(__name__)
+
+# Width images are decoded at before hashing; the hash only looks at 64x64 pixels
+_HASH_DECODE_WIDTH = 512
+_HASH_THUMBNAIL = 64
+_HASH_FREQUENCIES = 16
+# Hashes at most this many bits (of 256) apart are flagged as probable duplicates
+DEFAULT_MAX_DISTANCE = 16
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def perceptual_hash(gray: np.ndarray) -> int:
+    """256-bit pHash of a grayscale image."""
+    small = cv2.resize(gray, (_HASH_THUMBNAIL, _HASH_THUMBNAIL), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:_HASH_FREQUENCIES, :_HASH_FREQUENCIES].flatten()
+    # The DC term only carries overall brightness
+    bits = low > np.median(low[1:])
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def image_hash(img: Union[str, Path, bytes, np.ndarray]) -> Optional[str]:
+    """
+    Perceptual hash of a receipt image as 64 hex digits, or None for PDFs and
+    images that cannot be decoded. The receipt is located and flattened first, so
+    a photo and a tight crop of the same receipt hash alike.
+    """
+    if (isinstance(img, bytes) and _is_pdf_bytes(img)) or (isinstance(img, (str, Path)) and _is_pdf_file(img)):
+        return None
+    try:
+        gray, _ = _load_image(img, _HASH_DECODE_WIDTH, grayscale=True)
+    except Exception as e:
+        logger.warning(f"Cannot hash image: {e}")
+        return None
+    quad = locate_document(gray)
+    if quad is not None:
+        gray = _correct_perspective(gray, quad)
+    return f"{perceptual_hash(gray):064x}"
+
+
+def content_hash(img: Union[str, Path, bytes, np.ndarray]) -> str:
+    """
+    SHA-256 of a file's bytes, or of an image array's shape and pixels (a receipt
+    cropped from a page), as 64 hex digits. Equal only for identical content.
+    """
+    digest = hashlib.sha256()
+    if isinstance(img, np.ndarray):
+        digest.update(repr(img.shape).encode())
+        digest.update(np.ascontiguousarray(img).tobytes())
+    else:
+        digest.update(img if isinstance(img, bytes) else Path(img).read_bytes())
+    return digest.hexdigest()
+
+
+class MultiIndexHash:
+    """Exact search of the hashes within ``max_distance`` bits of a query (multi-index hashing)."""
+
+    def __init__(self, bits: int = _HASH_FREQUENCIES ** 2, max_distance: int = DEFAULT_MAX_DISTANCE):
+        self.max_distance = max_distance
+        chunks = max_distance + 1
+        bounds = [bits * i // chunks for i in range(chunks + 1)]
+        # (shift, mask) of each chunk
+        self._chunks = [(start, (1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])]
+        self._tables: List[Dict[int, List[str]]] = [defaultdict(list) for _ in self._chunks]
+        self._values: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def add(self, value: int, key: str) -> None:
+        self._values[key] = value
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            table[(value >> shift) & mask].append(key)
+
+    def search(self, value: int, max_distance: Optional[int] = None) -> List[Tuple[int, str]]:
+        """All (distance, key) pairs within ``max_distance`` of ``value``, nearest first."""
+        limit = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        candidates: Set[str] = set()
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            candidates.update(table.get((value >> shift) & mask, ()))
+        found = ((hamming(value, self._values[key]), key) for key in candidates)
+        return sorted(match for match in found if match[0] <= limit)
+
+
+class DuplicateIndex:
+    """
+    Thread-safe index of receipt image hashes. It is filled once from the
+    database by ``load`` and kept current with ``add`` and ``discard``; removed
+    receipts stay indexed and are filtered out of results.
+    """
+
+    def __init__(self, max_distance: int = DEFAULT_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self._index = MultiIndexHash(max_distance=max_distance)
+        self._removed: Set[str] = set()
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def load(self, rows: Callable[[], Iterable[Tuple[str, Optional[str]]]]) -> None:
+        """Index the (receipt id, hex hash) pairs returned by ``rows``, once."""
+        with self._lock:
+            if self.loaded:
+                return
+            for key, value in rows():
+                if value:
+                    self._index.add(int(value, 16), key)
+            self.loaded = True
+            logger.info(f"Duplicate index loaded with {len(self._index)} image hash(es)")
+
+    def add(self, key: str, value: Optional[str]) -> None:
+        if not value:
+            return
+        with self._lock:
+            self._index.add(int(value, 16), key)
+            self._removed.discard(key)
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._removed.add(key)
+
+    def nearest(self, value: Optional[str]) -> Optional[Tuple[str, int]]:
+        """Closest indexed receipt within ``max_distance``, as (receipt id, distance), or None."""
+        if not value:
+            return None
+        with self._lock:
+            for distance, key in self._index.search(int(value, 16)):
+                if key not in self._removed:
+                    return key, distance
+        return None
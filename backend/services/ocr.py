@@ -1,17 +1,30 @@
 from __future__ import annotations
 import logging
+import math
 import os
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from dataclasses import dataclass, asdict, field
 from pathlib import Path
-from typing import Union, Tuple, List
+from typing import Union, Tuple, List, Dict, Optional, Callable, Iterable, Iterator, Sequence
 import cv2
 import numpy as np
 import pytesseract
-from PIL import Image
+from PIL import Image, ImageOps
 import io
 
+from .ocr_cache import OCRCache, settings_fingerprint
+from .ocr_engine import create_engine
+from . import ocr_metrics
+from .ocr_stats import StrategyStats, image_features, feature_bucket
+from .ocr_triage import estimate_noise, find_receipt_regions, locate_document, route_pipelines, triage_image
+
 # PDF support
 try:
-    from pdf2image import convert_from_path, convert_from_bytes
+    from pdf2image import convert_from_path, convert_from_bytes, pdfinfo_from_path
     PDF_SUPPORT = True
 except ImportError:
     PDF_SUPPORT = False
@@ -75,40 +88,80 @@ def _convert_pdf_to_images(pdf_input: Union[str, Path, bytes], dpi: int = 200) -
         raise
 
 
+def _pdf_page_count(pdf_path: Union[str, Path]) -> int:
+    """Return the number of pages in a PDF file."""
+    return int(pdfinfo_from_path(str(pdf_path))["Pages"])
+
+
+def _render_pdf_pages(pdf_path: Union[str, Path], first_page: int, last_page: int, dpi: int = 200) -> List[Image.Image]:
+    """Rasterize an inclusive page window of a PDF file."""
+    return convert_from_path(str(pdf_path), dpi=dpi, first_page=first_page, last_page=last_page)
+
+
+def _pdf_text_layer(pdf_path: Union[str, Path], timeout: float = 30) -> List[str]:
+    """
+    Return the embedded text of every PDF page using poppler's ``pdftotext``.
+
+    Returns an empty list when pdftotext is unavailable or fails, in which case
+    every page is OCR'd.
+    """
+    try:
+        completed = subprocess.run(
+            ["pdftotext", "-layout", "-enc", "UTF-8", str(pdf_path), "-"],
+            capture_output=True, timeout=timeout, check=True,
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning(f"pdftotext text layer extraction failed: {e}")
+        return []
+    # pdftotext terminates every page with a form feed
+    pages = completed.stdout.decode("utf-8", errors="replace").split("\f")
+    return pages[:-1] if pages and not pages[-1].strip() else pages
+
+
+def _has_usable_text_layer(text: str, min_chars: int = 20) -> bool:
+    """Heuristic: enough characters, mostly letters/digits rather than extraction garbage."""
+    compact = "".join(text.split())
+    if len(compact) < min_chars:
+        return False
+    alnum = sum(ch.isalnum() for ch in compact)
+    return alnum / len(compact) >= 0.5
+
+
 def _autorotate_image(img: Image.Image) -> Image.Image:
     """Check for EXIF orientation data and rotate the image accordingly."""
     try:
-        exif = img._getexif()
-        if exif is None:
-            return img
-
-        orientation_key = 274  # cf. ExifTags.TAGS
-        if orientation_key in exif:
-            orientation = exif[orientation_key]
-            
-            rotation_map = {
-                3: Image.ROTATE_180,
-                6: Image.ROTATE_270,
-                8: Image.ROTATE_90,
-            }
-            
-            if orientation in rotation_map:
-                logger.info(f"Rotating image per EXIF orientation: {orientation}")
-                img = img.transpose(rotation_map[orientation])
-                
+        orientation = img.getexif().get(0x0112, 1)  # cf. ExifTags.Base.Orientation
+        if orientation != 1:
+            logger.info(f"Rotating image per EXIF orientation: {orientation}")
+            img = ImageOps.exif_transpose(img)
     except Exception as e:
         # Ignore errors if EXIF data is unreadable
         logger.warning(f"Could not read EXIF data: {e}")
-        
+
     return img
 
 
-def _as_numpy_bgr(img: Union[str, Path, bytes, Image.Image, np.ndarray]) -> np.ndarray:
-    """Load various input types into a BGR numpy image for OpenCV, with autorotation."""
+def _load_image(
+    img: Union[str, Path, bytes, Image.Image, np.ndarray],
+    target_width: Optional[int] = None,
+    grayscale: bool = False,
+) -> Tuple[np.ndarray, Tuple[int, int]]:
+    """
+    Load various input types into a numpy image for OpenCV, with autorotation.
+
+    Files and bytes are decoded straight from memory. With ``target_width`` JPEGs
+    are decoded at a reduced scale (1/2, 1/4 or 1/8) that is still at least that
+    wide, so large photos never exist at full resolution; with ``grayscale`` the
+    decoder outputs a single channel and no colour conversion happens.
+
+    Returns:
+        (BGR or grayscale image, (height, width) of the full-resolution image)
+    """
     if isinstance(img, np.ndarray):
-        return img if len(img.shape) == 3 else cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        if grayscale:
+            return _to_gray(img), img.shape[:2]
+        return (img if len(img.shape) == 3 else cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)), img.shape[:2]
 
-    pil_img = None
     if isinstance(img, Image.Image):
         pil_img = img
     elif isinstance(img, (str, Path)):
@@ -118,15 +171,25 @@ def _as_numpy_bgr(img: Union[str, Path, bytes, Image.Image, np.ndarray]) -> np.n
         pil_img = Image.open(img_path)
     elif isinstance(img, bytes):
         pil_img = Image.open(io.BytesIO(img))
-
-    if pil_img:
-        # Apply autorotation based on EXIF data
-        pil_img = _autorotate_image(pil_img)
-        # Convert PIL to OpenCV format (RGB -> BGR)
-        rgb_array = np.array(pil_img.convert('RGB'))
-        return cv2.cvtColor(rgb_array, cv2.COLOR_RGB2BGR)
-
-    raise TypeError(f"Unsupported image type: {type(img)}")
+    else:
+        raise TypeError(f"Unsupported image type: {type(img)}")
+
+    mode = "L" if grayscale else "RGB"
+    width, height = pil_img.size
+    # EXIF orientations 5-8 swap width and height
+    sideways = pil_img.getexif().get(0x0112, 1) in (5, 6, 7, 8)
+    original_shape = (width, height) if sideways else (height, width)
+    if target_width and original_shape[1] > target_width:
+        # Only the dimension that becomes the width constrains the scale
+        pil_img.draft(mode, (1, target_width) if sideways else (target_width, 1))
+
+    pil_img = _autorotate_image(pil_img)
+    if pil_img.mode != mode:
+        pil_img = pil_img.convert(mode)
+    array = np.asarray(pil_img)
+    if grayscale:
+        return array, original_shape
+    return cv2.cvtColor(array, cv2.COLOR_RGB2BGR), original_shape
 
 
 def _resize_to_optimal_dpi(img: np.ndarray, optimal_width: int = 1000) -> np.ndarray:
@@ -148,25 +211,158 @@ def _resize_to_optimal_dpi(img: np.ndarray, optimal_width: int = 1000) -> np.nda
     return resized
 
 
-def _deskew(gray: np.ndarray) -> np.ndarray:
-    """Estimate skew using image moments; rotate to correct skew."""
-    coords = np.column_stack(np.where(gray < 250))
-    if coords.size == 0:
-        return gray
-    
-    rect = cv2.minAreaRect(coords.astype(np.float32))
-    angle = rect[-1]
-    if angle < -45:
-        angle = -(90 + angle)
-    else:
-        angle = -angle
-    
-    if abs(angle) < 0.5:  # Skip rotation for very small angles
-        return gray
-        
+# Text-height-aware scaling: Tesseract reads glyphs (connected components, mostly
+# capitals and digits on receipts) best at about 30 px high; images whose text is
+# already within the range are left alone
+_TEXT_HEIGHT_TARGET = 30.0
+_TEXT_HEIGHT_RANGE = (20.0, 42.0)
+# Fewer glyph-sized components than this and the image is scaled by width instead
+_TEXT_HEIGHT_MIN_COMPONENTS = 15
+# Longest side an image is scaled up to
+_TEXT_HEIGHT_MAX_SIDE = 4000
+# Most pixels an image is OCR'd at (about 2000 x 3000), whatever its text height
+_MAX_OCR_PIXELS = 6_000_000
+
+
+def _estimate_text_height(gray: np.ndarray) -> Optional[float]:
+    """
+    Estimate the dominant glyph height in pixels from the connected components
+    of the Otsu-binarized image, or None when there are too few glyph-like ones.
+    Specks, rules, solid blocks and components taller than a tenth of the image
+    (borders, logos) are left out.
+    """
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    widths, heights = stats[1:, cv2.CC_STAT_WIDTH], stats[1:, cv2.CC_STAT_HEIGHT]
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    glyphs = (
+        (heights >= 4) & (heights <= max(4, gray.shape[0] // 10))
+        & (widths <= 3 * heights) & (areas >= 8)
+        & (areas < 0.9 * widths * heights)
+    )
+    if int(glyphs.sum()) < _TEXT_HEIGHT_MIN_COMPONENTS:
+        return None
+    return float(np.median(heights[glyphs]))
+
+
+def _text_height_factor(text_height: float, shape: Tuple[int, int]) -> float:
+    """Scale factor that brings ``text_height`` into the preferred range, capped at the maximum side."""
+    low, high = _TEXT_HEIGHT_RANGE
+    if low <= text_height <= high:
+        return 1.0
+    factor = _TEXT_HEIGHT_TARGET / text_height
+    return min(factor, _TEXT_HEIGHT_MAX_SIDE / float(max(shape[:2])))
+
+
+def _pixel_budget_factor(shape: Tuple[int, int]) -> float:
+    """Largest scale factor that keeps an image of ``shape`` within ``_MAX_OCR_PIXELS``."""
+    return math.sqrt(_MAX_OCR_PIXELS / float(shape[0] * shape[1]))
+
+
+def _document_box(gray: np.ndarray) -> Optional[Tuple[float, float, float, float]]:
+    """
+    Bounds (x0, y0, x1, y1) of everything on the page that is not background, such
+    as a receipt on a desk, as fractions of the image size; None for a blank image.
+    The regions are padded, so a receipt keeps its border for perspective correction.
+    """
+    regions = find_receipt_regions(gray)
+    if not regions:
+        return None
+    h, w = gray.shape[:2]
+    x0, y0 = min(r[0] for r in regions), min(r[1] for r in regions)
+    x1, y1 = max(r[2] for r in regions), max(r[3] for r in regions)
+    return x0 / float(w), y0 / float(h), x1 / float(w), y1 / float(h)
+
+
+def _crop_to_box(img: np.ndarray, box: Tuple[float, float, float, float]) -> np.ndarray:
+    """The part of ``img`` inside ``box`` (fractions of its size, as from ``_document_box``)."""
+    h, w = img.shape[:2]
+    x0, y0, x1, y1 = box
+    return img[int(y0 * h):int(math.ceil(y1 * h)), int(x0 * w):int(math.ceil(x1 * w))]
+
+
+# Skew estimation works on a copy downsampled to this width
+_SKEW_SAMPLE_WIDTH = 600
+# Largest skew (degrees) searched for; photographed receipts rarely exceed it
+_SKEW_MAX_ANGLE = 20.0
+# Final search step (degrees)
+_SKEW_FINE_STEP = 0.1
+# Foreground points used for the projection profiles (randomly subsampled above this)
+_SKEW_MAX_POINTS = 6000
+
+
+def _skew_profile_scores(xs: np.ndarray, ys: np.ndarray, angles: np.ndarray) -> np.ndarray:
+    """
+    Sharpness of the horizontal projection profile of the points (xs, ys) after
+    rotating them by each of ``angles`` (degrees, same convention as ``_rotate``).
+    Rows of text line up when the rotation straightens them, which maximises the
+    squared differences between neighbouring profile bins.
+    """
+    radians = np.deg2rad(angles).astype(np.float32)
+    rows = np.rint(np.outer(ys, np.cos(radians)) - np.outer(xs, np.sin(radians))).astype(np.int32)
+    rows -= rows.min(axis=0)
+    # One bincount for all angles: offset every angle's rows into its own range
+    span = int(rows.max()) + 2
+    rows += np.arange(len(angles), dtype=np.int32) * span
+    profiles = np.bincount(rows.ravel(order="F"), minlength=span * len(angles)).reshape(len(angles), span)
+    return np.sum(np.diff(profiles.astype(np.float64), axis=1) ** 2, axis=1)
+
+
+def _estimate_skew_angle(gray: np.ndarray) -> float:
+    """
+    Estimate the rotation (degrees) that straightens the text lines of an image.
+
+    Works on the Otsu text mask of a copy downsampled to ~600 px wide: the
+    foreground points are rotated (not the image) and the rotation with the
+    sharpest horizontal projection profile wins. A coarse 1 degree search is
+    refined in 0.1 degree steps; on the synthetic receipts of
+    benchmarks/bench_deskew.py the estimate is within 0.5 degrees.
+    When the unrotated profile is clearly sharper than its +-1 degree
+    neighbours the skew is negligible and 0 is returned straight away.
+    """
     h, w = gray.shape[:2]
+    if w > _SKEW_SAMPLE_WIDTH:
+        scale = _SKEW_SAMPLE_WIDTH / w
+        gray = cv2.resize(gray, (_SKEW_SAMPLE_WIDTH, max(1, int(h * scale))), interpolation=cv2.INTER_LINEAR)
+        w = _SKEW_SAMPLE_WIDTH
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    points = cv2.findNonZero(mask)
+    if points is None or len(points) < 0.001 * mask.size:
+        return 0.0
+    points = points.reshape(-1, 2)
+    xs, ys = points[:, 0], points[:, 1]
+    if len(xs) > _SKEW_MAX_POINTS:
+        # Seeded random subsample; a raster-order stride would alias with the text rows
+        keep = np.random.default_rng(0).integers(0, len(xs), _SKEW_MAX_POINTS)
+        xs, ys = xs[keep], ys[keep]
+    xs = xs.astype(np.float32) - w / 2
+    ys = ys.astype(np.float32)
+
+    flat, left, right = _skew_profile_scores(xs, ys, np.array([0.0, -1.0, 1.0]))
+    if flat > 2.0 * max(left, right):
+        return 0.0
+
+    # Coarse 1 degree steps on half of the points, then 0.1 degree steps on all of them
+    coarse = np.arange(-_SKEW_MAX_ANGLE, _SKEW_MAX_ANGLE + 0.5, 1.0)
+    best = coarse[np.argmax(_skew_profile_scores(xs[::2], ys[::2], coarse))]
+    fine = np.arange(best - 1.0, best + 1.0 + _SKEW_FINE_STEP / 2, _SKEW_FINE_STEP)
+    best = fine[np.argmax(_skew_profile_scores(xs, ys, fine))]
+    return round(float(best), 2)
+
+
+def _rotate(img: np.ndarray, angle: float) -> np.ndarray:
+    """Rotate an image around its centre, skipping very small angles."""
+    if abs(angle) < 0.5:  # Skip rotation for very small angles
+        return img
+
+    h, w = img.shape[:2]
     M = cv2.getRotationMatrix2D((w // 2, h // 2), angle, 1.0)
-    return cv2.warpAffine(gray, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+    return cv2.warpAffine(img, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+
+
+def _deskew(gray: np.ndarray) -> np.ndarray:
+    """Estimate skew and rotate to correct it."""
+    return _rotate(gray, _estimate_skew_angle(gray))
 
 
 def _sharpen_image(gray: np.ndarray) -> np.ndarray:
@@ -175,152 +371,673 @@ def _sharpen_image(gray: np.ndarray) -> np.ndarray:
     return cv2.filter2D(gray, -1, kernel)
 
 
-def _denoise_image(gray: np.ndarray) -> np.ndarray:
-    """Apply a non-local means denoising to the image."""
-    return cv2.fastNlMeansDenoising(gray, None, h=10, templateWindowSize=7, searchWindowSize=21)
+# Denoising tiers from cheapest to strongest, with their rough cost in ms per
+# megapixel (see benchmarks/bench_denoise.py)
+_DENOISE_TIERS: List[Tuple[str, float]] = [
+    ("median", 1.0),
+    ("bilateral", 5.0),
+    ("nlm_downscaled", 250.0),
+    ("nlm", 900.0),
+]
+# Below this noise level (sigma, grey levels) denoising is skipped. The strong
+# CLAHE and sharpening that follow amplify even faint noise, so this is low.
+_NOISE_SKIP_SIGMA = 1.0
+# Below this noise level an edge-preserving bilateral filter is enough
+_NOISE_LIGHT_SIGMA = 5.0
 
 
-def _correct_perspective(bgr_img: np.ndarray) -> np.ndarray:
-    """Attempt to correct perspective of a receipt-like object."""
+def _select_denoise_tier(noise_sigma: float, pixels: int, budget_ms: Optional[float] = None) -> str:
+    """
+    Pick a denoising tier for the estimated noise level: none for clean images,
+    a bilateral filter for light noise and NLM for heavy noise, stepping down to
+    cheaper tiers until the estimated cost fits ``budget_ms`` (None: no limit).
+    """
+    if noise_sigma < _NOISE_SKIP_SIGMA:
+        return "none"
+    tiers = [name for name, _ in _DENOISE_TIERS]
+    wanted = "bilateral" if noise_sigma < _NOISE_LIGHT_SIGMA else "nlm"
+    costs = dict(_DENOISE_TIERS)
+    for tier in reversed(tiers[:tiers.index(wanted) + 1]):
+        if budget_ms is None or costs[tier] * pixels / 1e6 <= budget_ms:
+            return tier
+    return "none"
+
+
+def _apply_denoise_tier(gray: np.ndarray, tier: str, noise_sigma: float = 5.0) -> np.ndarray:
+    """Run one denoising tier, with the NLM filter strength following the noise level."""
+    if tier == "median":
+        return cv2.medianBlur(gray, 3)
+    if tier == "bilateral":
+        return cv2.bilateralFilter(gray, 5, 40, 5)
+    if tier == "nlm_downscaled":
+        # Halving the image also averages out part of the noise, hence the weaker filter
+        h, w = gray.shape[:2]
+        small = cv2.resize(gray, (max(1, w // 2), max(1, h // 2)), interpolation=cv2.INTER_AREA)
+        strength = max(10.0, 1.5 * noise_sigma)
+        denoised = cv2.fastNlMeansDenoising(small, None, h=strength, templateWindowSize=7, searchWindowSize=21)
+        return cv2.resize(denoised, (w, h), interpolation=cv2.INTER_LINEAR)
+    if tier == "nlm":
+        strength = max(10.0, 2.0 * noise_sigma)
+        return cv2.fastNlMeansDenoising(gray, None, h=strength, templateWindowSize=7, searchWindowSize=21)
+    return gray
+
+
+def _order_quad(pts: np.ndarray) -> np.ndarray:
+    """Order four corners as top-left, top-right, bottom-right, bottom-left."""
+    rect = np.zeros((4, 2), dtype="float32")
+    s = pts.sum(axis=1)
+    rect[0] = pts[np.argmin(s)]
+    rect[2] = pts[np.argmax(s)]
+    diff = np.diff(pts, axis=1)
+    rect[1] = pts[np.argmin(diff)]
+    rect[3] = pts[np.argmax(diff)]
+    return rect
+
+
+def _correct_perspective(bgr_img: np.ndarray, quad: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Warp the receipt in a photo to a flat, upright rectangle.
+
+    ``quad`` holds the receipt corners in image coordinates; when not given they
+    are located on a downscaled edge map (flat scans are skipped).
+    """
     try:
-        gray = cv2.cvtColor(bgr_img, cv2.COLOR_BGR2GRAY)
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-        edged = cv2.Canny(blurred, 75, 200)
-
-        contours, _ = cv2.findContours(edged.copy(), cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
-        contours = sorted(contours, key=cv2.contourArea, reverse=True)[:5]
-
-        for c in contours:
-            peri = cv2.arcLength(c, True)
-            approx = cv2.approxPolyDP(c, 0.02 * peri, True)
-
-            if len(approx) == 4:
-                screen_cnt = approx
-                
-                # Ensure the contour is convex
-                if not cv2.isContourConvex(screen_cnt):
-                    continue
-
-                # Get bounding box and calculate aspect ratio
-                x, y, w, h = cv2.boundingRect(screen_cnt)
-                aspect_ratio = w / float(h)
-                
-                # Check for a reasonable aspect ratio for a receipt
-                if 0.2 < aspect_ratio < 5.0:
-                    
-                    pts = screen_cnt.reshape(4, 2)
-                    rect = np.zeros((4, 2), dtype="float32")
-                    
-                    s = pts.sum(axis=1)
-                    rect[0] = pts[np.argmin(s)]
-                    rect[2] = pts[np.argmax(s)]
-                    
-                    diff = np.diff(pts, axis=1)
-                    rect[1] = pts[np.argmin(diff)]
-                    rect[3] = pts[np.argmax(diff)]
-                    
-                    (tl, tr, br, bl) = rect
-                    
-                    width_a = np.sqrt(((br[0] - bl[0]) ** 2) + ((br[1] - bl[1]) ** 2))
-                    width_b = np.sqrt(((tr[0] - tl[0]) ** 2) + ((tr[1] - tl[1]) ** 2))
-                    max_width = max(int(width_a), int(width_b))
-                    
-                    height_a = np.sqrt(((tr[0] - br[0]) ** 2) + ((tr[1] - br[1]) ** 2))
-                    height_b = np.sqrt(((tl[0] - bl[0]) ** 2) + ((tl[1] - bl[1]) ** 2))
-                    max_height = max(int(height_a), int(height_b))
-
-                    dst = np.array([
-                        [0, 0],
-                        [max_width - 1, 0],
-                        [max_width - 1, max_height - 1],
-                        [0, max_height - 1]], dtype="float32")
-                        
-                    m = cv2.getPerspectiveTransform(rect, dst)
-                    warped = cv2.warpPerspective(bgr_img, m, (max_width, max_height))
-                    
-                    logger.info("Perspective correction applied.")
-                    return warped
-
-        logger.warning("No suitable contour found for perspective correction.")
-        return bgr_img
+        if quad is None:
+            quad = locate_document(_to_gray(bgr_img))
+        if quad is None:
+            logger.info("No document border found, perspective correction skipped.")
+            return bgr_img
+
+        rect = _order_quad(np.asarray(quad, dtype="float32").reshape(4, 2))
+        (tl, tr, br, bl) = rect
+
+        width_a = np.sqrt(((br[0] - bl[0]) ** 2) + ((br[1] - bl[1]) ** 2))
+        width_b = np.sqrt(((tr[0] - tl[0]) ** 2) + ((tr[1] - tl[1]) ** 2))
+        max_width = max(int(width_a), int(width_b))
+
+        height_a = np.sqrt(((tr[0] - br[0]) ** 2) + ((tr[1] - br[1]) ** 2))
+        height_b = np.sqrt(((tl[0] - bl[0]) ** 2) + ((tl[1] - bl[1]) ** 2))
+        max_height = max(int(height_a), int(height_b))
+
+        dst = np.array([
+            [0, 0],
+            [max_width - 1, 0],
+            [max_width - 1, max_height - 1],
+            [0, max_height - 1]], dtype="float32")
+
+        m = cv2.getPerspectiveTransform(rect, dst)
+        warped = cv2.warpPerspective(bgr_img, m, (max_width, max_height))
+
+        logger.info("Perspective correction applied.")
+        return warped
 
     except Exception as e:
         logger.error(f"Perspective correction failed: {e}")
         return bgr_img
 
 
-def _preprocess_pipeline_binarize(bgr: np.ndarray) -> np.ndarray:
-    """Basic preprocessing with adaptive thresholding."""
-    gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
-    # Apply Gaussian blur to reduce noise
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-    # Adaptive threshold for better text detection
-    binary = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
-    return binary
+def _to_gray(img: np.ndarray) -> np.ndarray:
+    return img if len(img.shape) == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 
 
-def _preprocess_pipeline_otsu(bgr: np.ndarray) -> np.ndarray:
-    """Preprocessing with Otsu's thresholding."""
-    gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
-    # Apply Gaussian blur
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-    # Otsu's thresholding
-    _, binary = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    return binary
+def _blur(gray: np.ndarray) -> np.ndarray:
+    return cv2.GaussianBlur(gray, (5, 5), 0)
 
 
-def _preprocess_pipeline_clahe(bgr: np.ndarray) -> np.ndarray:
-    """Preprocessing with CLAHE (Contrast Limited Adaptive Histogram Equalization)."""
-    gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
-    # Apply CLAHE
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-    enhanced = clahe.apply(gray)
-    # Apply Gaussian blur and threshold
-    blurred = cv2.GaussianBlur(enhanced, (5, 5), 0)
-    _, binary = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+def _otsu(gray: np.ndarray) -> np.ndarray:
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
     return binary
 
 
-def _preprocess_pipeline_clahe_pro(bgr: np.ndarray) -> np.ndarray:
-    """More aggressive preprocessing with CLAHE, denoising, and sharpening."""
-    
-    # Correct perspective first
-    corrected_bgr = _correct_perspective(bgr)
-    
-    gray = cv2.cvtColor(corrected_bgr, cv2.COLOR_BGR2GRAY)
-    
-    # Denoise
-    denoised = _denoise_image(gray)
-    
-    # CLAHE
-    clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(10, 10))
-    enhanced = clahe.apply(denoised)
-    
-    # Sharpen
-    sharpened = _sharpen_image(enhanced)
-    
-    # Threshold
-    _, binary = cv2.threshold(sharpened, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    return binary
+def _adaptive_threshold(gray: np.ndarray) -> np.ndarray:
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
+
+
+def _clahe(gray: np.ndarray) -> np.ndarray:
+    return cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(gray)
+
+
+def _clahe_strong(gray: np.ndarray) -> np.ndarray:
+    return cv2.createCLAHE(clipLimit=3.0, tileGridSize=(10, 10)).apply(gray)
+
+
+# Marks a document quad that has not been looked for yet (None means no border)
+_NOT_LOCATED = object()
+
+
+class _PreprocessGraph:
+    """
+    Preprocessing of one image as a small graph of memoized stages.
+
+    Shared intermediates (grayscale, blurred, CLAHE-enhanced, skew angle) are
+    computed once and reused by every pipeline that needs them. Each pipeline is
+    a path through the graph ending in a binary image plus the skew angle of its
+    geometry (the perspective-corrected branch has its own). Stage timings are
+    collected in ``timings`` (milliseconds) and decisions such as the chosen
+    denoising tier in ``info``. Safe to share between threads.
+    """
+
+    # stage -> (function or name of a graph method, input stage)
+    STAGES: Dict[str, Tuple[Union[Callable[[np.ndarray], object], str], str]] = {
+        "gray": (_to_gray, "input"),
+        "blurred": (_blur, "gray"),
+        "skew_angle": (_estimate_skew_angle, "gray"),
+        "adaptive": (_adaptive_threshold, "blurred"),
+        "otsu": (_otsu, "blurred"),
+        "clahe": (_clahe, "gray"),
+        "clahe_blurred": (_blur, "clahe"),
+        "clahe_otsu": (_otsu, "clahe_blurred"),
+        "document_quad": (locate_document, "gray"),
+        "perspective": ("_warp_document", "input"),
+        "perspective_gray": (_to_gray, "perspective"),
+        "perspective_skew_angle": (_estimate_skew_angle, "perspective_gray"),
+        "denoised": ("_denoise", "perspective_gray"),
+        "clahe_strong": (_clahe_strong, "denoised"),
+        "sharpened": (_sharpen_image, "clahe_strong"),
+        "clahe_pro": (_otsu, "sharpened"),
+    }
+
+    # pipeline -> (binary output stage, skew angle stage)
+    PIPELINES: Dict[str, Tuple[str, str]] = {
+        "binarize": ("adaptive", "skew_angle"),
+        "otsu": ("otsu", "skew_angle"),
+        "clahe": ("clahe_otsu", "skew_angle"),
+        "clahe_pro": ("clahe_pro", "perspective_skew_angle"),
+    }
+
+    def __init__(
+        self,
+        image: np.ndarray,
+        denoise_budget_ms: Optional[float] = None,
+        document_quad: object = _NOT_LOCATED,
+    ):
+        """
+        ``document_quad`` passes in the receipt corners (or None for no border)
+        already located for this image, e.g. at another scale, so the graph does
+        not look for them again.
+        """
+        self.denoise_budget_ms = denoise_budget_ms
+        self._values: Dict[str, object] = {"input": image}
+        if document_quad is not _NOT_LOCATED:
+            self._values["document_quad"] = document_quad
+        self._locks = {stage: threading.Lock() for stage in self.STAGES}
+        self._variants: Dict[str, Optional[np.ndarray]] = {}
+        self._variant_locks = {name: threading.Lock() for name in self.PIPELINES}
+        self.timings: Dict[str, float] = {}
+        self.info: Dict[str, object] = {}
+
+    def _denoise(self, gray: np.ndarray) -> np.ndarray:
+        """Denoise with the tier that the noise level and the CPU budget allow."""
+        noise_sigma = estimate_noise(gray)
+        tier = _select_denoise_tier(noise_sigma, gray.size, self.denoise_budget_ms)
+        self.info["noise_sigma"] = round(noise_sigma, 2)
+        self.info["denoise_tier"] = tier
+        return _apply_denoise_tier(gray, tier, noise_sigma)
+
+    def _warp_document(self, image: np.ndarray) -> np.ndarray:
+        """Perspective correction with the corners of the ``document_quad`` stage."""
+        quad = self.get("document_quad")
+        return image if quad is None else _correct_perspective(image, quad)
+
+    def located_quad(self) -> object:
+        """The receipt corners if the graph has looked for them, else ``_NOT_LOCATED``."""
+        return self._values.get("document_quad", _NOT_LOCATED)
+
+    def get(self, stage: str):
+        """Return the output of ``stage``, computing it (and its inputs) once."""
+        if stage in self._values:
+            return self._values[stage]
+        func, source = self.STAGES[stage]
+        if isinstance(func, str):
+            func = getattr(self, func)
+        # Resolve the input first; the graph is acyclic so lock order follows the edges
+        value = self.get(source)
+        with self._locks[stage]:
+            if stage not in self._values:
+                started = time.perf_counter()
+                self._values[stage] = func(value)
+                self.timings[stage] = round((time.perf_counter() - started) * 1000, 2)
+            return self._values[stage]
+
+    def pipeline(self, name: str) -> np.ndarray:
+        """Binary output of a pipeline, without deskewing."""
+        return self.get(self.PIPELINES[name][0])
+
+    def variant(self, name: str) -> Optional[np.ndarray]:
+        """Deskewed output of a pipeline, or None if its preprocessing failed."""
+        with self._variant_locks[name]:
+            if name not in self._variants:
+                try:
+                    output_stage, angle_stage = self.PIPELINES[name]
+                    binary, angle = self.get(output_stage), self.get(angle_stage)
+                    started = time.perf_counter()
+                    self._variants[name] = _rotate(binary, angle)
+                    self.timings[f"deskew_{name}"] = round((time.perf_counter() - started) * 1000, 2)
+                except Exception as e:
+                    logger.warning(f"OCR preprocessing {name} failed: {e}")
+                    self._variants[name] = None
+            return self._variants[name]
+
+
+# Preprocessing pipelines available to the candidate scheduler, each a path
+# through ``_PreprocessGraph``
+_PREPROCESSORS: List[str] = list(_PreprocessGraph.PIPELINES)
+
+# Rough relative cost of each preprocessor (clahe_pro runs denoising and
+# perspective correction, which dwarfs the simple thresholding pipelines).
+_PREPROCESSOR_COST = {"binarize": 1.0, "otsu": 1.0, "clahe": 1.3, "clahe_pro": 4.0}
+
+
+# Time an item of a batch gets past its timeout to return its best result so far
+# (a preprocessing stage or a Tesseract call may be running when it expires)
+_BATCH_TIMEOUT_GRACE = 1.0
+
+
+class Deadline:
+    """
+    Deadline and cancellation flag for one OCR request, checked cooperatively
+    between candidates and pages and passed to Tesseract as its timeout.
+
+    ``seconds=None`` never expires on its own but can still be cancelled, e.g.
+    when the client disconnects. A child deadline also expires with its parent.
+    """
+
+    def __init__(self, seconds: Optional[float] = None, parent: Optional["Deadline"] = None):
+        self.expires_at = time.monotonic() + seconds if seconds is not None else None
+        self.parent = parent
+        self._cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set() or (self.parent is not None and self.parent.cancelled)
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None when there is no time limit."""
+        remaining = None if self.expires_at is None else self.expires_at - time.monotonic()
+        parent_remaining = self.parent.remaining() if self.parent is not None else None
+        if remaining is None or (parent_remaining is not None and parent_remaining < remaining):
+            return parent_remaining
+        return remaining
+
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return self.cancelled or (remaining is not None and remaining <= 0)
+
+    def tesseract_timeout(self) -> float:
+        """Timeout for one Tesseract call (0 means none), never below one second."""
+        remaining = self.remaining()
+        return 0 if remaining is None else max(1.0, remaining)
+
+
+@dataclass
+class OCRResult:
+    """Outcome of an OCR run, including which candidate produced the text."""
+    text: str = ""
+    confidence: float = 0.0
+    preprocessor: Optional[str] = None
+    config: Optional[str] = None
+    candidates_tried: int = 0
+    candidates_skipped: int = 0
+    elapsed: float = 0.0
+    pages: List[Dict[str, object]] = field(default_factory=list)
+    cached: bool = False
+    bucket: Optional[str] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+    preprocessing: Dict[str, object] = field(default_factory=dict)
+    triage: Dict[str, object] = field(default_factory=dict)
+    partial: bool = False
+    regions: List[Dict[str, object]] = field(default_factory=list)
+    deadline_hit: bool = False
+    # The time budget stopped the candidate search before it was done
+    budget_hit: bool = False
+    scale: float = 1.0
+
+    @property
+    def strategy(self) -> Optional[str]:
+        """Human readable name of the winning candidate, e.g. 'otsu/psm 6'."""
+        if self.preprocessor is None:
+            return None
+        return f"{self.preprocessor}/psm {_psm_of(self.config)}"
+
+    def to_dict(self) -> Dict[str, object]:
+        data = asdict(self)
+        data["strategy"] = self.strategy
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, object]) -> "OCRResult":
+        known = {name for name in cls.__dataclass_fields__}
+        return cls(**{key: value for key, value in data.items() if key in known})
+
+
+@dataclass
+class BatchItemResult:
+    """Outcome of one item of a batch; ``error`` is set when it failed or timed out."""
+    index: int
+    text: str = ""
+    confidence: float = 0.0
+    strategy: Optional[str] = None
+    elapsed: float = 0.0
+    error: Optional[str] = None
+    deadline_hit: bool = False
+    result: Optional[OCRResult] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class ReceiptSegment:
+    """One document region of an image, cropped at full resolution."""
+    image: np.ndarray
+    box: Tuple[int, int, int, int] = (0, 0, 0, 0)
+
+    def describe(self) -> Dict[str, object]:
+        return {"box": list(self.box)}
+
+
+def _psm_of(config: Optional[str]) -> str:
+    """Return the page segmentation mode of a Tesseract config string."""
+    if not config:
+        return "?"
+    parts = config.split()
+    if "--psm" in parts and parts.index("--psm") + 1 < len(parts):
+        return parts[parts.index("--psm") + 1]
+    return parts[-1]
+
+
+def _schedule_candidates(
+    preprocessors: List[str],
+    configs: List[str],
+    priors: Optional[Dict[Tuple[str, str], float]] = None,
+) -> List[Tuple[str, str]]:
+    """
+    Order (preprocessor, config) candidates by expected payoff.
+
+    The payoff of a candidate is its prior (how likely it is to produce the
+    winning text, 1.0 when unknown) divided by its relative cost.  Configs
+    earlier in ``configs`` are assumed to be the better default, so they get a
+    slightly higher prior.  Ties keep the original grid order, which makes the
+    schedule deterministic.
+    """
+    priors = priors or {}
+    scored = []
+    for config_index, config in enumerate(configs):
+        config_weight = 1.0 / (1.0 + 0.25 * config_index)
+        for name in preprocessors:
+            prior = priors.get((name, config), 1.0)
+            payoff = prior * config_weight / _PREPROCESSOR_COST.get(name, 1.0)
+            scored.append((-payoff, len(scored), (name, config)))
+    scored.sort()
+    return [candidate for _, _, candidate in scored]
+
+
+def _text_from_tesseract_data(data: Dict[str, list]) -> str:
+    """
+    Rebuild the plain text of a pytesseract ``image_to_data`` dict.
+
+    Mirrors Tesseract's own text renderer: words on a line are joined by spaces,
+    lines end with a newline and paragraphs/blocks are separated by a blank line.
+    """
+    lines: List[str] = []
+    current_line: Optional[Tuple[int, int, int]] = None
+    current_par: Optional[Tuple[int, int]] = None
+    words: List[str] = []
+    texts = data.get("text", [])
+    for i, word in enumerate(texts):
+        if "level" in data and int(data["level"][i]) != 5:
+            continue
+        block = int(data["block_num"][i]) if "block_num" in data else 0
+        par = int(data["par_num"][i]) if "par_num" in data else 0
+        line = int(data["line_num"][i]) if "line_num" in data else 0
+        if (block, par, line) != current_line:
+            if current_line is not None:
+                lines.append(" ".join(words))
+                if (block, par) != current_par:
+                    lines.append("")
+            current_line, current_par, words = (block, par, line), (block, par), []
+        word = str(word).strip()
+        if word:
+            words.append(word)
+    if current_line is not None:
+        lines.append(" ".join(words))
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def _average_confidence(data: Dict[str, list]) -> float:
+    """Average word confidence from a pytesseract ``image_to_data`` dict."""
+    confidences = [float(conf) for conf in data.get("conf", []) if float(conf) > 0]
+    return sum(confidences) / len(confidences) if confidences else 0.0
+
+
+# Tesseract config for re-running a single low-confidence line at a higher scale
+_LADDER_LINE_CONFIG = "--oem 3 --psm 7"
+
+
+def _scale_image(img: np.ndarray, scale: float) -> np.ndarray:
+    """Resize an image by ``scale``, area-averaging when shrinking."""
+    if scale == 1.0:
+        return img
+    interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_CUBIC
+    return cv2.resize(img, None, fx=scale, fy=scale, interpolation=interpolation)
+
+
+def _tesseract_lines(data: Dict[str, list]) -> List[Dict[str, object]]:
+    """
+    Group the words of a pytesseract ``image_to_data`` dict into lines, with the
+    line's bounding box, the indices of its words and their mean confidence.
+    Empty when the dict has no word boxes.
+    """
+    if not all(key in data for key in ("left", "top", "width", "height")):
+        return []
+    lines: Dict[Tuple[int, int, int], Dict[str, object]] = {}
+    for i, word in enumerate(data.get("text", [])):
+        if "level" in data and int(data["level"][i]) != 5:
+            continue
+        if not str(word).strip() or float(data["conf"][i]) < 0:
+            continue
+        key = (int(data["block_num"][i]), int(data["par_num"][i]), int(data["line_num"][i]))
+        left, top = int(data["left"][i]), int(data["top"][i])
+        right, bottom = left + int(data["width"][i]), top + int(data["height"][i])
+        line = lines.setdefault(key, {"words": [], "confidences": [], "left": left, "top": top,
+                                      "right": right, "bottom": bottom})
+        line["words"].append(i)
+        line["confidences"].append(float(data["conf"][i]))
+        line["left"], line["top"] = min(line["left"], left), min(line["top"], top)
+        line["right"], line["bottom"] = max(line["right"], right), max(line["bottom"], bottom)
+    for line in lines.values():
+        line["confidence"] = sum(line.pop("confidences")) / len(line["words"])
+    return list(lines.values())
+
+
+# Fast extract: share of the text lines at the top (vendor, GSTIN, date) and at
+# the bottom (totals) that are OCRed; the item table in between is skipped
+_FAST_HEADER_SHARE = 0.35
+_FAST_TOTALS_SHARE = 0.35
+_FAST_MIN_LINES = 4
+
+
+def _text_line_bands(binary: np.ndarray, min_height: int = 4, max_gap: int = 2) -> List[Tuple[int, int]]:
+    """
+    Find text lines in a deskewed binarized image (dark text on white) from its
+    horizontal ink profile. Returns (top, bottom) row ranges, bottom exclusive.
+    """
+    ink_rows = (binary < 128).sum(axis=1) > max(1, binary.shape[1] // 500)
+    bands: List[Tuple[int, int]] = []
+    top = None
+    for row, has_ink in enumerate(np.append(ink_rows, False)):
+        if has_ink and top is None:
+            top = row
+        elif not has_ink and top is not None:
+            if bands and top - bands[-1][1] <= max_gap:
+                top = bands.pop()[0]
+            bands.append((top, row))
+            top = None
+    return [(top, bottom) for top, bottom in bands if bottom - top >= min_height]
+
+
+def _classify_regions(bands: List[Tuple[int, int]], height: int) -> Optional[Dict[str, Tuple[int, int]]]:
+    """
+    Split text lines into header, body and totals regions and return the row
+    ranges of the header and totals. None when there are too few lines for a
+    body worth skipping.
+    """
+    if len(bands) < 2 * _FAST_MIN_LINES + 1:
+        return None
+    header_lines = max(_FAST_MIN_LINES, round(len(bands) * _FAST_HEADER_SHARE))
+    totals_lines = max(_FAST_MIN_LINES, round(len(bands) * _FAST_TOTALS_SHARE))
+    if header_lines + totals_lines >= len(bands):
+        return None
+
+    def span(first: Tuple[int, int], last: Tuple[int, int]) -> Tuple[int, int]:
+        margin = max(4, (first[1] - first[0]) // 2)
+        return max(0, first[0] - margin), min(height, last[1] + margin)
+
+    return {
+        "header": span(bands[0], bands[header_lines - 1]),
+        "totals": span(bands[-totals_lines], bands[-1]),
+    }
 
 
 class OCRService:
     """Service for extracting text from images and PDFs using Tesseract OCR."""
 
-    def __init__(self, tesseract_configs: List[str] = None):
+    # Tesseract configs for the regions OCRed in fast mode: the header is a
+    # uniform block of text, the totals are label/amount columns
+    FAST_REGION_CONFIGS = {
+        "header": "--oem 3 --psm 6",
+        "totals": "--oem 3 --psm 4",
+    }
+
+    def __init__(
+        self,
+        tesseract_configs: List[str] = None,
+        time_budget: Optional[float] = None,
+        single_pass: bool = True,
+        engine: Optional[str] = None,
+        max_engine_handles: Optional[int] = None,
+        max_workers: Optional[int] = None,
+        pdf_workers: Optional[int] = None,
+        batch_workers: Optional[int] = None,
+        max_pages_in_flight: int = 4,
+        use_pdf_text_layer: bool = True,
+        optimal_width: int = 1000,
+        cache: Optional[OCRCache] = None,
+        strategy_stats: Optional[StrategyStats] = None,
+        prune_losers: bool = False,
+        denoise_budget_ms: Optional[float] = 250.0,
+        triage: bool = True,
+        grayscale_decode: bool = True,
+        resolution_ladder: Optional[Sequence[float]] = None,
+        ladder_line_confidence: float = 70.0,
+        ladder_max_low_share: float = 0.3,
+        scale_by_text_height: bool = True,
+    ):
         """
         Initialize OCR service.
 
         Args:
             tesseract_configs: A list of Tesseract configuration strings to try.
+            time_budget: Optional per-image wall clock budget in seconds. Once it is
+                used up no further OCR candidates are started.
+            single_pass: Rebuild the text from ``image_to_data`` so every candidate
+                costs a single Tesseract run instead of two.
+            engine: Tesseract backend, "subprocess" (pytesseract) or "tesserocr" (pooled
+                in-process API handles). Defaults to the OCR_ENGINE env var.
+            max_engine_handles: Upper bound on pooled Tesseract handles across threads.
+                Defaults to one handle per distinct Tesseract config (candidates, fast
+                regions and ladder lines) for every thread that can call Tesseract: the
+                candidate, page and batch pool workers and the calling thread.
+            max_workers: Number of OCR candidates evaluated in parallel. Defaults to the
+                OCR_MAX_WORKERS env var, or 1 (serial). Each Tesseract process gets an
+                OMP_THREAD_LIMIT of the CPU count divided by the candidate, page and
+                batch workers, so that concurrent processes do not oversubscribe the
+                CPU (unless OMP_THREAD_LIMIT is already set).
+            pdf_workers: Number of PDF pages OCR'd in parallel. Defaults to the
+                OCR_PDF_WORKERS env var, or 2.
+            batch_workers: Number of images OCR'd in parallel by ``extract_batch`` and
+                ``iter_batch``. Defaults to the OCR_BATCH_WORKERS env var, or 2.
+            max_pages_in_flight: Upper bound on rasterized PDF pages held in memory
+                (rendered and waiting or being OCR'd) at any time.
+            use_pdf_text_layer: Take the embedded text of PDF pages that have a usable
+                text layer (e-invoices) instead of rasterizing and OCR'ing them.
+            optimal_width: Width images are decoded near, and resized to when their text
+                height cannot be measured (or ``scale_by_text_height`` is off).
+            cache: Optional OCR result cache for file path and bytes inputs. It is
+                bound to the settings above, so changing them invalidates old entries.
+            strategy_stats: Optional record of historical winners. When given, every
+                run is recorded and candidates are ordered by the win rates of
+                similar images.
+            prune_losers: Drop candidates that never won for similar images.
+            denoise_budget_ms: CPU budget per image for the denoising step of the
+                clahe_pro pipeline. Clean images skip denoising; noisy ones get the
+                strongest tier (median, bilateral, downscaled NLM, full NLM) whose
+                estimated cost fits. ``None`` removes the limit.
+            triage: Measure image quality before OCR and only run the one or two
+                pipelines it routes to, falling back to the other candidates when
+                they do not reach ``min_confidence``.
+            grayscale_decode: Decode images straight to grayscale. Every built-in
+                pipeline works on grayscale; turn this off for a pipeline that needs colour.
+            resolution_ladder: Scales, relative to the image as scaled for OCR, to OCR
+                at in increasing order, e.g. (0.6, 1.0). The candidate search runs at the first
+                scale; only what stays uncertain is re-run at the next one. Defaults to
+                (1.0,), a single full resolution pass. Scales apply on top of the text
+                height scaling, so a rung below 1.0 takes glyphs under ``_TEXT_HEIGHT_RANGE``
+                and images that fail there pay for a second candidate search.
+            ladder_line_confidence: Mean word confidence below which a line is re-run
+                at the next scale of the ladder.
+            ladder_max_low_share: Share of low-confidence lines above which the whole
+                page is re-run at the next scale instead of just those lines. Pages below
+                the confidence target are always re-run whole.
+            scale_by_text_height: Scale images by their measured glyph height (from
+                connected components) rather than to a fixed width, so small print gets
+                enlarged and large print is not.
         """
         if tesseract_configs is None:
             self.tesseract_configs = ["--oem 3 --psm 6", "--oem 3 --psm 3", "--oem 3 --psm 4"]
         else:
             self.tesseract_configs = tesseract_configs
+        self.time_budget = time_budget
+        self.single_pass = single_pass
+        self.max_workers = max(1, max_workers or int(os.getenv("OCR_MAX_WORKERS", "1")))
+        self._executor: Optional[ThreadPoolExecutor] = None
+        if self.max_workers > 1:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ocr-candidate")
+        self.pdf_workers = max(1, pdf_workers or int(os.getenv("OCR_PDF_WORKERS", "2")))
+        self.max_pages_in_flight = max(1, max_pages_in_flight)
+        self.use_pdf_text_layer = use_pdf_text_layer
+        self.optimal_width = optimal_width
+        self.strategy_stats = strategy_stats
+        self.prune_losers = prune_losers
+        self.denoise_budget_ms = denoise_budget_ms
+        self.triage = triage
+        self.grayscale_decode = grayscale_decode
+        self.resolution_ladder = tuple(sorted(resolution_ladder)) if resolution_ladder else (1.0,)
+        self.ladder_line_confidence = ladder_line_confidence
+        self.ladder_max_low_share = ladder_max_low_share
+        self.scale_by_text_height = scale_by_text_height
+        self.cache: Optional[OCRCache] = None
+        self.use_cache(cache)
+        self._page_executor = ThreadPoolExecutor(max_workers=self.pdf_workers, thread_name_prefix="ocr-page")
+        self.batch_workers = max(1, batch_workers or int(os.getenv("OCR_BATCH_WORKERS", "2")))
+        self._batch_executor = ThreadPoolExecutor(max_workers=self.batch_workers, thread_name_prefix="ocr-batch")
             
         _ensure_tesseract_cmd()
-        logger.info("OCRService initialized")
+        # A thread holding fewer handles than there are configs would re-initialize
+        # one on nearly every call, so every thread gets a handle per config
+        engine_configs = {*self.tesseract_configs, *self.FAST_REGION_CONFIGS.values(), _LADDER_LINE_CONFIG}
+        engine_threads = self.max_workers + self.pdf_workers + self.batch_workers + 1
+        self.engine = create_engine(
+            engine or os.getenv("OCR_ENGINE", "subprocess"),
+            max_handles=max_engine_handles or engine_threads * len(engine_configs),
+            handles_per_thread=len(engine_configs),
+            thread_limit=max(1, (os.cpu_count() or 1) // (self.max_workers + self.pdf_workers + self.batch_workers)),
+        )
+        logger.info(f"OCRService initialized with {self.engine.name} engine")
         logger.info(f"PDF support available: {PDF_SUPPORT}")
 
     def extract_text_from_pdf(self, pdf_input: Union[str, Path, bytes]) -> str:
@@ -337,140 +1054,856 @@ class OCRService:
             raise ImportError("PDF support requires pdf2image. Install with: pip install pdf2image")
 
         try:
-            # Convert PDF to images
-            images = _convert_pdf_to_images(pdf_input)
+            return self.extract_pdf(pdf_input).text
+        except Exception as e:
+            logger.error(f"PDF OCR failed: {e}")
+            return ""
 
-            if not images:
-                logger.warning("PDF conversion returned no images")
-                return ""
+    def extract_pdf(self, pdf_input: Union[str, Path, bytes], dpi: int = 200, deadline: Optional[Deadline] = None) -> OCRResult:
+        """
+        OCR a PDF page by page and combine the pages with "--- Page N ---" markers.
 
-            # Extract text from each page
-            all_text = []
-            for i, page_image in enumerate(images):
-                logger.info(f"Processing PDF page {i + 1}/{len(images)}")
-                page_text = self._extract_text_from_pil_image(page_image)
-                if page_text.strip():
-                    all_text.append(f"--- Page {i + 1} ---\n{page_text}")
+        Pages with a usable embedded text layer take that text directly. The other
+        pages are rasterized in small windows (pdftoppm first/last page) and OCR'd on
+        the page pool; at most ``max_pages_in_flight`` rendered pages are held at once.
+        Each entry of ``pages`` records whether the page came from "text_layer" or "ocr".
 
-            combined_text = "\n\n".join(all_text)
-            logger.info(f"PDF OCR complete: {len(combined_text)} characters from {len(images)} page(s)")
-            return combined_text
+        Args:
+            pdf_input: PDF file path or bytes
+            dpi: Rasterization resolution
+            deadline: Stop rendering and OCRing further pages once it expires; pages
+                not reached are recorded with source "skipped".
 
-        except Exception as e:
-            logger.error(f"PDF OCR failed: {e}")
-            return ""
+        Returns:
+            OCRResult with the combined text and one entry per page in ``pages``
+        """
+        if not PDF_SUPPORT:
+            raise ImportError("PDF support requires pdf2image. Install with: pip install pdf2image")
+
+        if isinstance(pdf_input, bytes):
+            # Write the bytes once instead of once per page window
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                pdf_path = Path(tmp_dir) / "input.pdf"
+                pdf_path.write_bytes(pdf_input)
+                return self.extract_pdf(pdf_path, dpi=dpi, deadline=deadline)
+
+        started = time.monotonic()
+        page_count = _pdf_page_count(pdf_input)
+        window = max(1, min(self.pdf_workers, self.max_pages_in_flight))
+        in_flight: Dict[Future, int] = {}
+        page_results: Dict[int, OCRResult] = {}
+
+        def collect(done) -> None:
+            for future in done:
+                page_number = in_flight.pop(future)
+                try:
+                    page_results[page_number] = future.result()
+                except Exception as e:
+                    logger.error(f"OCR of PDF page {page_number} failed: {e}")
+                    page_results[page_number] = OCRResult()
+
+        text_layer = _pdf_text_layer(pdf_input) if self.use_pdf_text_layer else []
+        ocr_pages = []
+        for page_number in range(1, page_count + 1):
+            layer = text_layer[page_number - 1] if page_number <= len(text_layer) else ""
+            if _has_usable_text_layer(layer):
+                page_results[page_number] = OCRResult(text=layer.strip(), confidence=100.0)
+            else:
+                ocr_pages.append(page_number)
+        if text_layer:
+            logger.info(f"PDF text layer used for {page_count - len(ocr_pages)}/{page_count} page(s)")
+
+        # Group the pages to OCR into windows of consecutive pages
+        windows: List[Tuple[int, int]] = []
+        for page_number in ocr_pages:
+            if windows and windows[-1][1] == page_number - 1 and page_number - windows[-1][0] < window:
+                windows[-1] = (windows[-1][0], page_number)
+            else:
+                windows.append((page_number, page_number))
+
+        deadline_hit = False
+        for first_page, last_page in windows:
+            # Make room so rendered + in-flight pages stay within the cap
+            while in_flight and len(in_flight) + (last_page - first_page + 1) > self.max_pages_in_flight:
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                collect(done)
+
+            if deadline is not None and deadline.expired():
+                logger.warning(f"OCR deadline hit, skipping PDF pages {first_page}-{page_count}")
+                deadline_hit = True
+                break
+
+            images = _render_pdf_pages(pdf_input, first_page, last_page, dpi=dpi)
+            for offset, page_image in enumerate(images):
+                page_number = first_page + offset
+                logger.info(f"Processing PDF page {page_number}/{page_count}")
+                future = self._page_executor.submit(self.extract, page_image, is_pdf_page=True, deadline=deadline)
+                in_flight[future] = page_number
+            del images
+        collect(wait(list(in_flight)).done)
+
+        result = OCRResult()
+        all_text = []
+        for page_number in range(1, page_count + 1):
+            page = page_results.get(page_number)
+            if page is None:
+                result.pages.append({"page": page_number, "source": "skipped", "confidence": 0.0,
+                                     "strategy": None, "characters": 0})
+                continue
+            result.candidates_tried += page.candidates_tried
+            result.candidates_skipped += page.candidates_skipped
+            deadline_hit = deadline_hit or page.deadline_hit
+            result.budget_hit = result.budget_hit or page.budget_hit
+            result.pages.append({
+                "page": page_number,
+                "source": "ocr" if page_number in ocr_pages else "text_layer",
+                "confidence": page.confidence,
+                "strategy": page.strategy,
+                "characters": len(page.text),
+            })
+            if page.text.strip():
+                all_text.append(f"--- Page {page_number} ---\n{page.text}")
+
+        result.text = "\n\n".join(all_text)
+        confidences = [page.confidence for page in page_results.values() if page.text.strip()]
+        result.confidence = sum(confidences) / len(confidences) if confidences else 0.0
+        result.deadline_hit = deadline_hit
+        result.elapsed = time.monotonic() - started
+        logger.info(f"PDF OCR complete: {len(result.text)} characters from {page_count} page(s) in {result.elapsed:.2f}s")
+        return result
+
+    def segment_receipts(self, img: Union[str, Path, bytes, Image.Image, np.ndarray]) -> List[ReceiptSegment]:
+        """
+        Split an image into its separate receipts (see ``find_receipt_regions``),
+        e.g. several receipts scanned on one flatbed page. An image holding a single
+        receipt, or none that can be found, yields the whole image.
+
+        The crops are ordinary images: OCR them in parallel with ``extract_batch``.
+        PDFs are not split and yield no segments: a PDF is one document, whose pages
+        ``extract`` OCRs (or reads from the text layer) together.
+        """
+        if (isinstance(img, (str, Path)) and _is_pdf_file(img)) or (isinstance(img, bytes) and _is_pdf_bytes(img)):
+            return []
+        image = _load_image(img, grayscale=self.grayscale_decode)[0]
+        boxes = find_receipt_regions(_to_gray(image))
+        if len(boxes) < 2:
+            return [ReceiptSegment(image, (0, 0, image.shape[1], image.shape[0]))]
+        logger.info(f"Found {len(boxes)} receipts in the image")
+        # Copies, so the full image is freed once it has been cut up
+        return [ReceiptSegment(image[y0:y1, x0:x1].copy(), (x0, y0, x1, y1)) for x0, y0, x1, y1 in boxes]
 
     def _extract_text_from_pil_image(self, pil_image: Image.Image) -> str:
         """Extract text from a PIL Image."""
         return self.extract_text_from_image(pil_image)
 
-    def extract_text_from_image(self, img: Union[str, Path, bytes, Image.Image, np.ndarray], min_confidence: int = 60) -> str:
+    def extract_text_from_image(
+        self,
+        img: Union[str, Path, bytes, Image.Image, np.ndarray],
+        min_confidence: int = 60,
+        deadline: Optional[Deadline] = None,
+    ) -> str:
         """
         Extract text from a single image or PDF using multiple preprocessing techniques.
 
         Args:
             img: Image/PDF input (file path, bytes, PIL Image, or numpy array)
             min_confidence: The minimum confidence score to consider the OCR successful.
+            deadline: Return the best text found so far once it expires or is cancelled.
 
         Returns:
             Extracted text string
         """
         try:
-            # Check if input is a PDF
-            if isinstance(img, (str, Path)) and _is_pdf_file(img):
-                logger.info(f"Detected PDF file: {img}")
-                return self.extract_text_from_pdf(img)
-
-            if isinstance(img, bytes) and _is_pdf_bytes(img):
-                logger.info("Detected PDF bytes")
-                return self.extract_text_from_pdf(img)
-
-            # Convert to OpenCV format for images
-            bgr_image = _as_numpy_bgr(img)
-            if bgr_image is None:
-                raise ValueError("Failed to load image")
-            
-            # Resize for optimal OCR
-            bgr_image = _resize_to_optimal_dpi(bgr_image)
-            
-            # Try multiple preprocessing approaches
-            preprocessors = [
-                ("binarize", _preprocess_pipeline_binarize),
-                ("otsu", _preprocess_pipeline_otsu),
-                ("clahe", _preprocess_pipeline_clahe),
-                ("clahe_pro", _preprocess_pipeline_clahe_pro),
-            ]
-            
-            best_text = ""
-            best_confidence = 0
-            
-            for name, preprocess_func in preprocessors:
-                try:
-                    # Preprocess image
-                    processed = preprocess_func(bgr_image)
-                    
-                    # Apply deskewing
-                    deskewed = _deskew(processed)
-
-                    for tesseract_config in self.tesseract_configs:
-                        # Extract text
-                        text = pytesseract.image_to_string(deskewed, config=tesseract_config)
-                        
-                        # Get confidence score
-                        try:
-                            data = pytesseract.image_to_data(deskewed, output_type=pytesseract.Output.DICT, config=tesseract_config)
-                            confidences = [int(conf) for conf in data['conf'] if int(conf) > 0]
-                            avg_confidence = sum(confidences) / len(confidences) if confidences else 0
-                        except:
-                            avg_confidence = len(text.strip())  # Fallback: use text length as confidence
-                        
-                        psm = tesseract_config.split(" ")[-1]
-                        logger.info(f"OCR with {name} (PSM {psm}): confidence={avg_confidence:.1f}, text_length={len(text)}")
-                        
-                        # Keep best result
-                        if avg_confidence > best_confidence and text.strip():
-                            best_text = text
-                            best_confidence = avg_confidence
-                        
-                except Exception as e:
-                    logger.warning(f"OCR preprocessing {name} failed: {e}")
-                    continue
-            
-            # Fallback: try raw image if all preprocessing failed
-            if not best_text.strip():
-                try:
-                    gray = cv2.cvtColor(bgr_image, cv2.COLOR_BGR2GRAY)
-                    best_text = pytesseract.image_to_string(gray, config=self.tesseract_configs[0])
-                    logger.info("Used fallback raw OCR")
-                except Exception as e:
-                    logger.error(f"Fallback OCR failed: {e}")
+            return self.extract(img, min_confidence=min_confidence, deadline=deadline).text
 
-            if best_confidence < min_confidence:
-                logger.warning(f"OCR result confidence ({best_confidence:.1f}) is below threshold ({min_confidence})")
-
-            logger.info(f"Final OCR result: {len(best_text)} characters extracted")
-            return best_text.strip()
-            
         except Exception as e:
             logger.error(f"OCR extraction failed: {e}")
             return ""
+
+    def use_cache(self, cache: Optional[OCRCache]) -> None:
+        """Attach a result cache (``None`` detaches it), bound to this service's settings."""
+        if cache is not None:
+            cache.use_settings(settings_fingerprint(self.cache_settings()))
+        self.cache = cache
+
+    def cache_settings(self) -> Dict[str, object]:
+        """OCR settings that affect results; part of every cache key."""
+        return {
+            "tesseract_configs": self.tesseract_configs,
+            "preprocessors": _PREPROCESSORS,
+            "optimal_width": self.optimal_width,
+            "single_pass": self.single_pass,
+            "use_pdf_text_layer": self.use_pdf_text_layer,
+            "denoise_budget_ms": self.denoise_budget_ms,
+            "triage": self.triage,
+            "grayscale_decode": self.grayscale_decode,
+            "resolution_ladder": list(self.resolution_ladder),
+            "ladder_line_confidence": self.ladder_line_confidence,
+            "ladder_max_low_share": self.ladder_max_low_share,
+            "scale_by_text_height": self.scale_by_text_height,
+        }
+
+    def extract(
+        self,
+        img: Union[str, Path, bytes, Image.Image, np.ndarray],
+        min_confidence: int = 60,
+        target_confidence: Optional[float] = None,
+        time_budget: Optional[float] = None,
+        is_pdf_page: bool = False,
+        denoise_budget_ms: Optional[float] = None,
+        fast: bool = False,
+        deadline: Optional[Deadline] = None,
+    ) -> OCRResult:
+        """
+        Run the scheduled OCR candidates on a single image and return the best result.
+        PDF inputs are handed to ``extract_pdf``. File path and bytes inputs are served
+        from the result cache when one is configured.
+
+        Candidates (preprocessor x Tesseract config) are tried in order of expected
+        payoff. The search stops early once a candidate reaches ``target_confidence``
+        or the time budget is used up; the remaining candidates are reported as skipped.
+
+        Args:
+            img: Image input (file path, bytes, PIL Image, or numpy array)
+            min_confidence: The minimum confidence score to consider the OCR successful.
+            target_confidence: Confidence at which the search stops early. Defaults to
+                ``min_confidence``.
+            time_budget: Wall clock budget in seconds, overriding the service default.
+                A result it cut short has ``budget_hit`` set and is not cached.
+            is_pdf_page: The image is a rasterized PDF page (used to group strategy statistics).
+            denoise_budget_ms: Denoising CPU budget in milliseconds, overriding the service default.
+            fast: Only OCR the header and totals regions (see ``_extract_fast``). The
+                result is marked partial. Ignored for PDFs.
+            deadline: Checked between candidates and pages and passed to Tesseract as
+                its timeout. When it expires or is cancelled the best result so far is
+                returned with ``deadline_hit`` set (and not cached).
+
+        Returns:
+            OCRResult describing the winning candidate
+        """
+        cache_key = None
+        source = img
+        if self.cache is not None and isinstance(img, (str, Path, bytes)):
+            data = img if isinstance(img, bytes) else Path(img).read_bytes()
+            cache_key = self.cache.key(data, min_confidence, target_confidence, denoise_budget_ms, fast)
+            # Decode images from the bytes already in memory instead of reading the file again
+            source = data
+            cached = self.cache.get(cache_key)
+            ocr_metrics.record_cache(cached is not None)
+            if cached is not None:
+                logger.info("OCR result served from cache")
+                result = OCRResult.from_dict(cached)
+                result.cached = True
+                return result
+
+        # Check if input is a PDF
+        if isinstance(img, (str, Path)) and _is_pdf_file(img):
+            logger.info(f"Detected PDF file: {img}")
+            result = self.extract_pdf(img, deadline=deadline)
+        elif isinstance(img, bytes) and _is_pdf_bytes(img):
+            logger.info("Detected PDF bytes")
+            result = self.extract_pdf(img, deadline=deadline)
+        elif fast:
+            result = self._extract_fast(source, min_confidence, denoise_budget_ms, deadline)
+        else:
+            result = self._extract_image(
+                source, min_confidence, target_confidence, time_budget, is_pdf_page, denoise_budget_ms, deadline
+            )
+
+        ocr_metrics.record_result(result)
+        if cache_key is not None and not (result.deadline_hit or result.budget_hit):
+            try:
+                self.cache.put(cache_key, result.to_dict())
+            except Exception as e:
+                # e.g. "database is locked" with several workers sharing the file; the OCR itself succeeded
+                logger.warning(f"Could not cache the OCR result: {e}")
+        return result
+
+    def _prepare_image(
+        self, img: Union[str, Path, bytes, Image.Image, np.ndarray], result: OCRResult
+    ) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """
+        Decode an image and scale it for OCR, recording the timings and, in
+        ``result.preprocessing``, the measured text height, the resize factor
+        relative to the full resolution image and, for photos cropped to the
+        receipt, the ``crop`` box in full resolution pixels.
+
+        With ``scale_by_text_height`` a photo is cropped to the receipt located in
+        it and the crop is scaled so its glyphs land in Tesseract's preferred height
+        range; images without measurable text, or with the option off, are resized
+        to ``optimal_width``. Either way the result stays within ``_MAX_OCR_PIXELS``.
+        """
+        # Decode near the OCR width, in grayscale unless a pipeline needs colour
+        stage_started = time.perf_counter()
+        image, original_shape = _load_image(img, self.optimal_width, self.grayscale_decode)
+        result.timings["decode"] = round((time.perf_counter() - stage_started) * 1000, 2)
+
+        stage_started = time.perf_counter()
+        box = (0.0, 0.0, 1.0, 1.0)
+        if self.scale_by_text_height:
+            # Measure and scale only the receipt, not the desk around it
+            box = _document_box(_to_gray(image)) or box
+            image = _crop_to_box(image, box)
+        # Full resolution size of the region being OCR'd
+        region_width = (box[2] - box[0]) * original_shape[1]
+
+        def decode_region(width: float) -> np.ndarray:
+            """Decode the region again at about ``width`` pixels wide (at most full resolution)."""
+            full_width = min(original_shape[1], int(width * original_shape[1] / region_width) + 1)
+            return _crop_to_box(_load_image(img, full_width, self.grayscale_decode)[0], box)
+
+        def reduced() -> bool:
+            return image.shape[1] < region_width - 1
+
+        if reduced() and image.shape[1] < self.optimal_width:
+            # A receipt that covers a small part of the photo: decode it at the OCR width
+            image = decode_region(self.optimal_width)
+
+        text_height = _estimate_text_height(_to_gray(image)) if self.scale_by_text_height else None
+        if text_height is None:
+            image = _resize_to_optimal_dpi(image, self.optimal_width)
+        else:
+            factor = min(_text_height_factor(text_height, image.shape), _pixel_budget_factor(image.shape))
+            if factor > 1.0 and reduced():
+                # Small text in a reduced decode: decode again at the resolution it needs
+                width = image.shape[1]
+                image = decode_region(width * factor)
+                text_height *= image.shape[1] / float(width)
+                factor = min(_text_height_factor(text_height, image.shape), _pixel_budget_factor(image.shape))
+            # In full resolution pixels, so that text_height x resize_factor is the OCR glyph height
+            result.preprocessing["text_height"] = round(text_height * region_width / float(image.shape[1]), 1)
+            if factor != 1.0:
+                logger.info(f"Scaling image by {factor:.2f} for a text height of {text_height:.0f}px")
+                image = _scale_image(image, factor)
+        budget = _pixel_budget_factor(image.shape)
+        if budget < 1.0:
+            logger.info(f"Scaling image by {budget:.2f} to stay within {_MAX_OCR_PIXELS} pixels")
+            image = _scale_image(image, budget)
+        if box != (0.0, 0.0, 1.0, 1.0):
+            height, width = original_shape
+            result.preprocessing["crop"] = [round(box[0] * width), round(box[1] * height),
+                                            round(box[2] * width), round(box[3] * height)]
+        result.preprocessing["resize_factor"] = round(image.shape[1] / region_width, 3)
+        result.timings["resize"] = round((time.perf_counter() - stage_started) * 1000, 2)
+        return image, original_shape
+
+    def _extract_image(
+        self,
+        img: Union[str, Path, bytes, Image.Image, np.ndarray],
+        min_confidence: int,
+        target_confidence: Optional[float],
+        time_budget: Optional[float],
+        is_pdf_page: bool = False,
+        denoise_budget_ms: Optional[float] = None,
+        deadline: Optional[Deadline] = None,
+        prepared: Optional[Tuple[np.ndarray, Tuple[int, int], OCRResult]] = None,
+    ) -> OCRResult:
+        """
+        Candidate search for a single (non-PDF) image. ``prepared`` passes in the
+        output of ``_prepare_image`` (image, original shape and the result it
+        recorded into) when the caller has already decoded and scaled ``img``.
+        """
+        started = time.monotonic()
+        if target_confidence is None:
+            target_confidence = min_confidence
+        if time_budget is None:
+            time_budget = self.time_budget
+        if denoise_budget_ms is None:
+            denoise_budget_ms = self.denoise_budget_ms
+
+        if prepared is None:
+            result = OCRResult()
+            bgr_image, original_shape = self._prepare_image(img, result)
+        else:
+            bgr_image, original_shape, prepared_result = prepared
+            result = OCRResult(timings=dict(prepared_result.timings), preprocessing=dict(prepared_result.preprocessing))
+
+        priors: Dict[Tuple[str, str], float] = {}
+        if self.strategy_stats is not None:
+            result.bucket = feature_bucket(image_features(bgr_image, original_shape, is_pdf_page))
+            priors = self.strategy_stats.priors(result.bucket)
+        schedule = _schedule_candidates(_PREPROCESSORS, self.tesseract_configs, priors)
+        if self.prune_losers and self.strategy_stats is not None:
+            losers = self.strategy_stats.losers(result.bucket)
+            kept = [candidate for candidate in schedule if candidate not in losers]
+            # Never prune the whole grid
+            if kept and len(kept) < len(schedule):
+                logger.info(f"Pruned {len(schedule) - len(kept)} candidate(s) that never win for {result.bucket} images")
+                schedule = kept
+        # Triage: run the pipelines suited to the image first and the rest only
+        # as a fallback
+        phases = [schedule]
+        # Receipt corners at scale 1.0 once located (by triage or a graph), shared
+        # by the graphs of every ladder scale
+        located: Dict[str, object] = {"quad": _NOT_LOCATED}
+        if self.triage:
+            stage_started = time.perf_counter()
+            located["quad"] = locate_document(_to_gray(bgr_image))
+            metrics = triage_image(bgr_image, located["quad"])
+            route = route_pipelines(metrics)
+            result.timings["triage"] = round((time.perf_counter() - stage_started) * 1000, 2)
+            routed = sorted((c for c in schedule if c[0] in route), key=lambda c: route.index(c[0]))
+            if routed:
+                phases = [routed, [c for c in schedule if c[0] not in route]]
+            result.triage = {**metrics, "route": route, "fallback": False}
+            logger.info(f"Triage routed image to {', '.join(route)}: {metrics}")
+
+        tried: List[Tuple[str, str]] = []
+
+        def budget_used_up() -> bool:
+            return time_budget is not None and time.monotonic() - started >= time_budget
+
+        def graph_at(scale: float) -> _PreprocessGraph:
+            quad = located["quad"]
+            if quad is not _NOT_LOCATED and quad is not None:
+                quad = quad * scale
+            return _PreprocessGraph(_scale_image(bgr_image, scale), denoise_budget_ms, document_quad=quad)
+
+        def remember_quad(graph: _PreprocessGraph, scale: float) -> None:
+            quad = graph.located_quad()
+            if quad is not _NOT_LOCATED and located["quad"] is _NOT_LOCATED:
+                located["quad"] = None if quad is None else quad / scale
+
+        def search(scale: float) -> Tuple[OCRResult, Optional[Dict[str, list]]]:
+            """Candidate search on the image at one rung of the resolution ladder."""
+            graph = graph_at(scale)
+            attempt = OCRResult(scale=scale)
+            suffix = "" if scale == 1.0 else f"@{scale:g}"
+            winner: Dict[str, Optional[Dict[str, list]]] = {"data": None}
+
+            def evaluate(candidate: Tuple[str, str]) -> Optional[Tuple[str, float, Optional[Dict[str, list]]]]:
+                name, tesseract_config = candidate
+                deskewed = graph.variant(name)
+                if deskewed is None:
+                    return None
+                psm = _psm_of(tesseract_config)
+                call_started = time.perf_counter()
+                try:
+                    timeout = deadline.tesseract_timeout() if deadline is not None else 0
+                    text, avg_confidence, data = self._run_tesseract_data(deskewed, tesseract_config, timeout)
+                except Exception as e:
+                    logger.warning(f"OCR with {name} (PSM {psm}) failed: {e}")
+                    return "", 0.0, None
+                finally:
+                    # One key per candidate, so concurrent evaluations never write the same one
+                    result.timings[f"tesseract:{name}/psm {psm}{suffix}"] = round(
+                        (time.perf_counter() - call_started) * 1000, 2
+                    )
+                logger.info(
+                    f"OCR with {name} (PSM {psm}) at scale {scale:g}: "
+                    f"confidence={avg_confidence:.1f}, text_length={len(text)}"
+                )
+                return text, avg_confidence, data
+
+            def target_reached() -> bool:
+                return attempt.confidence >= target_confidence and bool(attempt.text.strip())
+
+            # Candidates run in waves of max_workers. Outcomes are applied in schedule
+            # order and the wave is cut at the same point the serial loop would stop,
+            # so the winner does not depend on the number of workers.
+            def run_waves(pending: List[Tuple[str, str]]) -> None:
+                while pending:
+                    if target_reached():
+                        logger.info(f"Confidence target {target_confidence} reached, stopping early")
+                        return
+                    if budget_used_up():
+                        logger.info(f"OCR time budget of {time_budget:.2f}s used up, stopping early")
+                        attempt.budget_hit = True
+                        return
+                    if deadline is not None and deadline.expired():
+                        logger.warning("OCR deadline hit, returning the best result so far")
+                        attempt.deadline_hit = True
+                        return
+
+                    wave = pending[:self.max_workers]
+                    del pending[:self.max_workers]
+                    if self._executor is not None and len(wave) > 1:
+                        outcomes = list(self._executor.map(evaluate, wave))
+                    else:
+                        outcomes = [evaluate(wave[0])]
+
+                    for (name, tesseract_config), outcome in zip(wave, outcomes):
+                        if outcome is None:
+                            continue
+                        attempt.candidates_tried += 1
+                        tried.append((name, tesseract_config))
+                        if target_reached():
+                            continue
+                        text, avg_confidence, data = outcome
+
+                        # Keep best result
+                        if avg_confidence > attempt.confidence and text.strip():
+                            attempt.text = text
+                            attempt.confidence = avg_confidence
+                            attempt.preprocessor = name
+                            attempt.config = tesseract_config
+                            winner["data"] = data
+
+            for phase, candidates in enumerate(phases):
+                if phase > 0:
+                    if attempt.confidence >= min_confidence and attempt.text.strip():
+                        break
+                    if candidates and not target_reached() and not budget_used_up():
+                        logger.info(f"Routed pipelines stayed below {min_confidence}, falling back to the other candidates")
+                        result.triage["fallback"] = True
+                        ocr_metrics.record_fallback("triage")
+                run_waves(list(candidates))
+
+            attempt.candidates_skipped = len(schedule) - attempt.candidates_tried
+            result.timings.update({f"{stage}{suffix}": ms for stage, ms in graph.timings.items()})
+            result.preprocessing.update(graph.info)
+            remember_quad(graph, scale)
+            return attempt, winner["data"]
+
+        # Resolution ladder: OCR at the first (smallest) scale, then re-run only the
+        # low-confidence lines at the next scale, or the whole page when the page
+        # itself is not confident or too many of its lines are low
+        ladder = list(self.resolution_ladder)
+        best, best_data = search(ladder[0])
+        result.candidates_tried = best.candidates_tried
+        result.candidates_skipped = best.candidates_skipped
+        result.deadline_hit = best.deadline_hit
+        result.budget_hit = best.budget_hit
+        for scale in ladder[1:]:
+            if result.deadline_hit or (deadline is not None and deadline.expired()):
+                result.deadline_hit = True
+                break
+            lines = _tesseract_lines(best_data) if best_data else []
+            low = [line for line in lines if line["confidence"] < self.ladder_line_confidence]
+            confident = best.confidence >= target_confidence and bool(best.text.strip())
+            if confident and not low:
+                break
+            if budget_used_up():
+                result.budget_hit = True
+                break
+            if confident and len(low) <= self.ladder_max_low_share * len(lines):
+                logger.info(f"Re-running {len(low)} low-confidence line(s) at scale {scale:g}")
+                stage_started = time.perf_counter()
+                graph = graph_at(scale)
+                result.regions.extend(self._rerun_lines(
+                    best, best_data, low, graph, scale, deadline, result.preprocessing["resize_factor"],
+                    result.preprocessing.get("crop", [0, 0])[1],
+                ))
+                remember_quad(graph, scale)
+                result.timings[f"ocr_lines@{scale:g}"] = round((time.perf_counter() - stage_started) * 1000, 2)
+                continue
+            logger.info(f"OCR at scale {best.scale:g} not confident ({best.confidence:.1f}), re-running the page at scale {scale:g}")
+            attempt, attempt_data = search(scale)
+            result.candidates_tried += attempt.candidates_tried
+            result.candidates_skipped += attempt.candidates_skipped
+            result.deadline_hit = result.deadline_hit or attempt.deadline_hit
+            result.budget_hit = result.budget_hit or attempt.budget_hit
+            if attempt.confidence > best.confidence and attempt.text.strip():
+                best, best_data = attempt, attempt_data
+
+        result.text = best.text
+        result.confidence = best.confidence
+        result.preprocessor = best.preprocessor
+        result.config = best.config
+        result.scale = best.scale
+        if self.strategy_stats is not None:
+            winner = (result.preprocessor, result.config) if result.preprocessor else None
+            # A candidate re-run at a later ladder scale is still one try for this image
+            self.strategy_stats.record(result.bucket, dict.fromkeys(tried), winner)
+
+        # A Tesseract call killed by the deadline ends the search without the check above
+        if deadline is not None and deadline.expired():
+            result.deadline_hit = True
+
+        # Fallback: try raw image if all preprocessing failed
+        if not result.text.strip() and not result.deadline_hit:
+            try:
+                gray = _to_gray(bgr_image)
+                ocr_metrics.record_fallback("raw")
+                result.text = self.engine.image_to_string(gray, self.tesseract_configs[0])
+                logger.info("Used fallback raw OCR")
+            except Exception as e:
+                logger.error(f"Fallback OCR failed: {e}")
+
+        if result.confidence < min_confidence:
+            logger.warning(f"OCR result confidence ({result.confidence:.1f}) is below threshold ({min_confidence})")
+
+        result.text = result.text.strip()
+        result.elapsed = time.monotonic() - started
+        logger.info(
+            f"Final OCR result: {len(result.text)} characters extracted by {result.strategy or 'fallback'} "
+            f"({result.candidates_tried} candidate(s) tried, {result.candidates_skipped} skipped, {result.elapsed:.2f}s)"
+        )
+        return result
     
-    def extract_texts_from_images(self, imgs: List[Union[str, Path, bytes, Image.Image, np.ndarray]]) -> List[str]:
+    def _extract_fast(
+        self,
+        img: Union[str, Path, bytes, Image.Image, np.ndarray],
+        min_confidence: int,
+        denoise_budget_ms: Optional[float] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> OCRResult:
         """
-        Extract text from a list of images (batch processing).
-        Returns a list of OCR results (one per image).
+        Fast extract: find the text lines once, classify them into header, body
+        and totals regions and OCR only the header and totals with the configs in
+        ``FAST_REGION_CONFIGS``. The item table in the body is skipped, so the
+        result is partial: enough for vendor, date, GSTIN and total.
+
+        Falls back to the full candidate search when the image has too few text
+        lines for a body worth skipping.
         """
-        results = []
-        for i, img in enumerate(imgs):
+        started = time.monotonic()
+        if denoise_budget_ms is None:
+            denoise_budget_ms = self.denoise_budget_ms
+        result = OCRResult(partial=True)
+
+        bgr_image, original_shape = self._prepare_image(img, result)
+        prepared = (bgr_image, original_shape, result)
+
+        # One pipeline only: the first one triage routes to
+        name = "otsu"
+        quad = _NOT_LOCATED
+        if self.triage:
+            quad = locate_document(_to_gray(bgr_image))
+            metrics = triage_image(bgr_image, quad)
+            name = route_pipelines(metrics)[0]
+            result.triage = {**metrics, "route": [name], "fallback": False}
+        graph = _PreprocessGraph(bgr_image, denoise_budget_ms=denoise_budget_ms, document_quad=quad)
+        binary = graph.variant(name)
+        if binary is None:
+            raise ValueError(f"Preprocessing with {name} failed")
+
+        stage_started = time.perf_counter()
+        regions = _classify_regions(_text_line_bands(binary), binary.shape[0])
+        result.timings["regions"] = round((time.perf_counter() - stage_started) * 1000, 2)
+        if regions is None:
+            logger.info("Too few text lines for fast extract, running the full OCR")
+            return self._extract_image(img, min_confidence, None, None, denoise_budget_ms=denoise_budget_ms,
+                                       deadline=deadline, prepared=prepared)
+
+        texts, confidences = [], []
+        for region, (top, bottom) in regions.items():
+            if deadline is not None and deadline.expired():
+                logger.warning(f"OCR deadline hit before the {region} region")
+                result.deadline_hit = True
+                break
+            config = self.FAST_REGION_CONFIGS[region]
+            stage_started = time.perf_counter()
             try:
-                logger.info(f"Processing image {i+1}/{len(imgs)}")
-                text = self.extract_text_from_image(img)
-                results.append(text)
+                timeout = deadline.tesseract_timeout() if deadline is not None else 0
+                text, confidence = self._run_tesseract(binary[top:bottom], config, timeout)
             except Exception as e:
-                logger.error(f"Failed to process image {i+1}: {e}")
-                results.append("")
-        return results
+                logger.warning(f"Fast OCR of the {region} region failed: {e}")
+                text, confidence = "", 0.0
+            result.timings[f"ocr_{region}"] = round((time.perf_counter() - stage_started) * 1000, 2)
+            result.candidates_tried += 1
+            resize_factor = result.preprocessing["resize_factor"]
+            crop_top = result.preprocessing.get("crop", [0, 0])[1]
+            result.regions.append({"region": region, "top": crop_top + round(top / resize_factor),
+                                   "bottom": crop_top + round(bottom / resize_factor),
+                                   "confidence": round(confidence, 1), "characters": len(text.strip())})
+            texts.append(text.strip())
+            confidences.append(confidence)
+
+        result.text = "\n\n".join(text for text in texts if text)
+        result.confidence = float(np.mean(confidences)) if confidences else 0.0
+        result.preprocessor = name
+        result.config = self.FAST_REGION_CONFIGS["header"]
+        result.timings.update(graph.timings)
+        result.preprocessing.update(graph.info)
+        if result.confidence < min_confidence:
+            logger.warning(f"Fast OCR confidence ({result.confidence:.1f}) is below threshold ({min_confidence})")
+        result.elapsed = time.monotonic() - started
+        logger.info(f"Fast OCR: {len(result.text)} characters from header and totals in {result.elapsed:.2f}s")
+        return result
+
+    def _run_tesseract(self, image: np.ndarray, tesseract_config: str, timeout: float = 0) -> Tuple[str, float]:
+        """
+        Run one OCR candidate and return its text and average word confidence.
+        Tesseract is killed after ``timeout`` seconds (0: no limit).
+        """
+        text, avg_confidence, _ = self._run_tesseract_data(image, tesseract_config, timeout)
+        return text, avg_confidence
+
+    def _run_tesseract_data(
+        self, image: np.ndarray, tesseract_config: str, timeout: float = 0
+    ) -> Tuple[str, float, Optional[Dict[str, list]]]:
+        """Like ``_run_tesseract``, but also return the ``image_to_data`` dict (None if unavailable)."""
+        started = time.perf_counter()
+        try:
+            if self.single_pass:
+                data = self.engine.image_to_data(image, tesseract_config, timeout)
+                return _text_from_tesseract_data(data), _average_confidence(data), data
+
+            # Extract text
+            text = self.engine.image_to_string(image, tesseract_config, timeout)
+
+            # Get confidence score
+            try:
+                data = self.engine.image_to_data(image, tesseract_config, timeout)
+                avg_confidence = _average_confidence(data)
+            except Exception:
+                data = None
+                avg_confidence = len(text.strip())  # Fallback: use text length as confidence
+            return text, avg_confidence, data
+        finally:
+            ocr_metrics.record_tesseract(_psm_of(tesseract_config), time.perf_counter() - started)
+
+    def _rerun_lines(
+        self,
+        page: OCRResult,
+        data: Dict[str, list],
+        lines: List[Dict[str, object]],
+        graph: _PreprocessGraph,
+        scale: float,
+        deadline: Optional[Deadline] = None,
+        resize_factor: float = 1.0,
+        crop_top: int = 0,
+    ) -> List[Dict[str, object]]:
+        """
+        Re-OCR the given lines of ``page`` (OCRed at ``page.scale``) at ``scale``, one
+        line at a time with the winning preprocessor. A line whose confidence improves
+        replaces its words in ``data``, and the page text and confidence are rebuilt
+        from it. Returns one region entry per line, with its rows in the coordinates of
+        the full resolution image (``graph`` holds that image, cropped at row
+        ``crop_top``, scaled by ``resize_factor`` x ``scale``).
+        """
+        variant = graph.variant(page.preprocessor)
+        if variant is None:
+            return []
+        ratio = scale / page.scale
+        height, width = variant.shape[:2]
+        regions: List[Dict[str, object]] = []
+        for line in lines:
+            if deadline is not None and deadline.expired():
+                break
+            # Pad the box: deskewing at the new scale may shift it slightly
+            pad = max(2, (line["bottom"] - line["top"]) // 3)
+            top, bottom = max(0, int((line["top"] - pad) * ratio)), min(height, int((line["bottom"] + pad) * ratio))
+            left, right = max(0, int((line["left"] - pad) * ratio)), min(width, int((line["right"] + pad) * ratio))
+            if bottom <= top or right <= left:
+                continue
+            try:
+                timeout = deadline.tesseract_timeout() if deadline is not None else 0
+                text, confidence = self._run_tesseract(variant[top:bottom, left:right], _LADDER_LINE_CONFIG, timeout)
+            except Exception as e:
+                logger.warning(f"OCR of a line at scale {scale:g} failed: {e}")
+                continue
+            text = " ".join(text.split())
+            replaced = bool(text) and confidence > line["confidence"]
+            if replaced:
+                for position, index in enumerate(line["words"]):
+                    data["text"][index] = text if position == 0 else ""
+                    data["conf"][index] = confidence
+            to_original = page.scale * resize_factor
+            regions.append({"region": "line", "top": crop_top + round(line["top"] / to_original),
+                            "bottom": crop_top + round(line["bottom"] / to_original), "scale": scale,
+                            "confidence": round(confidence, 1), "replaced": replaced})
+        page.text = _text_from_tesseract_data(data)
+        page.confidence = _average_confidence(data)
+        return regions
+
+    def iter_batch(
+        self,
+        imgs: Iterable[Union[str, Path, bytes, Image.Image, np.ndarray]],
+        timeout: Optional[float] = None,
+        min_confidence: int = 60,
+        fast: bool = False,
+        deadline: Optional[Deadline] = None,
+    ) -> Iterator[BatchItemResult]:
+        """
+        OCR several images on the batch executor and yield their results as they
+        complete. Errors are reported per item instead of raised.
+
+        Args:
+            imgs: Image or PDF inputs; ``BatchItemResult.index`` refers to their position.
+            timeout: Seconds each item may run, counted from when it starts. It becomes
+                the item's deadline, so an item running out of time returns its best
+                result so far with ``deadline_hit`` set. An item still running a grace
+                period later is reported as timed out and its result discarded.
+            min_confidence: Passed to ``extract``.
+            fast: Passed to ``extract``.
+            deadline: Deadline of the whole batch, e.g. cancelled on client disconnect.
+                Items not started when it expires are skipped, and items it cancels
+                part way are reported with an error.
+        """
+        started: Dict[int, float] = {}
+
+        def run(index: int, img) -> Optional[OCRResult]:
+            started[index] = time.monotonic()
+            if deadline is not None and deadline.expired():
+                return None
+            item_deadline = Deadline(timeout, parent=deadline) if timeout is not None or deadline is not None else None
+            return self.extract(img, min_confidence=min_confidence, fast=fast, deadline=item_deadline)
+
+        futures = {self._batch_executor.submit(run, index, img): index for index, img in enumerate(imgs)}
+        pending = set(futures)
+        try:
+            while pending:
+                wait_for = None
+                if timeout is not None:
+                    running = [started[futures[future]] for future in pending if futures[future] in started]
+                    cutoff = timeout + _BATCH_TIMEOUT_GRACE
+                    wait_for = max(0.0, min(running) + cutoff - time.monotonic()) if running else cutoff
+                done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.discard(future)
+                    index = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.error(f"Failed to process image {index + 1}: {e}")
+                        elapsed = time.monotonic() - started[index] if index in started else 0.0
+                        yield BatchItemResult(index=index, elapsed=elapsed, error=str(e))
+                        continue
+                    if result is None:
+                        reason = "cancelled" if deadline.cancelled else "deadline expired"
+                        logger.warning(f"Image {index + 1} skipped: batch {reason}")
+                        yield BatchItemResult(index=index, deadline_hit=True,
+                                              error=f"Skipped: the batch {reason} before it started")
+                        continue
+                    error = None
+                    if result.deadline_hit and deadline is not None and deadline.cancelled:
+                        # Stopped part way by the cancellation, not by its own time limit
+                        error = "Cancelled before it finished"
+                    yield BatchItemResult(index=index, text=result.text, confidence=result.confidence,
+                                          strategy=result.strategy, elapsed=result.elapsed, error=error,
+                                          deadline_hit=result.deadline_hit, result=result)
+
+                if timeout is not None:
+                    now = time.monotonic()
+                    for future in list(pending):
+                        index = futures[future]
+                        if index in started and now - started[index] >= timeout + _BATCH_TIMEOUT_GRACE:
+                            pending.discard(future)
+                            logger.warning(f"Image {index + 1} timed out after {timeout:.1f}s")
+                            yield BatchItemResult(index=index, elapsed=now - started[index], deadline_hit=True,
+                                                  error=f"Timed out after {timeout:.1f}s")
+        finally:
+            # Closing the iterator early drops the items that have not started
+            for future in pending:
+                future.cancel()
+
+    def extract_batch(
+        self,
+        imgs: Iterable[Union[str, Path, bytes, Image.Image, np.ndarray]],
+        timeout: Optional[float] = None,
+        min_confidence: int = 60,
+        fast: bool = False,
+        deadline: Optional[Deadline] = None,
+    ) -> List[BatchItemResult]:
+        """Like ``iter_batch``, but wait for every item and return the results in input order."""
+        return sorted(self.iter_batch(imgs, timeout, min_confidence, fast, deadline), key=lambda item: item.index)
+
+    def extract_texts_from_images(self, imgs: List[Union[str, Path, bytes, Image.Image, np.ndarray]]) -> List[str]:
+        """
+        Extract text from a list of images (batch processing).
+        Returns a list of OCR results (one per image, empty for failed images).
+        """
+        return [item.text for item in self.extract_batch(imgs)]
+
+
+def resolution_ladder_from_env() -> List[float]:
+    """Scales of OCR_RESOLUTION_LADDER (e.g. "0.6,1.0"); empty, a single full resolution pass, when unset."""
+    return [float(step) for step in os.getenv("OCR_RESOLUTION_LADDER", "").split(",") if step.strip()]
 
 
-# Optional: a module-level instance if desired by callers
-ocr_service = OCRService()
+# Optional: a module-level instance if desired by callers. Importing this module
+# must not touch the filesystem, so the app attaches the result cache and the
+# strategy statistics at startup.
+ocr_service = OCRService(resolution_ladder=resolution_ladder_from_env())
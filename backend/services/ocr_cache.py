@@ -0,0 +1,178 @@
+"""
+Content-addressed cache for OCR results.
+
+Entries are keyed by a hash of the input file bytes plus a fingerprint of the OCR
+settings that produced them. Lookups go through a bounded in-memory LRU first and
+then an on-disk SQLite tier that survives restarts. Opening the cache with a new
+settings fingerprint drops the entries written under the old one. The disk tier
+is bounded by entry count and age; entries are stamped when written and again
+when read, so the least recently used go first.
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+
+def settings_fingerprint(settings: Dict[str, Any]) -> str:
+    """Stable hash of the OCR settings that influence the result."""
+    encoded = json.dumps(settings, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+class OCRCache:
+    """Two-tier (memory LRU + SQLite) cache of OCR result dicts."""
+
+    def __init__(
+        self,
+        path: Optional[Union[str, Path]] = None,
+        max_entries: int = 256,
+        max_disk_entries: Optional[int] = 10000,
+        max_age: Optional[float] = 30 * 24 * 3600,
+    ):
+        """
+        Args:
+            path: SQLite file for the persistent tier. ``None`` keeps the cache in memory only.
+            max_entries: Capacity of the in-memory LRU tier.
+            max_disk_entries: Capacity of the disk tier. ``None`` removes the limit.
+            max_age: Seconds since an entry was last written or read after which it
+                is dropped from the disk tier. ``None`` removes the limit.
+        """
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.max_age = max_age
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._settings: Optional[str] = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            try:
+                self._db = sqlite3.connect(str(path), check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS ocr_results ("
+                    "key TEXT PRIMARY KEY, settings TEXT NOT NULL, result TEXT NOT NULL, created_at REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS ix_ocr_results_created_at ON ocr_results (created_at)")
+                self._evict()
+                self._db.commit()
+                logger.info(f"OCR cache persisted at {path}")
+            except sqlite3.Error as e:
+                logger.warning(f"OCR cache disk tier disabled, cannot open {path}: {e}")
+                self._db = None
+
+    def use_settings(self, fingerprint: str) -> None:
+        """Bind the cache to a settings fingerprint, invalidating entries from other settings."""
+        with self._lock:
+            if fingerprint == self._settings:
+                return
+            self._settings = fingerprint
+            self._memory.clear()
+            if self._db is not None:
+                deleted = self._db.execute("DELETE FROM ocr_results WHERE settings != ?", (fingerprint,)).rowcount
+                self._db.commit()
+                if deleted:
+                    logger.info(f"OCR settings changed, invalidated {deleted} cached result(s)")
+
+    def key(self, data: bytes, *params: Any) -> str:
+        """Cache key for the given input bytes and call parameters."""
+        digest = hashlib.sha256(data)
+        digest.update(json.dumps([self._settings, *params], default=str).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+
+            if self._db is not None:
+                now = time.time()
+                oldest = now - self.max_age if self.max_age is not None else 0.0
+                row = self._db.execute(
+                    "SELECT result FROM ocr_results WHERE key = ? AND settings = ? AND created_at >= ?",
+                    (key, self._settings, oldest),
+                ).fetchone()
+                if row is not None:
+                    # created_at doubles as the last use, which eviction goes by
+                    self._db.execute("UPDATE ocr_results SET created_at = ? WHERE key = ?", (now, key))
+                    self._db.commit()
+                    value = json.loads(row[0])
+                    self._remember(key, value)
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO ocr_results (key, settings, result, created_at) VALUES (?, ?, ?, ?)",
+                    (key, self._settings or "", json.dumps(value), time.time()),
+                )
+                self._evict()
+                self._db.commit()
+
+    def _evict(self) -> None:
+        """Drop disk entries older than ``max_age`` and the least recently used beyond ``max_disk_entries``."""
+        if self.max_age is not None:
+            self._db.execute("DELETE FROM ocr_results WHERE created_at < ?", (time.time() - self.max_age,))
+        if self.max_disk_entries is not None:
+            self._db.execute(
+                "DELETE FROM ocr_results WHERE key IN "
+                "(SELECT key FROM ocr_results ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_entries,),
+            )
+
+    def _remember(self, key: str, value: Dict[str, Any]) -> None:
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop every cached result from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM ocr_results")
+                self._db.commit()
+
+    def close(self) -> None:
+        """Close the disk tier; the memory tier keeps working."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and tier sizes."""
+        with self._lock:
+            disk_entries = None
+            if self._db is not None:
+                disk_entries = self._db.execute("SELECT COUNT(*) FROM ocr_results").fetchone()[0]
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+            }
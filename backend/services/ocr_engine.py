@@ -0,0 +1,262 @@
+"""
+Tesseract engine backends for the OCR service.
+
+- SubprocessEngine: runs the ``tesseract`` binary through pytesseract. Every call
+  spawns a process, loads traineddata and round-trips temp image files. Each
+  process can be given its own OMP_THREAD_LIMIT.
+- TesserocrEngine: keeps initialized Tesseract API handles in memory through
+  tesserocr (``pip install tesserocr``). Handles are pooled per worker thread and
+  reused across requests; when tesserocr is missing or the pool is full, calls
+  fall back to the subprocess engine.
+
+Both engines return ``image_to_data`` dicts in pytesseract's ``Output.DICT`` layout.
+"""
+
+from __future__ import annotations
+import logging
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pytesseract
+from PIL import Image
+
+# Optional in-process engine
+try:
+    import tesserocr
+    TESSEROCR_SUPPORT = True
+except ImportError:
+    TESSEROCR_SUPPORT = False
+
+logger = logging.getLogger(__name__)
+
+_DATA_KEYS = ["level", "page_num", "block_num", "par_num", "line_num", "word_num",
+              "left", "top", "width", "height", "conf", "text"]
+
+
+def _parse_config(config: str) -> Tuple[str, int, int, Dict[str, str]]:
+    """Split a Tesseract CLI config string into (lang, oem, psm, variables)."""
+    lang, oem, psm, variables = "eng", 3, 3, {}
+    parts = config.split()
+    i = 0
+    while i < len(parts):
+        flag = parts[i]
+        value = parts[i + 1] if i + 1 < len(parts) else None
+        if flag == "--oem" and value is not None:
+            oem, i = int(value), i + 1
+        elif flag == "--psm" and value is not None:
+            psm, i = int(value), i + 1
+        elif flag == "-l" and value is not None:
+            lang, i = value, i + 1
+        elif flag == "-c" and value is not None and "=" in value:
+            name, _, var_value = value.partition("=")
+            variables[name] = var_value
+            i += 1
+        i += 1
+    return lang, oem, psm, variables
+
+
+class _TesseractEnviron(Mapping):
+    """
+    ``os.environ`` as passed to ``tesseract`` processes, plus per-thread overrides.
+
+    pytesseract hands its module-level ``environ`` to every ``Popen`` and has no
+    per-call env argument, so it is replaced by this view once. Overrides set by
+    ``SubprocessEngine`` for the calling thread only reach the processes that
+    thread spawns; the parent process environment is never modified.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _overrides(self) -> Dict[str, str]:
+        return getattr(self._local, "overrides", None) or {}
+
+    def override(self, overrides: Dict[str, str]) -> None:
+        self._local.overrides = overrides
+
+    def __getitem__(self, key):
+        overrides = self._overrides()
+        return overrides[key] if key in overrides else os.environ[key]
+
+    def __iter__(self):
+        overrides = self._overrides()
+        yield from overrides
+        yield from (key for key in os.environ if key not in overrides)
+
+    def __len__(self):
+        return len(set(os.environ) | set(self._overrides()))
+
+
+_tesseract_environ = _TesseractEnviron()
+pytesseract.pytesseract.environ = _tesseract_environ
+
+
+class SubprocessEngine:
+    """
+    Tesseract through pytesseract, one ``tesseract`` process per call.
+
+    ``thread_limit`` sets OMP_THREAD_LIMIT for each process so that concurrent
+    calls do not oversubscribe the CPU. An OMP_THREAD_LIMIT already set in the
+    environment takes precedence.
+    """
+
+    name = "subprocess"
+
+    def __init__(self, thread_limit: Optional[int] = None):
+        self.thread_limit = thread_limit
+        if thread_limit is None or "OMP_THREAD_LIMIT" in os.environ:
+            self._env: Dict[str, str] = {}
+        else:
+            self._env = {"OMP_THREAD_LIMIT": str(thread_limit)}
+
+    def image_to_data(self, image: np.ndarray, config: str, timeout: float = 0) -> Dict[str, list]:
+        _tesseract_environ.override(self._env)
+        return pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT, config=config, timeout=timeout)
+
+    def image_to_string(self, image: np.ndarray, config: str, timeout: float = 0) -> str:
+        _tesseract_environ.override(self._env)
+        return pytesseract.image_to_string(image, config=config, timeout=timeout)
+
+
+class _ThreadHandles:
+    """Tesseract API handles owned by one worker thread, least recently used first."""
+
+    def __init__(self, pool: "TesserocrEngine"):
+        self.pool = pool
+        self.apis: "OrderedDict[str, object]" = OrderedDict()
+
+    def close(self, key: str) -> None:
+        api = self.apis.pop(key)
+        api.End()
+        self.pool._release_slot()
+
+    def __del__(self):
+        # Runs when the owning thread exits and its thread-local storage is freed
+        for key in list(self.apis):
+            try:
+                self.close(key)
+            except Exception:
+                pass
+
+
+class TesserocrEngine:
+    """
+    In-process Tesseract engine with a bounded pool of API handles.
+
+    Each worker thread keeps up to ``handles_per_thread`` initialized handles (one
+    per distinct config), and at most ``max_handles`` exist across all threads.
+    Calls that cannot get a handle run through the subprocess engine instead. A
+    thread that uses more configs than ``handles_per_thread`` ends and re-creates
+    handles on every switch, so size it to the configs the caller runs (see
+    ``OCRService``, which sizes both limits from its configs and thread pools).
+    """
+
+    name = "tesserocr"
+
+    def __init__(self, max_handles: int = 8, handles_per_thread: int = 3, thread_limit: Optional[int] = None):
+        if not TESSEROCR_SUPPORT:
+            raise ImportError("tesserocr is not installed. Install with: pip install tesserocr")
+        self.max_handles = max_handles
+        self.handles_per_thread = handles_per_thread
+        self.fallback = SubprocessEngine(thread_limit=thread_limit)
+        self._slots = threading.BoundedSemaphore(max_handles)
+        self._local = threading.local()
+
+    def _release_slot(self) -> None:
+        self._slots.release()
+
+    def _handles(self) -> _ThreadHandles:
+        handles = getattr(self._local, "handles", None)
+        if handles is None:
+            handles = self._local.handles = _ThreadHandles(self)
+        return handles
+
+    def _acquire(self, config: str):
+        """Return this thread's handle for ``config``, or None if the pool is full."""
+        handles = self._handles()
+        api = handles.apis.get(config)
+        if api is not None:
+            handles.apis.move_to_end(config)
+            return api
+
+        if len(handles.apis) >= self.handles_per_thread:
+            handles.close(next(iter(handles.apis)))
+        if not self._slots.acquire(blocking=False):
+            return None
+
+        try:
+            lang, oem, psm, variables = _parse_config(config)
+            api = tesserocr.PyTessBaseAPI(lang=lang, oem=oem, psm=psm)
+            for name, value in variables.items():
+                api.SetVariable(name, value)
+        except Exception:
+            self._release_slot()
+            raise
+        handles.apis[config] = api
+        logger.info(f"Initialized Tesseract API handle for '{config}' in {threading.current_thread().name}")
+        return api
+
+    def _recognize(self, api, image: np.ndarray, timeout: float) -> None:
+        api.SetImage(Image.fromarray(image))
+        if timeout:
+            api.Recognize(int(timeout * 1000))
+        else:
+            api.Recognize()
+
+    def image_to_data(self, image: np.ndarray, config: str, timeout: float = 0) -> Dict[str, list]:
+        api = self._acquire(config)
+        if api is None:
+            return self.fallback.image_to_data(image, config, timeout)
+
+        self._recognize(api, image, timeout)
+        data: Dict[str, List] = {key: [] for key in _DATA_KEYS}
+        iterator = api.GetIterator()
+        if iterator is None:
+            return data
+
+        level = tesserocr.RIL.WORD
+        block = par = line = word = 0
+        for item in tesserocr.iterate_level(iterator, level):
+            if item.IsAtBeginningOf(tesserocr.RIL.BLOCK):
+                block, par, line = block + 1, 0, 0
+            if item.IsAtBeginningOf(tesserocr.RIL.PARA):
+                par, line = par + 1, 0
+            if item.IsAtBeginningOf(tesserocr.RIL.TEXTLINE):
+                line, word = line + 1, 0
+            word += 1
+            box = item.BoundingBox(level) or (0, 0, 0, 0)
+            values = [5, 1, block, par, line, word, box[0], box[1], box[2] - box[0], box[3] - box[1],
+                      item.Confidence(level), item.GetUTF8Text(level) or ""]
+            for key, value in zip(_DATA_KEYS, values):
+                data[key].append(value)
+        return data
+
+    def image_to_string(self, image: np.ndarray, config: str, timeout: float = 0) -> str:
+        api = self._acquire(config)
+        if api is None:
+            return self.fallback.image_to_string(image, config, timeout)
+
+        self._recognize(api, image, timeout)
+        return api.GetUTF8Text()
+
+
+def create_engine(name: str = "subprocess", max_handles: int = 8, handles_per_thread: int = 3,
+                  thread_limit: Optional[int] = None):
+    """
+    Build the engine selected by ``name`` ("subprocess" or "tesserocr").
+
+    Falls back to the subprocess engine when tesserocr is requested but missing.
+    ``thread_limit`` is the OMP_THREAD_LIMIT of each ``tesseract`` process.
+    """
+    if name == "tesserocr":
+        if TESSEROCR_SUPPORT:
+            return TesserocrEngine(max_handles=max_handles, handles_per_thread=handles_per_thread,
+                                   thread_limit=thread_limit)
+        logger.warning("tesserocr is not installed, falling back to the subprocess Tesseract engine")
+    elif name != "subprocess":
+        raise ValueError(f"Unknown OCR engine: {name}")
+    return SubprocessEngine(thread_limit=thread_limit)
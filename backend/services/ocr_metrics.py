@@ -0,0 +1,97 @@
+"""
+Prometheus metrics for OCR and HTTP requests.
+
+prometheus_client is optional: without it every ``record_*`` function is a
+no-op and ``/metrics`` reports that metrics are unavailable. Recording happens
+once per OCR result (from its ``timings``) and once per Tesseract call, so the
+cost on the hot path is a handful of histogram observations per image.
+"""
+
+from __future__ import annotations
+from typing import TYPE_CHECKING, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .ocr import OCRResult
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+    METRICS_SUPPORT = True
+except ImportError:
+    METRICS_SUPPORT = False
+
+# Preprocessing stages take milliseconds, Tesseract calls and whole images seconds
+_STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+_OCR_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+if METRICS_SUPPORT:
+    STAGE_SECONDS = Histogram(
+        "ocr_stage_seconds", "Duration of OCR preprocessing stages", ["stage"], buckets=_STAGE_BUCKETS
+    )
+    TESSERACT_SECONDS = Histogram(
+        "ocr_tesseract_seconds", "Duration of single Tesseract calls", ["psm"], buckets=_OCR_BUCKETS
+    )
+    IMAGE_SECONDS = Histogram(
+        "ocr_image_seconds", "Wall clock time to OCR one image or PDF page", ["mode"], buckets=_OCR_BUCKETS
+    )
+    CANDIDATES = Counter("ocr_candidates_total", "OCR candidates by outcome", ["outcome"])
+    PDF_PAGES = Counter("ocr_pdf_pages_total", "PDF pages by where their text came from", ["source"])
+    CACHE_REQUESTS = Counter("ocr_cache_requests_total", "OCR cache lookups", ["result"])
+    FALLBACKS = Counter("ocr_fallbacks_total", "OCR fallbacks and deadline stops", ["kind"])
+    HTTP_SECONDS = Histogram(
+        "http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"], buckets=_OCR_BUCKETS
+    )
+
+
+def _stage_name(stage: str) -> str:
+    """Drop the ladder scale suffix ("otsu@0.6") so label values stay a small fixed set."""
+    return stage.split("@", 1)[0]
+
+
+def record_result(result: "OCRResult") -> None:
+    """Record the stage timings and counters of an OCR result that was not served from the cache."""
+    if not METRICS_SUPPORT:
+        return
+    if result.pages:
+        # A whole PDF: its OCR pages were recorded one by one
+        for page in result.pages:
+            PDF_PAGES.labels(page["source"]).inc()
+        if result.deadline_hit:
+            FALLBACKS.labels("deadline").inc()
+        return
+    for stage, ms in result.timings.items():
+        # Tesseract calls are observed as they run, by record_tesseract
+        if not stage.startswith("tesseract:"):
+            STAGE_SECONDS.labels(_stage_name(stage)).observe(ms / 1000)
+    IMAGE_SECONDS.labels("fast" if result.partial else "full").observe(result.elapsed)
+    CANDIDATES.labels("tried").inc(result.candidates_tried)
+    CANDIDATES.labels("skipped").inc(result.candidates_skipped)
+    if result.deadline_hit:
+        FALLBACKS.labels("deadline").inc()
+
+
+def record_fallback(kind: str) -> None:
+    """Count a fallback: "triage" (routed pipelines stayed below the threshold) or "raw" (every candidate failed)."""
+    if METRICS_SUPPORT:
+        FALLBACKS.labels(kind).inc()
+
+
+def record_tesseract(psm: str, seconds: float) -> None:
+    if METRICS_SUPPORT:
+        TESSERACT_SECONDS.labels(psm).observe(seconds)
+
+
+def record_cache(hit: bool) -> None:
+    if METRICS_SUPPORT:
+        CACHE_REQUESTS.labels("hit" if hit else "miss").inc()
+
+
+def record_http(method: str, route: str, status: int, seconds: float) -> None:
+    if METRICS_SUPPORT:
+        HTTP_SECONDS.labels(method, route, str(status)).observe(seconds)
+
+
+def render_latest() -> Tuple[Optional[bytes], str]:
+    """The exposition of every metric and its content type, or (None, "") without prometheus_client."""
+    if not METRICS_SUPPORT:
+        return None, ""
+    return generate_latest(), CONTENT_TYPE_LATEST
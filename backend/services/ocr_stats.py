@@ -0,0 +1,161 @@
+"""
+Historical OCR strategy statistics.
+
+Every OCR run records which (preprocessor, Tesseract config) candidates were tried
+and which one won, grouped by a coarse bucket of image features (size, brightness,
+contrast, PDF or photo). The candidate scheduler uses the smoothed win rates of a
+bucket as priors so that images similar to past ones try the historical winners
+first, and can optionally prune candidates that never win.
+"""
+
+from __future__ import annotations
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Set, Tuple, Union
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+Candidate = Tuple[str, str]
+
+
+def image_features(bgr: np.ndarray, original_shape: Tuple[int, ...], is_pdf: bool = False) -> Dict[str, Any]:
+    """Cheap global features of an image used to group OCR outcomes."""
+    gray = bgr if len(bgr.shape) == 2 else cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+    mean, std = cv2.meanStdDev(gray)
+    return {
+        "megapixels": round(original_shape[0] * original_shape[1] / 1e6, 2),
+        "brightness": round(float(mean[0][0]), 1),
+        "contrast": round(float(std[0][0]), 1),
+        "source": "pdf" if is_pdf else "image",
+    }
+
+
+def feature_bucket(features: Dict[str, Any]) -> str:
+    """Map image features to a bucket name such as ``'medium|bright|normal|image'``."""
+    megapixels = features["megapixels"]
+    size = "small" if megapixels < 1 else "medium" if megapixels < 4 else "large"
+    brightness = features["brightness"]
+    light = "dark" if brightness < 100 else "bright" if brightness > 180 else "normal"
+    contrast = features["contrast"]
+    spread = "low" if contrast < 40 else "high" if contrast > 80 else "normal"
+    return f"{size}|{light}|{spread}|{features['source']}"
+
+
+def _candidate_key(candidate: Candidate) -> str:
+    return f"{candidate[0]}|{candidate[1]}"
+
+
+class StrategyStats:
+    """Per-bucket try/win counters for OCR candidates, persisted as JSON."""
+
+    def __init__(
+        self,
+        path: Optional[Union[str, Path]] = None,
+        min_samples: int = 20,
+        prune_after: int = 50,
+        save_every: int = 20,
+    ):
+        """
+        Args:
+            path: JSON file the statistics are loaded from and saved to. ``None`` keeps them in memory.
+            min_samples: Images a bucket needs before its win rates are used as priors.
+            prune_after: Tries without a single win after which a candidate may be pruned.
+            save_every: Save to disk after this many recorded images.
+        """
+        self.path = Path(path) if path is not None else None
+        self.min_samples = min_samples
+        self.prune_after = prune_after
+        self.save_every = save_every
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        # bucket -> {"images": int, "candidates": {candidate_key: {"tries": int, "wins": int}}}
+        self._buckets: Dict[str, Dict[str, Any]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            self._buckets = json.loads(self.path.read_text())
+            logger.info(f"Loaded OCR strategy statistics for {len(self._buckets)} bucket(s) from {self.path}")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load OCR strategy statistics from {self.path}: {e}")
+
+    def save(self) -> None:
+        """Write the statistics to disk atomically."""
+        if self.path is None:
+            return
+        with self._lock:
+            payload = json.dumps(self._buckets, indent=1, sort_keys=True)
+            self._unsaved = 0
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        try:
+            tmp_path.write_text(payload)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save OCR strategy statistics to {self.path}: {e}")
+
+    def record(self, bucket: str, tried: Iterable[Candidate], winner: Optional[Candidate]) -> None:
+        """Record the candidates tried for one image and the one that won (if any)."""
+        with self._lock:
+            stats = self._buckets.setdefault(bucket, {"images": 0, "candidates": {}})
+            stats["images"] += 1
+            for candidate in tried:
+                counts = stats["candidates"].setdefault(_candidate_key(candidate), {"tries": 0, "wins": 0})
+                counts["tries"] += 1
+                if candidate == winner:
+                    counts["wins"] += 1
+            self._unsaved += 1
+            should_save = self._unsaved >= self.save_every
+        if should_save:
+            self.save()
+
+    def priors(self, bucket: str) -> Dict[Candidate, float]:
+        """
+        Smoothed win rates for the candidates of a bucket, scaled so that a
+        candidate without history has a prior of 1.0. Empty until the bucket has
+        ``min_samples`` images.
+        """
+        with self._lock:
+            stats = self._buckets.get(bucket)
+            if not stats or stats["images"] < self.min_samples:
+                return {}
+            priors = {}
+            for key, counts in stats["candidates"].items():
+                name, _, config = key.partition("|")
+                priors[(name, config)] = 2.0 * (counts["wins"] + 1) / (counts["tries"] + 2)
+            return priors
+
+    def losers(self, bucket: str) -> Set[Candidate]:
+        """Candidates tried at least ``prune_after`` times in a bucket without ever winning."""
+        with self._lock:
+            stats = self._buckets.get(bucket)
+            if not stats:
+                return set()
+            return {
+                (key.partition("|")[0], key.partition("|")[2])
+                for key, counts in stats["candidates"].items()
+                if counts["tries"] >= self.prune_after and counts["wins"] == 0
+            }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Copy of the statistics with per-candidate win rates, for inspection."""
+        with self._lock:
+            buckets = {}
+            for bucket, stats in sorted(self._buckets.items()):
+                candidates = {
+                    key: {**counts, "win_rate": round(counts["wins"] / counts["tries"], 3) if counts["tries"] else 0.0}
+                    for key, counts in stats["candidates"].items()
+                }
+                buckets[bucket] = {"images": stats["images"], "candidates": candidates}
+            return {
+                "min_samples": self.min_samples,
+                "prune_after": self.prune_after,
+                "buckets": buckets,
+            }
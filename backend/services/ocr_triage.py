@@ -0,0 +1,290 @@
+"""
+Image quality triage for the OCR service.
+
+Before any OCR runs, a few cheap metrics are computed, mostly on a downscaled copy
+of the image (blur, contrast, uneven illumination, noise level, and whether a
+document border is visible), and mapped to the one or two preprocessing pipelines most
+likely to work. The metrics and the routing decision are returned with the OCR
+result so routing can be audited.
+
+The document locator used for perspective correction, and the segmentation of
+pages holding several receipts, live here too, since they work on the same kind
+of downscaled copy.
+"""
+
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Longest side of the copy the metrics are computed on
+_TRIAGE_MAX_SIDE = 500
+
+# Routing thresholds
+_BLUR_THRESHOLD = 100.0          # Laplacian variance below this is blurry
+_LOW_CONTRAST = 80.0             # grey levels between paper and ink
+_UNEVEN_ILLUMINATION = 0.15      # background spread relative to full scale
+_NOISY_SIGMA = 5.0               # estimated Gaussian noise sigma
+
+# Flat scan detection: share of the outer margin that must be paper coloured
+# (within the tolerance of the page's paper grey level)
+_FLAT_SCAN_SHARE = 0.9
+_FLAT_SCAN_TOLERANCE = 30
+
+# Receipt segmentation, measured in text heights: content closer than the gap
+# belongs to one receipt, and a receipt is at least that tall and wide
+_SEGMENT_MAX_SIDE = 1000
+_SEGMENT_TOLERANCE = 40
+_SEGMENT_GAP = 5.0
+_SEGMENT_MIN_HEIGHT = 4.0
+_SEGMENT_MIN_WIDTH = 8.0
+# Used when no glyphs can be measured (receipts photographed on a dark desk)
+_SEGMENT_DEFAULT_TEXT_HEIGHT = 0.01
+
+
+def estimate_noise(gray: np.ndarray) -> float:
+    """
+    Estimate the standard deviation of Gaussian noise (Immerkaer's method).
+
+    Text edges would dominate the Laplacian-like response, so pixels near
+    Canny edges are left out.
+    """
+    kernel = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+    response = np.abs(cv2.filter2D(gray.astype(np.float32), -1, kernel))[1:-1, 1:-1]
+    edges = cv2.dilate(cv2.Canny(gray, 100, 200), np.ones((3, 3), np.uint8))[1:-1, 1:-1]
+    flat = response[edges == 0]
+    if flat.size == 0:
+        return 0.0
+    return float(np.sqrt(np.pi / 2) * flat.mean() / 6)
+
+
+def find_document_quad(
+    gray: np.ndarray,
+    min_area: float = 0.2,
+    max_area: float = 0.95,
+    max_aspect: Optional[float] = None,
+) -> Optional[np.ndarray]:
+    """
+    Find the four corners of a document border in a grayscale image.
+
+    A convex quadrilateral covering between ``min_area`` and ``max_area`` of the
+    image (and, with ``max_aspect``, whose bounding box is no more elongated than
+    that) counts as a border; flat scans whose page fills the frame have none.
+    Returns the corners in image coordinates, or None.
+    """
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    edged = cv2.Canny(blurred, 75, 200)
+    contours, _ = cv2.findContours(edged, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    image_area = float(gray.shape[0] * gray.shape[1])
+    for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+        approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+        if len(approx) != 4 or not cv2.isContourConvex(approx):
+            continue
+        if max_aspect is not None:
+            _, _, w, h = cv2.boundingRect(approx)
+            if not 1.0 / max_aspect < w / float(h) < max_aspect:
+                continue
+        if min_area <= cv2.contourArea(approx) / image_area <= max_area:
+            return approx.reshape(4, 2).astype(np.float32)
+    return None
+
+
+def is_flat_scan(gray: np.ndarray) -> bool:
+    """
+    Whether the page fills the frame, as in a flatbed scan or a tight crop: the
+    outer margin of the image is paper coloured instead of a desk or background.
+    """
+    h, w = gray.shape[:2]
+    margin = max(2, min(h, w) // 25)
+    ring = np.concatenate([
+        gray[:margin].ravel(), gray[-margin:].ravel(),
+        gray[:, :margin].ravel(), gray[:, -margin:].ravel(),
+    ])
+    threshold, _ = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    paper = gray[gray > threshold]
+    if paper.size == 0:
+        return False
+    return float(np.mean(ring >= np.median(paper) - _FLAT_SCAN_TOLERANCE)) >= _FLAT_SCAN_SHARE
+
+
+def locate_document(gray: np.ndarray, max_side: int = _TRIAGE_MAX_SIDE) -> Optional[np.ndarray]:
+    """
+    Corners of the receipt in a photo, in the coordinates of ``gray``, or None
+    for flat scans and when no border is found.
+
+    Edges and contours are computed on a copy downscaled to ``max_side``; only
+    the four corners are mapped back to full resolution.
+    """
+    small = _downscale(gray, max_side)
+    if is_flat_scan(small):
+        return None
+    quad = find_document_quad(small, min_area=0.1, max_area=0.98, max_aspect=5.0)
+    if quad is None:
+        return None
+    return quad * (gray.shape[1] / float(small.shape[1]))
+
+
+def find_receipt_regions(gray: np.ndarray, max_side: int = _SEGMENT_MAX_SIDE) -> List[Tuple[int, int, int, int]]:
+    """
+    Boxes (x0, y0, x1, y1) of the separate documents on a page, such as several
+    receipts on one flatbed scan, in reading order and in the coordinates of ``gray``.
+
+    Everything that differs from the background (the grey level of the image
+    border) is content: ink on a white scanner lid, or paper on a dark desk.
+    Content closer than ``_SEGMENT_GAP`` text heights is grouped into one region,
+    so receipts need a gap of about that much between them; columns of a single
+    receipt end up inside its header's box and are merged with it. Regions too
+    small to hold a receipt are dropped. A page with one document yields one box.
+    """
+    small = _downscale(gray, max_side)
+    h, w = small.shape[:2]
+    margin = max(2, min(h, w) // 50)
+    ring = np.concatenate([
+        small[:margin].ravel(), small[-margin:].ravel(),
+        small[:, :margin].ravel(), small[:, -margin:].ravel(),
+    ])
+    background = float(np.median(ring))
+    content = (np.abs(small.astype(np.int16) - background) > _SEGMENT_TOLERANCE).astype(np.uint8)
+    if not content.any():
+        return []
+
+    text_height = _glyph_height(content) or _SEGMENT_DEFAULT_TEXT_HEIGHT * max(h, w)
+    gap = max(3, int(round(_SEGMENT_GAP * text_height)))
+    grouped = cv2.dilate(content, cv2.getStructuringElement(cv2.MORPH_RECT, (gap, gap)))
+    count, labels = cv2.connectedComponents(grouped)
+    # Bounds of the content (not the dilated group) of each group
+    ys, xs = np.nonzero(content)
+    group = labels[ys, xs]
+    x0, y0 = np.full(count, w), np.full(count, h)
+    x1, y1 = np.zeros(count, int), np.zeros(count, int)
+    np.minimum.at(x0, group, xs)
+    np.minimum.at(y0, group, ys)
+    np.maximum.at(x1, group, xs + 1)
+    np.maximum.at(y1, group, ys + 1)
+    boxes = _merge_overlapping([[int(x0[i]), int(y0[i]), int(x1[i]), int(y1[i])] for i in range(1, count) if x1[i]])
+    boxes = [box for box in boxes
+             if box[3] - box[1] >= _SEGMENT_MIN_HEIGHT * text_height and box[2] - box[0] >= _SEGMENT_MIN_WIDTH * text_height]
+
+    # Pad by half the gap and map back to full resolution
+    scale = gray.shape[1] / float(w)
+    pad = gap // 2
+    regions = [(
+        int(max(0, box[0] - pad) * scale), int(max(0, box[1] - pad) * scale),
+        int(min(w, box[2] + pad) * scale), int(min(h, box[3] + pad) * scale),
+    ) for box in boxes]
+    return _reading_order(regions)
+
+
+def _glyph_height(content: np.ndarray, min_glyphs: int = 15) -> Optional[float]:
+    """Median height of the glyph-like connected components of a content mask."""
+    _, _, stats, _ = cv2.connectedComponentsWithStats(content, connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    glyphs = heights[(heights >= 3) & (heights <= content.shape[0] / 10) & (widths <= 3 * heights)]
+    if glyphs.size < min_glyphs:
+        return None
+    return float(np.median(glyphs))
+
+
+def _merge_overlapping(boxes: List[List[int]]) -> List[List[int]]:
+    """Merge boxes that overlap until none do."""
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                a, b = boxes[i], boxes[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    boxes[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return boxes
+
+
+def _reading_order(boxes: List[Tuple[int, int, int, int]]) -> List[Tuple[int, int, int, int]]:
+    """Sort boxes into rows (boxes overlapping vertically), top to bottom, then left to right."""
+    rows: List[List[Tuple[int, int, int, int]]] = []
+    for box in sorted(boxes, key=lambda box: box[1]):
+        if rows and box[1] < min(other[3] for other in rows[-1]):
+            rows[-1].append(box)
+        else:
+            rows.append([box])
+    return [box for row in rows for box in sorted(row)]
+
+
+def _downscale(gray: np.ndarray, max_side: int = _TRIAGE_MAX_SIDE) -> np.ndarray:
+    scale = max_side / float(max(gray.shape[:2]))
+    if scale >= 1.0:
+        return gray
+    return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+def _illumination_unevenness(gray: np.ndarray) -> float:
+    """Spread of the paper brightness across the image, 0 (flat) to 1."""
+    # Closing removes dark text and leaves the background
+    background = cv2.morphologyEx(gray, cv2.MORPH_CLOSE, np.ones((15, 15), np.uint8))
+    coarse = cv2.resize(background, (16, 16), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low, high = np.percentile(coarse, [5, 95])
+    return float((high - low) / 255.0)
+
+
+def _center_crop(gray: np.ndarray, size: int = _TRIAGE_MAX_SIDE) -> np.ndarray:
+    h, w = gray.shape[:2]
+    top, left = max(0, (h - size) // 2), max(0, (w - size) // 2)
+    return gray[top:top + size, left:left + size]
+
+
+def _ink_contrast(gray: np.ndarray) -> float:
+    """Grey level difference between paper and ink, split by an Otsu threshold."""
+    threshold, _ = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    ink, paper = gray[gray <= threshold], gray[gray > threshold]
+    if ink.size == 0 or paper.size == 0:
+        return 0.0
+    return float(np.median(paper) - np.median(ink))
+
+
+def triage_image(bgr: np.ndarray, quad: Optional[np.ndarray]) -> Dict[str, Any]:
+    """
+    Cheap quality metrics of an image. Noise is measured on a full resolution
+    crop (downscaling averages it away), everything else on a downscaled copy.
+
+    ``quad`` is the result of ``locate_document`` for the image: the caller hands
+    the same corners to perspective correction, so an image triaged as having no
+    border is never warped and one with a border always is.
+    """
+    gray = bgr if len(bgr.shape) == 2 else cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+    small = _downscale(gray)
+    return {
+        "blur": round(float(cv2.Laplacian(small, cv2.CV_64F).var()), 1),
+        "contrast": round(_ink_contrast(small), 1),
+        "illumination": round(_illumination_unevenness(small), 3),
+        "noise_sigma": round(estimate_noise(_center_crop(gray)), 2),
+        "border": quad is not None,
+    }
+
+
+def route_pipelines(metrics: Dict[str, Any]) -> List[str]:
+    """
+    Map triage metrics to one or two preprocessing pipelines, best first.
+
+    - A visible document border, noise or blur need clahe_pro (perspective
+      correction, denoising and sharpening).
+    - Uneven illumination needs the adaptive threshold of binarize (unless a
+      border was found, in which case the background is part of the spread).
+    - Low contrast needs CLAHE.
+    - Clean scans only need a global Otsu threshold.
+    """
+    routes: List[str] = []
+    if metrics["border"] or metrics["noise_sigma"] >= _NOISY_SIGMA or metrics["blur"] < _BLUR_THRESHOLD:
+        routes.append("clahe_pro")
+    if not metrics["border"] and metrics["illumination"] >= _UNEVEN_ILLUMINATION:
+        routes.append("binarize")
+    if metrics["contrast"] < _LOW_CONTRAST:
+        routes.append("clahe")
+    if len(routes) < 2:
+        routes.append("otsu")
+    return routes[:2]
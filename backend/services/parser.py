@@ -1,112 +1,125 @@
+import os
 import re
-from typing import Optional, Dict, List
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Optional, Dict, Iterable, Iterator, List
 
 class ParserService:
     """
     A service to parse structured data (Total Amount, Date, Vendor) from OCR text.
+
+    Patterns are compiled once per class, and each ``extract_*`` method makes as
+    few passes over the text as its field allows, as long multi-page PDF texts
+    are common. ``benchmarks.parser_reference`` keeps the rules as first written,
+    line by line, and the tests check ``parse`` against it.
     """
 
+    AMOUNT_PATTERN = re.compile(r'([0-9,]+\.\d{2})')
+    TOTAL_KEYWORDS = ('total', 'grand total', 'amount due', 'net amount', 'final amount')
+    DATE_PATTERNS = [
+        re.compile(r"\b(\d{1,2}[/-]\d{1,2}[/-]\d{4})\b"),  # DD-MM-YYYY or DD/MM/YYYY
+        re.compile(r"\b(\d{1,2}[/-]\d{1,2}[/-]\d{2})\b"),  # DD-MM-YY or DD/MM/YY
+        re.compile(r"\b(\d{2}\s+[A-Za-z]{3}\s+\d{4})\b"),  # DD Mon YYYY
+        re.compile(r"\b(\d{4}[/-]\d{1,2}[/-]\d{1,2})\b"),  # YYYY-MM-DD or YYYY/MM/DD
+    ]
+    VENDOR_SKIP_KEYWORDS = ('receipt', 'bill', 'invoice', 'date', 'time', 'total', 'amount')
+    BUSINESS_INDICATORS = ('restaurant', 'cafe', 'coffee', 'shop', 'store', 'market', 'mart', 'ltd', 'inc', 'pvt')
+    NON_LETTER_PATTERN = re.compile(r'[^a-zA-Z\s]')
+    WORD_PATTERN = re.compile(r'[a-zA-Z]{3,}')
+    GSTIN_PATTERN = re.compile(r'\b([0-9]{2}[A-Z]{5}[0-9]{4}[A-Z]{1}[1-9A-Z]{1}Z[0-9A-Z]{1})\b')
+    LABELED_GSTIN_PATTERN = re.compile(r'(?i)(?:GSTIN|GST\s*No|GST\s*Number)\s*[:\-]?\s*' + GSTIN_PATTERN.pattern)
+    TAX_PATTERN = re.compile(r"(?i)(CGST|SGST|IGST)\s*(?:@\s*[\d.]+%?)?\s*[:\-]?\s*[₹$]?\s*([0-9,]+\.\d{2})")
+    INVOICE_PATTERNS = [
+        re.compile(r"(?i)(?:Invoice\s*No|Inv\s*No|Bill\s*No|Receipt\s*#)\s*[:\-]?\s*([A-Za-z0-9/-]+)"),
+    ]
+    # Digit runs of up to eight digits not followed by a word character; see extract_hsn_codes
+    HSN_RUN_PATTERN = re.compile(r"\d{4,8}(?!\w)")
+
     def extract_total(self, ocr_text: str) -> Optional[str]:
         """
-        Extract the total amount from the OCR text using a prioritized strategy.
+        Extract the total amount: the largest amount on the lines with a 'total'
+        keyword or, failing that, the largest anywhere on the receipt.
+
+        Keywords are located with ``str.find``, so only their lines are split and
+        scanned for amounts.
         """
+        # lower() leaves the digits, commas and points of amounts as they are, so
+        # keywords and amounts are both found in the lowercase copy
+        lower_text = ocr_text.lower()
+        # Newline-delimited lines holding a keyword, by start offset (keywords hold no line breaks)
+        keyword_lines: Dict[int, int] = {}
+        for keyword in self.TOTAL_KEYWORDS:
+            position = lower_text.find(keyword)
+            while position >= 0:
+                start = lower_text.rfind('\n', 0, position) + 1
+                if start not in keyword_lines:
+                    end = lower_text.find('\n', position)
+                    keyword_lines[start] = len(lower_text) if end < 0 else end
+                position = lower_text.find(keyword, keyword_lines[start])
+
         candidates = []
-        
-        # Priority 1: Find amounts on lines with a 'total' keyword.
-        total_keywords = ['total', 'grand total', 'amount due', 'net amount', 'final amount']
-        for line in ocr_text.splitlines():
-            if any(keyword in line.lower() for keyword in total_keywords):
-                matches = re.findall(r'([0-9,]+\.\d{2})', line)
-                for amount in matches:
-                    try:
-                        float_amount = float(amount.replace(',', ''))
-                        if 1 <= float_amount <= 100000:
-                            candidates.append(float_amount)
-                    except ValueError:
-                        continue
-        
-        if candidates:
-            # Return the largest valid amount from the 'total' lines.
-            return f"{max(candidates):.2f}"
+        for start in sorted(keyword_lines):
+            # splitlines() also splits on other line breaks, so check each part again
+            for line in lower_text[start:keyword_lines[start]].splitlines():
+                if any(keyword in line for keyword in self.TOTAL_KEYWORDS):
+                    candidates.extend(self._valid_amounts(self.AMOUNT_PATTERN.findall(line)))
+        if not candidates:
+            # Fallback: the largest amount anywhere on the receipt
+            candidates = self._valid_amounts(self.AMOUNT_PATTERN.findall(lower_text))
+        return f"{max(candidates):.2f}" if candidates else None
 
-        # Priority 2 (Fallback): Find the largest amount anywhere on the receipt.
-        all_amounts = []
-        matches = re.findall(r'([0-9,]+\.\d{2})', ocr_text)
-        for amount in matches:
-            try:
-                float_amount = float(amount.replace(',', ''))
-                if 1 <= float_amount <= 100000:
-                    all_amounts.append(float_amount)
-            except ValueError:
-                continue
-        
-        if all_amounts:
-            # Return the overall largest valid amount.
-            return f"{max(all_amounts):.2f}"
-            
-        return None
+    @staticmethod
+    def _valid_amounts(amounts: List[str]) -> List[float]:
+        values = [float(amount.replace(',', '')) for amount in amounts]
+        return [value for value in values if 1 <= value <= 100000]
 
     def extract_date(self, ocr_text: str) -> Optional[str]:
         """
         Extract the date from the OCR text using regular expressions.
         """
-        date_patterns = [
-            r"\b(\d{1,2}[/-]\d{1,2}[/-]\d{4})\b",  # DD-MM-YYYY or DD/MM/YYYY
-            r"\b(\d{1,2}[/-]\d{1,2}[/-]\d{2})\b",  # DD-MM-YY or DD/MM/YY
-            r"\b(\d{2}\s+[A-Za-z]{3}\s+\d{4})\b",  # DD Mon YYYY
-            r"\b(\d{4}[/-]\d{1,2}[/-]\d{1,2})\b",  # YYYY-MM-DD or YYYY/MM/DD
-            r"(?i)(date|dated)[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",  # "Date: DD/MM/YYYY"
-        ]
-        
-        for pattern in date_patterns:
-            match = re.search(pattern, ocr_text)
+        for pattern in self.DATE_PATTERNS:
+            match = pattern.search(ocr_text)
             if match:
-                # Get the date part - handle both single group and tuple matches
-                date_str = match.group(1) if match.lastindex and match.lastindex >= 1 else match.group(0)
-                # Basic validation - check if it looks like a reasonable date
-                if len(date_str) >= 6:  # At least DDMMYY format
-                    return date_str
+                return match.group(1)
         return None
 
     def extract_vendor(self, ocr_text: str) -> Optional[str]:
         """
-        Extract the vendor name from the OCR text.
-        Try to find the most likely vendor name using multiple strategies.
+        Extract the vendor name from the OCR text: the first of the first five
+        non-empty lines that looks like a business name, else the first line of at
+        least three characters that is not a number. Lines are read only until
+        that is settled.
         """
-        lines = [line.strip() for line in ocr_text.splitlines() if line.strip()]
-        
-        if not lines:
-            return None
-        
-        # Strategy 1: Look for lines that look like business names
-        for line in lines[:5]:  # Check first 5 lines
-            # Skip lines that are clearly not vendor names
-            if any(keyword in line.lower() for keyword in ['receipt', 'bill', 'invoice', 'date', 'time', 'total', 'amount']):
-                continue
-            
-            # Skip lines with mostly numbers or symbols
-            if len(re.sub(r'[^a-zA-Z\s]', '', line)) < len(line) * 0.5:
-                continue
-            
-            # Skip very short lines (less than 3 characters)
-            if len(line) < 3:
+        fallback = None
+        checked = 0
+        for line in ocr_text.splitlines():
+            line = line.strip()
+            if not line:
                 continue
-            
-            # If line contains common business words, it's likely the vendor
-            business_indicators = ['restaurant', 'cafe', 'coffee', 'shop', 'store', 'market', 'mart', 'ltd', 'inc', 'pvt']
-            if any(indicator in line.lower() for indicator in business_indicators):
-                return line
-            
-            # If it's a reasonable length and mostly alphabetic, use it
-            if 3 <= len(line) <= 50 and re.search(r'[a-zA-Z]{3,}', line):
-                return line
-        
-        # Strategy 2: If no good candidate found, use the first non-empty line
-        for line in lines:
-            if len(line) >= 3 and not line.isdigit():
-                return line
-        
-        return None
+            if checked < 5:
+                checked += 1
+                if self._is_vendor_line(line):
+                    return line
+            if fallback is None and len(line) >= 3 and not line.isdigit():
+                fallback = line
+            if checked == 5 and fallback is not None:
+                break
+        return fallback
+
+    def _is_vendor_line(self, line: str) -> bool:
+        """Whether a stripped line looks like a business name."""
+        lower = line.lower()
+        # Skip lines that are clearly not vendor names
+        if any(keyword in lower for keyword in self.VENDOR_SKIP_KEYWORDS):
+            return False
+        # Skip lines with mostly numbers or symbols, and very short lines
+        if len(self.NON_LETTER_PATTERN.sub('', line)) < len(line) * 0.5 or len(line) < 3:
+            return False
+        # Common business words, or a reasonable length with a word in it
+        if any(indicator in lower for indicator in self.BUSINESS_INDICATORS):
+            return True
+        return len(line) <= 50 and self.WORD_PATTERN.search(line) is not None
 
     def _is_valid_gstin(self, gstin: str) -> bool:
         """
@@ -141,11 +154,8 @@ class ParserService:
         """
         Extract and validate the GSTIN from the OCR text.
         """
-        gstin_pattern = r'\b([0-9]{2}[A-Z]{5}[0-9]{4}[A-Z]{1}[1-9A-Z]{1}Z[0-9A-Z]{1})\b'
-        labeled_pattern = r'(?i)(?:GSTIN|GST\s*No|GST\s*Number)\s*[:\-]?\s*' + gstin_pattern
-        
-        for pattern in [labeled_pattern, gstin_pattern]:
-            matches = re.findall(pattern, ocr_text)
+        for pattern in [self.LABELED_GSTIN_PATTERN, self.GSTIN_PATTERN]:
+            matches = pattern.findall(ocr_text)
             for match in matches:
                 gstin = match if isinstance(match, str) else match[-1]
                 gstin_clean = re.sub(r'[\s-]', '', gstin).upper()
@@ -161,9 +171,7 @@ class ParserService:
         # Pattern to find tax type (CGST, SGST, IGST) and its corresponding amount.
         # It looks for the tax label, followed by an optional percentage,
         # and then captures the numeric amount.
-        tax_pattern = r"(?i)(CGST|SGST|IGST)\s*(?:@\s*[\d.]+%?)?\s*[:\-]?\s*[₹$]?\s*([0-9,]+\.\d{2})"
-        
-        matches = re.findall(tax_pattern, ocr_text)
+        matches = self.TAX_PATTERN.findall(ocr_text)
         
         tax_data = {
             "cgst": None,
@@ -184,14 +192,10 @@ class ParserService:
         """
         Extract the invoice number from the OCR text.
         """
-        # Patterns to look for invoice number, bill number, etc.
-        # It captures an alphanumeric string that follows the label.
-        invoice_patterns = [
-            r"(?i)(?:Invoice\s*No|Inv\s*No|Bill\s*No|Receipt\s*#)\s*[:\-]?\s*([A-Za-z0-9/-]+)",
-        ]
-
-        for pattern in invoice_patterns:
-            match = re.search(pattern, ocr_text)
+        # Patterns look for invoice number, bill number, etc. and capture the
+        # alphanumeric string that follows the label.
+        for pattern in self.INVOICE_PATTERNS:
+            match = pattern.search(ocr_text)
             if match:
                 invoice_number = match.group(1).strip()
                 if 2 <= len(invoice_number) <= 30:
@@ -200,26 +204,25 @@ class ParserService:
 
     def extract_hsn_codes(self, ocr_text: str) -> List[str]:
         """
-        Extract HSN/SAC codes from the OCR text.
-        HSN/SAC codes are typically 4, 6, or 8 digits.
+        Extract HSN/SAC codes from the OCR text: whole numbers of 4, 6 or 8 digits
+        (not preceded or followed by a word character), in order of appearance and
+        without duplicates. Numbers starting with 19 or 20 are taken for years.
         """
-        # This pattern looks for 4, 6, or 8 digit numbers that are likely HSN/SAC codes.
-        # It is a simple regex and may need refinement for complex layouts.
-        hsn_pattern = r"\b(\d{4}|\d{6}|\d{8})\b"
-        
-        # Using a set to avoid duplicate codes
-        found_codes = set()
-        
-        # Find all potential codes in the text
-        matches = re.findall(hsn_pattern, ocr_text)
-        
-        # Simple validation: avoid numbers that are clearly something else (e.g., years)
-        for code in matches:
-            if not (code.startswith('19') or code.startswith('20')):
-                found_codes.add(code)
-                
+        # One scan for every digit run; a run is a code if no word character
+        # precedes it and it has the right length
+        found_codes = {}
+        for match in self.HSN_RUN_PATTERN.finditer(ocr_text):
+            start, end = match.span()
+            if end - start in (4, 6, 8) and not (start and self._is_word_char(ocr_text[start - 1])):
+                code = match.group()
+                if not code.startswith(('19', '20')):
+                    found_codes[code] = None
         return list(found_codes)
 
+    @staticmethod
+    def _is_word_char(char: str) -> bool:
+        return char.isalnum() or char == '_'
+
     def parse(self, ocr_text: str) -> Dict[str, any]:
         """
         Parse the OCR text to extract structured data.
@@ -232,10 +235,60 @@ class ParserService:
             "invoice_number": self.extract_invoice_number(ocr_text),
             "hsn_codes": self.extract_hsn_codes(ocr_text),
         }
-        tax_data = self.extract_tax_breakdown(ocr_text)
-        parsed_data.update(tax_data)
+        parsed_data.update(self.extract_tax_breakdown(ocr_text))
         return parsed_data
 
+    def parse_many(
+        self,
+        texts: Iterable[str],
+        chunk_size: int = 500,
+        workers: Optional[int] = None,
+        max_chunks_in_flight: Optional[int] = None,
+    ) -> Iterator[Dict[str, any]]:
+        """
+        Parse a stream of OCR texts on a process pool, yielding the results in input order.
+
+        ``texts`` is consumed lazily in chunks of ``chunk_size``, and at most
+        ``max_chunks_in_flight`` chunks (default: twice the workers) are submitted or
+        waiting to be yielded, so memory stays proportional to the chunk size however
+        long the stream is. Closing the iterator early cancels the chunks not started.
+
+        Args:
+            texts: OCR texts, e.g. a generator over an archive.
+            chunk_size: Texts sent to a worker at once. Larger chunks spread the
+                inter-process overhead over more texts.
+            workers: Worker processes. Defaults to the CPU count; 1 parses in this
+                process without a pool.
+            max_chunks_in_flight: Bound on chunks held at any time.
+        """
+        workers = workers or os.cpu_count() or 1
+        if workers <= 1:
+            for text in texts:
+                yield self.parse(text)
+            return
+
+        texts = iter(texts)
+        max_chunks_in_flight = max(1, max_chunks_in_flight or 2 * workers)
+        pool = ProcessPoolExecutor(max_workers=workers)
+        pending = deque()
+        try:
+            while True:
+                while len(pending) < max_chunks_in_flight:
+                    chunk = list(islice(texts, chunk_size))
+                    if not chunk:
+                        break
+                    pending.append(pool.submit(_parse_chunk, self, chunk))
+                if not pending:
+                    return
+                yield from pending.popleft().result()
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+def _parse_chunk(parser: ParserService, texts: List[str]) -> List[Dict[str, any]]:
+    """Worker side of ``ParserService.parse_many``."""
+    return [parser.parse(text) for text in texts]
+
+
 # Example usage
 if __name__ == "__main__":
     parser = ParserService()
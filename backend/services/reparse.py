@@ -0,0 +1,109 @@
+"""
+Re-parse an archive of OCR texts with the current parsing rules.
+
+Input is NDJSON, one record per line: a JSON object whose ``--text-field``
+(default "text") holds the OCR text, or a bare JSON string. Each output line is
+the input record with the text removed (unless ``--keep-text``) and the parse
+result under "parsed", in input order. A line that cannot be read yields
+``{"line": n, "error": ...}`` instead, so output lines always match input lines.
+
+Records are streamed through ``ParserService.parse_many``, so memory use depends
+on the chunk size and worker count, not on the size of the archive.
+
+Run from the backend directory:
+    python -m services.reparse [archive.ndjson] [-o reparsed.ndjson] [--workers 8] [--chunk-size 500]
+"""
+
+import argparse
+import json
+import logging
+import sys
+import time
+from collections import deque
+from typing import IO, Any, Dict, Iterator, Optional
+
+from .parser import ParserService
+
+logger = logging.getLogger(__name__)
+
+# Log progress every this many records
+_PROGRESS_EVERY = 100000
+
+
+def reparse(
+    source: IO[str],
+    sink: IO[str],
+    text_field: str = "text",
+    keep_text: bool = False,
+    workers: Optional[int] = None,
+    chunk_size: int = 500,
+) -> Dict[str, Any]:
+    """Re-parse the NDJSON records of ``source`` into ``sink``; returns counts and timing."""
+    # (record, readable) waiting for their parse result, in input order; at most
+    # the chunks parse_many holds in flight
+    records: deque = deque()
+    errors = 0
+
+    def texts() -> Iterator[str]:
+        nonlocal errors
+        for number, line in enumerate(source, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if isinstance(record, str):
+                    record, text = {}, record
+                else:
+                    text = record[text_field] if keep_text else record.pop(text_field)
+                if not isinstance(text, str):
+                    raise TypeError(f'"{text_field}" is not a string')
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                errors += 1
+                records.append(({"line": number, "error": f"{type(e).__name__}: {e}"}, False))
+                yield ""
+                continue
+            records.append((record, True))
+            yield text
+
+    started = time.monotonic()
+    written = 0
+    for parsed in ParserService().parse_many(texts(), chunk_size=chunk_size, workers=workers):
+        record, readable = records.popleft()
+        if readable:
+            record["parsed"] = parsed
+        sink.write(json.dumps(record, ensure_ascii=False))
+        sink.write("\n")
+        written += 1
+        if written % _PROGRESS_EVERY == 0:
+            logger.info(f"Re-parsed {written} records ({written / (time.monotonic() - started):.0f}/s)")
+    elapsed = time.monotonic() - started
+    return {
+        "records": written,
+        "errors": errors,
+        "seconds": round(elapsed, 2),
+        "records_per_second": round(written / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", nargs="?", help="NDJSON archive (default: stdin)")
+    parser.add_argument("-o", "--output", help="Output NDJSON file (default: stdout)")
+    parser.add_argument("--text-field", default="text", help="Field holding the OCR text")
+    parser.add_argument("--keep-text", action="store_true", help="Keep the OCR text in the output records")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count, 1: no pool)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Texts per worker task")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+                        stream=sys.stderr)
+
+    source = open(args.input, encoding="utf-8") if args.input else sys.stdin
+    sink = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        summary = reparse(source, sink, args.text_field, args.keep_text, args.workers, args.chunk_size)
+    finally:
+        if args.input:
+            source.close()
+        if args.output:
+            sink.close()
+    logger.info(f"Done: {json.dumps(summary)}")
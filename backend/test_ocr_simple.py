@@ -29,24 +29,24 @@ def test_ocr_with_uploaded_files():
     ocr_service = OCRService()
     parser_service = ParserService()
     
-    for img_file in image_files[:3]:  # Test first 3 files
+    # OCR the first 3 files concurrently, results in input order
+    for img_file, item in zip(image_files[:3], ocr_service.extract_batch([str(f) for f in image_files[:3]])):
         print(f"\n🖼️  Testing: {img_file.name}")
         print("=" * 50)
-        
-        try:
-            # Extract text
-            extracted_text = ocr_service.extract_text_from_image(str(img_file))
-            print(f"📝 OCR Text ({len(extracted_text)} chars):")
-            print(repr(extracted_text))
-            
-            # Parse structured data
-            parsed_data = parser_service.parse(extracted_text)
-            print(f"\n🔍 Parsed Data:")
-            for key, value in parsed_data.items():
-                print(f"  {key}: {value}")
-            
-        except Exception as e:
-            print(f"❌ Error processing {img_file.name}: {e}")
+
+        if not item.ok:
+            print(f"❌ Error processing {img_file.name}: {item.error}")
+            continue
+
+        extracted_text = item.text
+        print(f"📝 OCR Text ({len(extracted_text)} chars, {item.strategy}, {item.elapsed:.2f}s):")
+        print(repr(extracted_text))
+
+        # Parse structured data
+        parsed_data = parser_service.parse(extracted_text)
+        print(f"\n🔍 Parsed Data:")
+        for key, value in parsed_data.items():
+            print(f"  {key}: {value}")
 
 if __name__ == "__main__":
     test_ocr_with_uploaded_files()
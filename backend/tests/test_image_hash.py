@@ -0,0 +1,144 @@
+import io
+import random
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from services.image_hash import DEFAULT_MAX_DISTANCE, DuplicateIndex, MultiIndexHash, hamming, image_hash
+
+
+def _png(img) -> bytes:
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.fromarray(img).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def test_photo_and_crop_of_a_receipt_hash_alike_and_other_receipts_do_not():
+    import cv2
+    import numpy as np
+    from benchmarks.corpus import render_receipt
+
+    receipt, _ = render_receipt(0, width=800)
+    other, _ = render_receipt(1, width=800)
+    h, w = receipt.shape
+    # The same receipt photographed slightly askew on a desk
+    corners = np.float32([[600, 200], [600 + w, 230], [590 + w, 200 + h], [610, 190 + h]])
+    M = cv2.getPerspectiveTransform(np.float32([[0, 0], [w, 0], [w, h], [0, h]]), corners)
+    photo = np.full((1500, 2000), 70, dtype=np.uint8)
+    mask = cv2.warpPerspective(np.full_like(receipt, 255), M, (2000, 1500)) > 0
+    photo[mask] = cv2.warpPerspective(receipt, M, (2000, 1500))[mask]
+
+    crop = int(image_hash(_png(receipt)), 16)
+    assert hamming(crop, int(image_hash(_png(photo)), 16)) <= DEFAULT_MAX_DISTANCE
+    assert hamming(crop, int(image_hash(_png(other)), 16)) > DEFAULT_MAX_DISTANCE
+    assert image_hash(b"%PDF-1.4 not an image") is None
+
+
+def test_multi_index_search_matches_a_linear_scan():
+    rng = random.Random(0)
+    templates = [rng.getrandbits(256) for _ in range(5)]
+
+    def flip(value, bits):
+        for bit in rng.sample(range(256), bits):
+            value ^= 1 << bit
+        return value
+
+    values = [flip(rng.choice(templates), rng.randint(0, 40)) for _ in range(500)]
+    index = MultiIndexHash()
+    for key, value in enumerate(values):
+        index.add(value, str(key))
+    for _ in range(50):
+        query = flip(rng.choice(values), rng.randint(0, 20))
+        expected = sorted((hamming(query, value), str(key)) for key, value in enumerate(values)
+                          if hamming(query, value) <= DEFAULT_MAX_DISTANCE)
+        assert index.search(query) == expected
+
+
+def test_duplicate_index_skips_deleted_receipts():
+    index = DuplicateIndex()
+    index.load(lambda: [("a", "f" * 64), ("b", None)])
+    index.add("c", "f" * 63 + "e")
+    assert index.nearest("f" * 64) == ("a", 0)
+    index.discard("a")
+    assert index.nearest("f" * 64) == ("c", 1)
+    assert index.nearest("0" * 64) is None
+
+
+def test_receipts_from_one_template_are_flagged_but_never_merged(monkeypatch, tmp_path):
+    import asyncio
+    import cv2
+    import numpy as np
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from benchmarks.corpus import receipt_fields
+    import services.ocr as ocr
+    from models.entities import Base, Receipt
+
+    # api.receipts creates its upload directory on import
+    monkeypatch.chdir(tmp_path)
+    import api.receipts as receipts
+
+    def image_to_data(image, output_type=None, config="", **kwargs):
+        return {"level": [5], "block_num": [1], "par_num": [1], "line_num": [1], "conf": [90], "text": ["Total"]}
+
+    monkeypatch.setattr(ocr.pytesseract, "image_to_data", image_to_data)
+    monkeypatch.setattr(receipts, "duplicate_index", DuplicateIndex())
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine, expire_on_commit=False)()
+
+    # The same template with another total and date
+    lines = receipt_fields(0)["lines"]
+    other = [line.replace(receipt_fields(0)["total"], "1234.50").replace(receipt_fields(0)["date"], "02/03/2025")
+             for line in lines]
+    pngs = []
+    for printed in (lines, other, lines):
+        img = np.full((40 * (len(printed) + 2), 800), 255, dtype=np.uint8)
+        for i, line in enumerate(printed):
+            cv2.putText(img, line, (30, 40 * (i + 1) + 10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, 0, 2, cv2.LINE_AA)
+        pngs.append(_png(img))
+    assert pngs[0] == pngs[2] and pngs[0] != pngs[1]
+    assert hamming(int(image_hash(pngs[0]), 16), int(image_hash(pngs[1]), 16)) <= DEFAULT_MAX_DISTANCE
+
+    class Upload:
+        content_type = "image/png"
+
+        def __init__(self, filename):
+            self.filename = filename
+
+    class Request:
+        async def is_disconnected(self):
+            return False
+
+    def upload(duplicates, *positions):
+        saved = []
+        for position in positions:
+            path = tmp_path / f"{len(list(tmp_path.glob('*.png')))}.png"
+            path.write_bytes(pngs[position])
+            saved.append((Upload(f"receipt{position}.png"), path))
+        return asyncio.run(receipts.process_uploads(Request(), saved, duplicates, db, False, 60))
+
+    assert receipts.DUPLICATES_QUERY.default == "flag"
+    # reuse: the second receipt is OCRed as its own receipt, an identical file is copied
+    results, errors = upload("reuse", 0, 1, 2)
+    stored = [result["id"] for result in results]
+    assert not errors
+    assert [result["duplicate_of"] for result in results[:2]] == [None, None]
+    assert results[1]["ocr"] is not None
+    assert results[2]["duplicate_of"]["id"] == results[0]["id"] and results[2]["ocr"] is None
+    assert db.query(Receipt).count() == 3
+
+    # flag: the near-duplicate is OCRed and stored, marked for review
+    results, errors = upload("flag", 1)
+    assert not errors
+    assert results[0]["ocr"] is not None and results[0]["status"] == "probable_duplicate"
+    assert results[0]["duplicate_of"]["id"] in stored
+    flagged = db.get(Receipt, results[0]["id"])
+    assert flagged.status == "probable_duplicate" and flagged.duplicate_of == results[0]["duplicate_of"]["id"]
+    assert db.query(Receipt).count() == 4
+
+    # ignore: the same upload is stored unmarked
+    results, errors = upload("ignore", 1)
+    assert not errors and results[0]["duplicate_of"] is None and results[0]["status"] == "needs_review"
+    assert db.query(Receipt).count() == 5
@@ -16,3 +16,583 @@ def test_two_receipts_present_and_readable():
         # For logo images, we might get less text, so reduce the requirement
         assert len(txt) > 0, f"No text extracted from {p}"
         print(f"Extracted text from {p}: {txt[:100]}...")  # Debug output
+
+
+def _fake_tesseract(monkeypatch, confidence):
+    """Replace the Tesseract calls with a fake engine returning a fixed confidence."""
+    import services.ocr as ocr
+    calls = []
+
+    def image_to_string(image, config="", **kwargs):
+        calls.append(("string", config))
+        return "TOTAL 10.00\n"
+
+    def image_to_data(image, output_type=None, config="", **kwargs):
+        calls.append(("data", config))
+        return {
+            "level": [1, 5, 5],
+            "block_num": [0, 1, 1],
+            "par_num": [0, 1, 1],
+            "line_num": [0, 1, 1],
+            "conf": [-1, confidence, confidence],
+            "text": ["", "TOTAL", "10.00"],
+        }
+
+    monkeypatch.setattr(ocr.pytesseract, "image_to_string", image_to_string)
+    monkeypatch.setattr(ocr.pytesseract, "image_to_data", image_to_data)
+    return calls
+
+
+def test_schedule_tries_cheap_candidates_first():
+    from services.ocr import _schedule_candidates
+    schedule = _schedule_candidates(["binarize", "otsu", "clahe", "clahe_pro"], ["--psm 6", "--psm 3"])
+    assert len(schedule) == 8
+    assert schedule[0] == ("binarize", "--psm 6")
+    assert schedule[-1] == ("clahe_pro", "--psm 3")
+
+
+def test_extract_stops_once_confidence_target_is_met(monkeypatch):
+    import numpy as np
+    _fake_tesseract(monkeypatch, 90)
+    result = OCRService(triage=False).extract(np.full((200, 1000, 3), 255, dtype=np.uint8))
+    assert result.text == "TOTAL 10.00"
+    assert result.candidates_tried == 1
+    assert result.candidates_skipped == 11
+    assert result.strategy == "binarize/psm 6"
+
+
+def test_extract_tries_every_candidate_below_target(monkeypatch):
+    import numpy as np
+    _fake_tesseract(monkeypatch, 40)
+    result = OCRService().extract(np.full((200, 1000, 3), 255, dtype=np.uint8))
+    assert result.candidates_tried == 12
+    assert result.candidates_skipped == 0
+
+
+def test_extract_runs_tesseract_once_per_candidate(monkeypatch):
+    import numpy as np
+    calls = _fake_tesseract(monkeypatch, 40)
+    OCRService().extract(np.full((200, 1000, 3), 255, dtype=np.uint8))
+    assert len(calls) == 12
+    assert all(kind == "data" for kind, _ in calls)
+
+
+def test_triage_routes_clean_scans_to_a_single_pipeline(monkeypatch):
+    from benchmarks.corpus import render_receipt
+    img, _ = render_receipt(2, width=1000)
+
+    _fake_tesseract(monkeypatch, 90)
+    result = OCRService().extract(img)
+    assert result.triage["route"] == ["otsu"]
+    assert result.strategy == "otsu/psm 6"
+    assert result.candidates_tried == 1
+
+    _fake_tesseract(monkeypatch, 40)
+    result = OCRService().extract(img)
+    assert result.triage["fallback"] is True
+    assert result.candidates_tried == 12
+
+
+def test_fast_extract_only_ocrs_header_and_totals(monkeypatch):
+    from benchmarks.corpus import render_receipt
+    img, _ = render_receipt(0, width=1000)
+
+    calls = _fake_tesseract(monkeypatch, 90)
+    result = OCRService().extract(img, fast=True)
+    assert result.partial
+    assert [region["region"] for region in result.regions] == ["header", "totals"]
+    assert len(calls) == 2
+    assert [config for _, config in calls] == [OCRService.FAST_REGION_CONFIGS["header"], OCRService.FAST_REGION_CONFIGS["totals"]]
+    header, totals = result.regions
+    assert header["bottom"] < totals["top"]
+    assert header["bottom"] - header["top"] + totals["bottom"] - totals["top"] < img.shape[0] * 0.8
+
+
+def test_fast_extract_falls_back_on_the_image_it_already_decoded(monkeypatch):
+    import numpy as np
+    import services.ocr as ocr
+
+    decodes = []
+    load_image = ocr._load_image
+    monkeypatch.setattr(ocr, "_load_image", lambda *args, **kwargs: decodes.append(args[1:]) or load_image(*args, **kwargs))
+    _fake_tesseract(monkeypatch, 90)
+    # A blank page has too few text lines for the fast path
+    result = OCRService().extract(np.full((400, 1000, 3), 255, dtype=np.uint8), fast=True)
+    assert not result.partial
+    assert len(decodes) == 1
+    assert result.preprocessing["resize_factor"] == 1.0
+    assert "decode" in result.timings
+
+
+def test_text_rebuilt_from_tesseract_data_keeps_line_breaks():
+    from services.ocr import _text_from_tesseract_data
+    data = {
+        "level": [1, 2, 3, 4, 5, 5, 4, 5, 3, 4, 5],
+        "block_num": [0, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
+        "par_num": [0, 0, 1, 1, 1, 1, 1, 1, 2, 2, 2],
+        "line_num": [0, 0, 0, 1, 1, 1, 2, 2, 0, 1, 1],
+        "text": ["", "", "", "", "SuperMart", "Grocery", "", "Main St", "", "", "Total:"],
+        "conf": [-1, -1, -1, -1, 95, 93, -1, 90, -1, -1, 88],
+    }
+    assert _text_from_tesseract_data(data) == "SuperMart Grocery\nMain St\n\nTotal:\n"
+
+
+def test_engine_config_parsing():
+    from services.ocr_engine import _parse_config
+    assert _parse_config("--oem 1 --psm 6 -l eng+hin -c preserve_interword_spaces=1") == (
+        "eng+hin", 1, 6, {"preserve_interword_spaces": "1"})
+
+
+def test_parallel_candidates_pick_the_same_winner_as_serial(monkeypatch):
+    import numpy as np
+    import services.ocr as ocr
+
+    def image_to_data(image, output_type=None, config="", **kwargs):
+        confidence = 70 if "--psm 3" in config else 50
+        return {"level": [5], "block_num": [1], "par_num": [1], "line_num": [1],
+                "conf": [confidence], "text": [config]}
+
+    monkeypatch.setattr(ocr.pytesseract, "image_to_data", image_to_data)
+    monkeypatch.setenv("OMP_THREAD_LIMIT", "1")
+    image = np.full((200, 1000, 3), 255, dtype=np.uint8)
+    serial = OCRService(max_workers=1, triage=False).extract(image)
+    parallel = OCRService(max_workers=4, triage=False).extract(image)
+    assert serial.strategy == parallel.strategy == "binarize/psm 3"
+    assert serial.text == parallel.text
+
+
+def test_pdf_pages_are_reassembled_in_order_with_bounded_memory(monkeypatch):
+    import random
+    import threading
+    import time
+    from PIL import Image
+    import services.ocr as ocr
+    from services.ocr import OCRResult
+
+    lock = threading.Lock()
+    alive = {"now": 0, "max": 0}
+
+    def render(pdf_path, first_page, last_page, dpi=200):
+        with lock:
+            alive["now"] += last_page - first_page + 1
+            alive["max"] = max(alive["max"], alive["now"])
+        return [Image.new("L", (100 + page, 100), 255) for page in range(first_page, last_page + 1)]
+
+    class PageService(OCRService):
+        def extract(self, img, **kwargs):
+            if not isinstance(img, Image.Image):
+                return super().extract(img, **kwargs)
+            time.sleep(random.random() / 100)
+            with lock:
+                alive["now"] -= 1
+            return OCRResult(text=f"text of page {img.width - 100}", confidence=80)
+
+    monkeypatch.setattr(ocr, "_pdf_page_count", lambda path: 9)
+    monkeypatch.setattr(ocr, "_render_pdf_pages", render)
+    monkeypatch.setattr(ocr, "_pdf_text_layer", lambda path: [])
+    result = PageService(pdf_workers=3, max_pages_in_flight=4).extract_pdf("statement.pdf")
+
+    assert result.text.split("\n\n")[0] == "--- Page 1 ---\ntext of page 1"
+    assert [page["page"] for page in result.pages] == list(range(1, 10))
+    assert all(f"--- Page {n} ---\ntext of page {n}" in result.text for n in range(1, 10))
+    assert alive["max"] <= 4
+
+
+def test_pdf_pages_with_a_text_layer_skip_ocr(monkeypatch):
+    from PIL import Image
+    import services.ocr as ocr
+    from services.ocr import OCRResult
+
+    rendered = []
+
+    def render(pdf_path, first_page, last_page, dpi=200):
+        rendered.extend(range(first_page, last_page + 1))
+        return [Image.new("L", (100, 100), 255) for _ in range(first_page, last_page + 1)]
+
+    class PageService(OCRService):
+        def extract(self, img, **kwargs):
+            return OCRResult(text="scanned page", confidence=70)
+
+    layer = ["", "Tax Invoice GSTIN 29AAFCT6192H1ZV Total 17700.00", "", "  \n"]
+    monkeypatch.setattr(ocr, "_pdf_page_count", lambda path: 4)
+    monkeypatch.setattr(ocr, "_render_pdf_pages", render)
+    monkeypatch.setattr(ocr, "_pdf_text_layer", lambda path: layer)
+    result = PageService().extract_pdf("invoice.pdf")
+
+    assert rendered == [1, 3, 4]
+    assert [page["source"] for page in result.pages] == ["ocr", "text_layer", "ocr", "ocr"]
+    assert "--- Page 2 ---\nTax Invoice GSTIN 29AAFCT6192H1ZV Total 17700.00" in result.text
+
+
+def test_preprocess_graph_computes_shared_stages_once(monkeypatch):
+    import numpy as np
+    import services.ocr as ocr
+
+    calls = []
+    original = ocr._PreprocessGraph.STAGES["gray"]
+    stages = dict(ocr._PreprocessGraph.STAGES)
+    stages["gray"] = (lambda img: calls.append("gray") or original[0](img), original[1])
+    monkeypatch.setattr(ocr._PreprocessGraph, "STAGES", stages)
+
+    graph = ocr._PreprocessGraph(np.full((100, 200, 3), 255, dtype=np.uint8))
+    for name in ("binarize", "otsu", "clahe"):
+        assert graph.variant(name) is not None
+    assert calls == ["gray"]
+    assert {"gray", "blurred", "skew_angle", "adaptive", "otsu", "clahe_otsu"} <= set(graph.timings)
+
+
+def test_skew_estimate_is_within_half_a_degree():
+    from benchmarks.corpus import render_receipt, rotate
+    from services.ocr import _estimate_skew_angle
+    img, _ = render_receipt(3, width=1000)
+    assert _estimate_skew_angle(img) == 0.0
+    for angle in (-12.0, -2.5, 4.0):
+        assert abs(_estimate_skew_angle(rotate(img, angle)) + angle) <= 0.5
+
+
+def test_denoise_tier_follows_noise_level_and_budget():
+    import numpy as np
+    from benchmarks.corpus import render_receipt
+    from services.ocr import _select_denoise_tier
+    from services.ocr_triage import estimate_noise
+
+    img, _ = render_receipt(1, width=1000)
+    paper = (30 + img.astype(np.float32) * (190 / 255)).astype(np.uint8)
+    noisy = np.clip(paper + np.random.default_rng(0).normal(0, 12, paper.shape), 0, 255).astype(np.uint8)
+    assert estimate_noise(paper) < 1.0
+    assert abs(estimate_noise(noisy) - 12) < 2
+
+    assert _select_denoise_tier(0.5, 1_000_000, budget_ms=None) == "none"
+    assert _select_denoise_tier(3.0, 1_000_000, budget_ms=None) == "bilateral"
+    assert _select_denoise_tier(12.0, 1_000_000, budget_ms=None) == "nlm"
+    assert _select_denoise_tier(12.0, 1_000_000, budget_ms=300) == "nlm_downscaled"
+    assert _select_denoise_tier(12.0, 1_000_000, budget_ms=10) == "bilateral"
+
+
+def test_reduced_decode_honours_exif_orientation():
+    import io
+    import numpy as np
+    from PIL import Image
+    from services.ocr import _load_image
+
+    # Stored 2400x1600 (landscape), displayed 1600 wide after EXIF orientation 6
+    stored = np.zeros((1600, 2400), dtype=np.uint8)
+    stored[:100, :] = 255  # stripe along the top of the stored image
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    buffer = io.BytesIO()
+    Image.fromarray(stored).save(buffer, "JPEG", exif=exif)
+
+    gray, original_shape = _load_image(buffer.getvalue(), target_width=700, grayscale=True)
+    assert original_shape == (2400, 1600)
+    assert gray.ndim == 2
+    assert gray.shape == (1200, 800)  # decoded at half scale, still wider than the target
+    assert gray[:, -20:].mean() > 200 and gray[:, :20].mean() < 50  # the stripe turned to the right
+
+
+def test_batch_results_are_ordered_with_per_item_errors_and_timeouts():
+    import time
+    from services.ocr import Deadline, OCRResult
+
+    class SlowService(OCRService):
+        def extract(self, img, **kwargs):
+            if img == "broken":
+                raise ValueError("Failed to load image")
+            time.sleep(img)
+            return OCRResult(text=f"slept {img}", confidence=80, preprocessor="otsu", config="--psm 6")
+
+    service = SlowService(batch_workers=3)
+    completed = [item.index for item in service.iter_batch([0.2, 0.0, "broken"])]
+    assert completed[-1] == 0
+
+    items = service.extract_batch([0.1, "broken", 2.0, 0.0], timeout=0.5)
+    assert [item.index for item in items] == [0, 1, 2, 3]
+    assert [item.ok for item in items] == [True, False, False, True]
+    assert items[0].text == "slept 0.1" and items[0].strategy == "otsu/psm 6"
+    assert items[1].error == "Failed to load image"
+    assert items[2].error.startswith("Timed out")
+
+    # Items still queued when the batch deadline expires are skipped, not empty successes
+    items = SlowService(batch_workers=1).extract_batch([0.3, 0.0, 0.0], deadline=Deadline(0.1))
+    assert [item.ok for item in items] == [True, False, False]
+    assert all(item.deadline_hit and item.error.startswith("Skipped") for item in items[1:])
+
+
+def test_batch_items_cancelled_part_way_are_errors():
+    from services.ocr import Deadline, OCRResult
+
+    class CancellableService(OCRService):
+        def extract(self, img, deadline=None, **kwargs):
+            if img == "slow":
+                # The client disconnects while this item runs
+                deadline.parent.cancel()
+            return OCRResult(text=img, deadline_hit=deadline.expired())
+
+    batch = Deadline()
+    items = CancellableService(batch_workers=1).extract_batch(["done", "slow", "queued"], deadline=batch)
+    assert batch.cancelled
+    assert [item.ok for item in items] == [True, False, False]
+    assert items[1].error == "Cancelled before it finished" and items[1].text == "slow"
+    assert items[2].error.startswith("Skipped: the batch cancelled")
+
+
+def test_deadline_returns_best_result_so_far(monkeypatch):
+    import time
+    import numpy as np
+    import services.ocr as ocr
+    from services.ocr import Deadline
+
+    timeouts = []
+
+    def image_to_data(image, output_type=None, config="", timeout=0, **kwargs):
+        timeouts.append(timeout)
+        time.sleep(0.15)
+        return {"level": [5], "block_num": [1], "par_num": [1], "line_num": [1],
+                "conf": [40 + len(timeouts)], "text": [f"call {len(timeouts)}"]}
+
+    monkeypatch.setattr(ocr.pytesseract, "image_to_data", image_to_data)
+    image = np.full((200, 1000, 3), 255, dtype=np.uint8)
+    result = OCRService(triage=False).extract(image, deadline=Deadline(0.4))
+    assert result.deadline_hit
+    assert 1 <= result.candidates_tried < 12
+    assert result.text == f"call {len(timeouts)}"
+    assert all(0 < timeout for timeout in timeouts)
+
+    cancelled = Deadline()
+    cancelled.cancel()
+    result = OCRService(triage=False).extract(image, deadline=cancelled)
+    assert result.deadline_hit and result.candidates_tried == 0
+
+
+def test_resolution_ladder_reruns_only_what_stays_uncertain(monkeypatch):
+    import numpy as np
+    import services.ocr as ocr
+
+    calls = []
+
+    def image_to_data(image, output_type=None, config="", **kwargs):
+        calls.append((config, image.shape[1]))
+        if "--psm 7" in config:
+            return {"level": [5, 5], "block_num": [1, 1], "par_num": [1, 1], "line_num": [1, 1],
+                    "conf": [93, 95], "text": ["TOTAL", "10.00"]}
+        # Small scale: a clear first line and a faint second one, unless the page is faint
+        faint = image.shape[1] < 800 and page_faint
+        return {
+            "level": [5, 5, 5, 5], "block_num": [1, 1, 1, 1], "par_num": [1, 1, 1, 1],
+            "line_num": [1, 1, 2, 2], "text": ["CAFE", "AROMA", "T0TAL", "1O.00"],
+            "conf": [20, 20, 20, 20] if faint else [92, 90, 41, 35],
+            "left": [10, 80, 10, 80], "top": [10, 10, 40, 40], "width": [60, 60, 60, 60],
+            "height": [20, 20, 20, 20],
+        }
+
+    monkeypatch.setattr(ocr.pytesseract, "image_to_data", image_to_data)
+    image = np.full((200, 1000, 3), 255, dtype=np.uint8)
+    service = OCRService(triage=False, resolution_ladder=(0.5, 1.0), ladder_max_low_share=0.5)
+
+    page_faint = False
+    result = service.extract(image)
+    assert result.scale == 0.5
+    assert result.text == "CAFE AROMA\nTOTAL 10.00"
+    assert result.candidates_tried == 1
+    assert result.regions == [{"region": "line", "top": 80, "bottom": 120, "scale": 1.0,
+                               "confidence": 94.0, "replaced": True}]
+    assert [config for config, _ in calls].count("--oem 3 --psm 7") == 1
+
+    page_faint, calls[:] = True, []
+    result = service.extract(image)
+    assert result.scale == 1.0 and result.regions == []
+    assert [width for _, width in calls] == [500] * 12 + [1000]
+
+
+def test_images_are_scaled_by_text_height(monkeypatch):
+    import cv2
+    import numpy as np
+    from benchmarks.corpus import render_receipt
+    from services.ocr import _TEXT_HEIGHT_RANGE, _estimate_text_height
+
+    _fake_tesseract(monkeypatch, 90)
+    service = OCRService(triage=False)
+    receipt, _ = render_receipt(0, width=1000)
+    # Small print on a wide page is enlarged, large print on a narrow slip reduced
+    small = _estimate_text_height(receipt)
+    large = cv2.resize(receipt, None, fx=3, fy=3, interpolation=cv2.INTER_CUBIC)
+    for image in (receipt, large):
+        result = service.extract(image)
+        factor = result.preprocessing["resize_factor"]
+        assert _TEXT_HEIGHT_RANGE[0] <= result.preprocessing["text_height"] * factor <= _TEXT_HEIGHT_RANGE[1]
+    assert small < _TEXT_HEIGHT_RANGE[0]
+    assert service.extract(large).preprocessing["resize_factor"] < 1.0
+
+    # Without measurable text the image is resized to the optimal width
+    result = service.extract(np.full((200, 500, 3), 255, dtype=np.uint8))
+    assert "text_height" not in result.preprocessing
+    assert result.preprocessing["resize_factor"] == 2.0
+
+
+def test_large_sparse_photos_are_cropped_to_the_receipt_within_the_pixel_budget(monkeypatch):
+    import io
+    import numpy as np
+    from PIL import Image
+    import services.ocr as ocr
+    from benchmarks.corpus import render_receipt
+    from services.ocr import _MAX_OCR_PIXELS
+
+    shapes = []
+
+    def image_to_data(image, output_type=None, config="", **kwargs):
+        shapes.append(image.shape[:2])
+        return {"level": [5], "block_num": [1], "par_num": [1], "line_num": [1], "conf": [90], "text": ["TOTAL"]}
+
+    monkeypatch.setattr(ocr.pytesseract, "image_to_data", image_to_data)
+    # A 12 MP photo of a desk with a receipt on a twentieth of it, text 17 px high
+    receipt, _ = render_receipt(0, width=800)
+    photo = np.full((3000, 4000), 70, dtype=np.uint8)
+    photo += np.random.default_rng(0).integers(0, 20, photo.shape, dtype=np.uint8)
+    photo[900:900 + receipt.shape[0], 1700:1700 + receipt.shape[1]] = receipt
+    buffer = io.BytesIO()
+    Image.fromarray(photo).convert("RGB").save(buffer, "JPEG", quality=90)
+
+    result = OCRService(triage=False).extract(buffer.getvalue())
+    x0, y0, x1, y1 = result.preprocessing["crop"]
+    assert x0 <= 1700 and y0 <= 900 and x1 >= 2500 and y1 >= 1620
+    assert (x1 - x0) * (y1 - y0) < photo.size / 4
+    assert max(h * w for h, w in shapes) <= min(_MAX_OCR_PIXELS, (x1 - x0) * (y1 - y0) * 4)
+
+    # A huge image without measurable text is never OCR'd above the budget either
+    shapes.clear()
+    OCRService(triage=False).extract(np.full((9000, 600), 255, dtype=np.uint8))
+    assert max(h * w for h, w in shapes) <= _MAX_OCR_PIXELS
+
+
+def test_document_is_located_on_a_downscaled_copy_and_flat_scans_skipped():
+    import cv2
+    import numpy as np
+    from benchmarks.corpus import render_receipt
+    from services.ocr import _PreprocessGraph
+    from services.ocr_triage import is_flat_scan, locate_document
+
+    receipt, _ = render_receipt(0, width=800)
+    h, w = receipt.shape
+    corners = np.float32([[600, 200], [1400, 260], [1350, 1300], [650, 1250]])
+    M = cv2.getPerspectiveTransform(np.float32([[0, 0], [w, 0], [w, h], [0, h]]), corners)
+    photo = np.full((1500, 2000), 70, dtype=np.uint8)
+    mask = cv2.warpPerspective(np.full_like(receipt, 255), M, (2000, 1500)) > 0
+    photo[mask] = cv2.warpPerspective(receipt, M, (2000, 1500))[mask]
+
+    quad = locate_document(photo)
+    assert quad is not None
+    # Every true corner is within a few full resolution pixels of a found one
+    distances = np.linalg.norm(corners[:, None, :] - quad[None, :, :], axis=2)
+    assert distances.min(axis=1).max() < 8
+    assert not is_flat_scan(photo)
+
+    assert is_flat_scan(receipt) and locate_document(receipt) is None
+    graph = _PreprocessGraph(receipt)
+    assert graph.get("perspective") is receipt
+    # Corners located at another scale are reused instead of looked for again
+    graph = _PreprocessGraph(photo, document_quad=quad)
+    warped = graph.get("perspective")
+    assert "document_quad" not in graph.timings
+    assert abs(warped.shape[1] - 800) < 10 and abs(warped.shape[0] - 1045) < 10
+
+
+def test_triage_and_perspective_correction_share_one_located_border(monkeypatch):
+    import cv2
+    import numpy as np
+    from benchmarks.corpus import render_receipt
+    from services.ocr_triage import _downscale, find_document_quad, locate_document
+
+    _fake_tesseract(monkeypatch, 90)
+    # A receipt covering about 14% of the photo: above the locator's minimum
+    # area, below the 20% the border check of triage used to require
+    receipt, _ = render_receipt(0, width=800)
+    h, w = receipt.shape
+    corners = np.float32([[1000, 500], [1800, 540], [1780, 1580], [1020, 1550]])
+    M = cv2.getPerspectiveTransform(np.float32([[0, 0], [w, 0], [w, h], [0, h]]), corners)
+    photo = np.full((2100, 2800), 70, dtype=np.uint8)
+    mask = cv2.warpPerspective(np.full_like(receipt, 255), M, (2800, 2100)) > 0
+    photo[mask] = cv2.warpPerspective(receipt, M, (2800, 2100))[mask]
+    assert 0.1 < mask.mean() < 0.2
+    assert locate_document(photo) is not None and find_document_quad(_downscale(photo)) is None
+
+    result = OCRService(optimal_width=1400, scale_by_text_height=False).extract(cv2.cvtColor(photo, cv2.COLOR_GRAY2BGR))
+    assert result.triage["border"]
+    assert result.triage["route"][0] == "clahe_pro"
+    # The graph warped with the corners triage located instead of looking again
+    assert "perspective" in result.timings and "document_quad" not in result.timings
+
+
+def test_every_tesseract_call_and_result_is_instrumented(monkeypatch, tmp_path):
+    import cv2
+    import numpy as np
+    import services.ocr_metrics as ocr_metrics
+    from services.ocr_cache import OCRCache
+
+    calls = _fake_tesseract(monkeypatch, 40)
+    recorded = {"tesseract": [], "result": [], "cache": []}
+    monkeypatch.setattr(ocr_metrics, "record_tesseract", lambda psm, seconds: recorded["tesseract"].append(psm))
+    monkeypatch.setattr(ocr_metrics, "record_result", lambda result: recorded["result"].append(result))
+    monkeypatch.setattr(ocr_metrics, "record_cache", lambda hit: recorded["cache"].append(hit))
+    service = OCRService(cache=OCRCache(str(tmp_path / "cache.sqlite3")))
+    _, png = cv2.imencode(".png", np.full((200, 1000, 3), 255, dtype=np.uint8))
+
+    result = service.extract(png.tobytes())
+    assert len(recorded["tesseract"]) == len(calls) == 12
+    assert set(recorded["tesseract"]) <= {"3", "4", "6"}
+    tesseract_timings = [stage for stage in result.timings if stage.startswith("tesseract:")]
+    assert len(tesseract_timings) == 12 and "tesseract:binarize/psm 6" in tesseract_timings
+    assert {"decode", "resize"} <= set(result.timings)
+    assert recorded["result"] == [result]
+
+    # A cache hit is counted but its stages are not recorded again
+    assert service.extract(png.tobytes()).cached
+    assert recorded["cache"] == [False, True]
+    assert len(recorded["result"]) == 1
+
+
+def test_flatbed_scan_is_split_into_its_receipts():
+    import numpy as np
+    from benchmarks.corpus import render_receipt
+    from services.ocr_triage import find_receipt_regions
+
+    # Four receipts on a 200 dpi A4 scan, two per row
+    page = np.full((2339, 1654), 250, dtype=np.uint8)
+    corners = [(100, 80), (100, 900), (1000, 80), (1000, 900)]
+    for seed, (top, left) in enumerate(corners):
+        receipt, _ = render_receipt(seed, width=700)
+        region = page[top:top + receipt.shape[0], left:left + receipt.shape[1]]
+        np.minimum(region, receipt, out=region)
+
+    segments = OCRService().segment_receipts(page)
+    assert len(segments) == 4
+    # Reading order, each crop holding exactly one receipt's text
+    for segment, (top, left) in zip(segments, corners):
+        x0, y0, x1, y1 = segment.box
+        assert x0 <= left + 30 < x1 and y0 <= top + 40 < y1
+        assert x1 < left + 780 and y1 < top + 800
+        assert segment.image.shape == (y1 - y0, x1 - x0)
+
+    # Columns of a single receipt are not split apart
+    receipt, _ = render_receipt(3)
+    assert len(find_receipt_regions(receipt)) == 1
+    assert len(OCRService().segment_receipts(receipt)) == 1
+
+
+def test_pdfs_are_never_split_into_receipts(monkeypatch):
+    import services.ocr as ocr
+
+    def render(*args, **kwargs):
+        raise AssertionError("a PDF must not be rasterized for splitting")
+
+    monkeypatch.setattr(ocr, "_render_pdf_pages", render)
+    # One document whatever its pages hold; extract OCRs it whole, using the text layer
+    assert OCRService().segment_receipts(b"%PDF-1.4 two pages") == []
+
+
+def test_resolution_ladder_is_opt_in(monkeypatch):
+    from services.ocr import resolution_ladder_from_env
+    monkeypatch.delenv("OCR_RESOLUTION_LADDER", raising=False)
+    assert resolution_ladder_from_env() == []
+    assert OCRService(resolution_ladder=resolution_ladder_from_env()).resolution_ladder == (1.0,)
+    monkeypatch.setenv("OCR_RESOLUTION_LADDER", "1.0, 0.6")
+    assert OCRService(resolution_ladder=resolution_ladder_from_env()).resolution_ladder == (0.6, 1.0)
@@ -0,0 +1,127 @@
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from services.ocr_cache import OCRCache
+
+
+def test_memory_tier_is_a_bounded_lru():
+    cache = OCRCache(max_entries=2)
+    cache.use_settings("a")
+    for name in ("one", "two", "three"):
+        cache.put(cache.key(name.encode()), {"text": name})
+    assert cache.get(cache.key(b"one")) is None
+    assert cache.get(cache.key(b"three")) == {"text": "three"}
+    assert cache.stats()["memory_hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_disk_tier_survives_restart_and_is_invalidated_by_new_settings(tmp_path):
+    path = tmp_path / "ocr_cache.sqlite3"
+    cache = OCRCache(path)
+    cache.use_settings("a")
+    cache.put(cache.key(b"receipt"), {"text": "TOTAL 10.00"})
+
+    reopened = OCRCache(path)
+    reopened.use_settings("a")
+    assert reopened.get(reopened.key(b"receipt")) == {"text": "TOTAL 10.00"}
+    assert reopened.stats()["disk_hits"] == 1
+
+    changed = OCRCache(path)
+    changed.use_settings("b")
+    assert changed.get(changed.key(b"receipt")) is None
+    assert changed.stats()["disk_entries"] == 0
+
+
+def test_service_serves_repeated_uploads_from_cache(monkeypatch):
+    import cv2
+    import numpy as np
+    import services.ocr as ocr
+    from services.ocr import OCRService
+
+    calls = []
+
+    def image_to_data(image, output_type=None, config="", **kwargs):
+        calls.append(config)
+        return {"level": [5], "block_num": [1], "par_num": [1], "line_num": [1], "conf": [90], "text": ["TOTAL"]}
+
+    monkeypatch.setattr(ocr.pytesseract, "image_to_data", image_to_data)
+    png = cv2.imencode(".png", np.full((200, 1000, 3), 255, dtype=np.uint8))[1].tobytes()
+    svc = OCRService(cache=OCRCache())
+    first = svc.extract(png)
+    second = svc.extract(png)
+    assert not first.cached and second.cached
+    assert second.text == first.text == "TOTAL"
+    assert len(calls) == 1
+
+
+def test_disk_tier_drops_the_least_recently_used_and_expired_entries(tmp_path, monkeypatch):
+    import services.ocr_cache as ocr_cache
+    now = [1000.0]
+    monkeypatch.setattr(ocr_cache.time, "time", lambda: now[0])
+    cache = OCRCache(tmp_path / "ocr_cache.sqlite3", max_entries=1, max_disk_entries=2, max_age=100)
+    cache.use_settings("a")
+    for name in ("one", "two"):
+        now[0] += 1
+        cache.put(cache.key(name.encode()), {"text": name})
+    now[0] += 1
+    assert cache.get(cache.key(b"one")) == {"text": "one"}
+    now[0] += 1
+    cache.put(cache.key(b"three"), {"text": "three"})
+    # "two" was used least recently
+    assert cache.stats()["disk_entries"] == 2
+    cache.put(cache.key(b"four"), {"text": "four"})
+    assert cache.get(cache.key(b"two")) is None
+
+    now[0] += 150
+    assert cache.get(cache.key(b"three")) is None
+    cache.put(cache.key(b"five"), {"text": "five"})
+    assert cache.stats()["disk_entries"] == 1
+
+
+def test_results_cut_short_by_the_time_budget_are_not_cached(monkeypatch):
+    import cv2
+    import numpy as np
+    import services.ocr as ocr
+    from services.ocr import OCRService
+
+    def image_to_data(image, output_type=None, config="", **kwargs):
+        return {"level": [5], "block_num": [1], "par_num": [1], "line_num": [1], "conf": [40], "text": ["TOTAL"]}
+
+    monkeypatch.setattr(ocr.pytesseract, "image_to_data", image_to_data)
+    monkeypatch.setattr(ocr.pytesseract, "image_to_string", lambda image, config="", **kwargs: "TOTAL")
+    png = cv2.imencode(".png", np.full((200, 1000, 3), 255, dtype=np.uint8))[1].tobytes()
+    svc = OCRService(cache=OCRCache())
+    truncated = svc.extract(png, time_budget=0)
+    assert truncated.budget_hit and truncated.candidates_tried == 0
+    full = svc.extract(png)
+    assert not full.cached and not full.budget_hit
+    assert svc.extract(png).cached
+
+
+def test_importing_the_ocr_service_creates_no_files(tmp_path):
+    import os
+    import subprocess
+    backend = Path(__file__).parent.parent
+    subprocess.run([sys.executable, "-c", "import services.ocr, services.image_hash"], cwd=tmp_path, check=True,
+                   env={**os.environ, "PYTHONPATH": str(backend)})
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_a_failing_cache_write_does_not_fail_the_ocr(monkeypatch):
+    import sqlite3
+    import cv2
+    import numpy as np
+    import services.ocr as ocr
+    from services.ocr import OCRService
+
+    def image_to_data(image, output_type=None, config="", **kwargs):
+        return {"level": [5], "block_num": [1], "par_num": [1], "line_num": [1], "conf": [90], "text": ["TOTAL"]}
+
+    def put(key, value):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(ocr.pytesseract, "image_to_data", image_to_data)
+    svc = OCRService(cache=OCRCache())
+    monkeypatch.setattr(svc.cache, "put", put)
+    png = cv2.imencode(".png", np.full((200, 1000, 3), 255, dtype=np.uint8))[1].tobytes()
+    assert svc.extract(png).text == "TOTAL"
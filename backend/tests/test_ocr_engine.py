@@ -0,0 +1,123 @@
+import sys
+import threading
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+import numpy as np
+import services.ocr_engine as ocr_engine
+from services.ocr_engine import SubprocessEngine, TesserocrEngine, create_engine
+
+IMAGE = np.full((20, 40), 255, dtype=np.uint8)
+
+
+class _FakeTesserocr:
+    """Stands in for the tesserocr module, recording every API handle created and ended."""
+
+    def __init__(self):
+        self.created = []
+        self.ended = []
+        fake = self
+
+        class PyTessBaseAPI:
+            def __init__(self, lang="eng", oem=3, psm=3):
+                self.psm = psm
+                fake.created.append(psm)
+
+            def SetVariable(self, name, value):
+                pass
+
+            def SetImage(self, image):
+                pass
+
+            def Recognize(self, timeout=0):
+                pass
+
+            def GetUTF8Text(self):
+                return f"psm {self.psm}"
+
+            def End(self):
+                fake.ended.append(self.psm)
+
+        self.PyTessBaseAPI = PyTessBaseAPI
+
+
+def _tesserocr(monkeypatch):
+    fake = _FakeTesserocr()
+    monkeypatch.setattr(ocr_engine, "tesserocr", fake, raising=False)
+    monkeypatch.setattr(ocr_engine, "TESSEROCR_SUPPORT", True)
+    return fake
+
+
+def _in_thread(func):
+    outcome = []
+    thread = threading.Thread(target=lambda: outcome.append(func()))
+    thread.start()
+    thread.join()
+    return outcome[0]
+
+
+def test_handles_are_reused_per_config_and_evicted_least_recently_used(monkeypatch):
+    fake = _tesserocr(monkeypatch)
+    engine = TesserocrEngine(max_handles=4, handles_per_thread=2)
+    assert engine.image_to_string(IMAGE, "--psm 6") == "psm 6"
+    assert engine.image_to_string(IMAGE, "--psm 6") == "psm 6"
+    assert fake.created == [6]
+
+    engine.image_to_string(IMAGE, "--psm 3")
+    engine.image_to_string(IMAGE, "--psm 6")
+    # psm 3 is now the least recently used handle of this thread
+    engine.image_to_string(IMAGE, "--psm 4")
+    assert fake.created == [6, 3, 4]
+    assert fake.ended == [3]
+    assert list(engine._handles().apis) == ["--psm 6", "--psm 4"]
+
+
+def test_threads_beyond_the_handle_cap_fall_back_to_the_subprocess_engine(monkeypatch):
+    fake = _tesserocr(monkeypatch)
+    monkeypatch.setattr(ocr_engine.pytesseract, "image_to_string", lambda image, config="", timeout=0: "subprocess")
+    engine = TesserocrEngine(max_handles=1, handles_per_thread=2)
+    assert engine.image_to_string(IMAGE, "--psm 6") == "psm 6"
+    assert _in_thread(lambda: engine.image_to_string(IMAGE, "--psm 6")) == "subprocess"
+    # This thread's own second config cannot get a handle either
+    assert engine.image_to_string(IMAGE, "--psm 3") == "subprocess"
+    assert fake.created == [6]
+
+    # Ending the handle frees its slot for another thread
+    engine._handles().close("--psm 6")
+    assert _in_thread(lambda: engine.image_to_string(IMAGE, "--psm 3")) == "psm 3"
+
+
+def test_missing_tesserocr_falls_back_to_the_subprocess_engine(monkeypatch):
+    monkeypatch.setattr(ocr_engine, "TESSEROCR_SUPPORT", False)
+    assert isinstance(create_engine("tesserocr"), SubprocessEngine)
+
+
+def test_service_gives_every_tesseract_thread_a_handle_per_config(monkeypatch):
+    from services.ocr import OCRService
+    _tesserocr(monkeypatch)
+    svc = OCRService(engine="tesserocr", max_workers=2, pdf_workers=2, batch_workers=3)
+    # psm 6, 3 and 4 candidates plus the psm 7 ladder line pass
+    assert svc.engine.handles_per_thread == 4
+    assert svc.engine.max_handles == (2 + 2 + 3 + 1) * 4
+    assert OCRService(engine="tesserocr", max_engine_handles=5).engine.max_handles == 5
+
+
+def test_thread_limit_reaches_the_tesseract_process_env_only(monkeypatch):
+    monkeypatch.delenv("OMP_THREAD_LIMIT", raising=False)
+    pt = ocr_engine.pytesseract.pytesseract
+    # What run_tesseract would hand to Popen for this call
+    monkeypatch.setattr(ocr_engine.pytesseract, "image_to_string",
+                        lambda image, config="", timeout=0: pt.subprocess_args()["env"].get("OMP_THREAD_LIMIT"))
+    assert SubprocessEngine(thread_limit=2).image_to_string(IMAGE, "--psm 6") == "2"
+    assert _in_thread(lambda: SubprocessEngine().image_to_string(IMAGE, "--psm 6")) is None
+    assert "OMP_THREAD_LIMIT" not in ocr_engine.os.environ
+
+    monkeypatch.setenv("OMP_THREAD_LIMIT", "3")
+    assert SubprocessEngine(thread_limit=2).image_to_string(IMAGE, "--psm 6") == "3"
+
+
+def test_service_sizes_the_thread_limit_by_all_tesseract_pools(monkeypatch):
+    from services.ocr import OCRService
+    monkeypatch.setattr(ocr_engine.os, "cpu_count", lambda: 16)
+    svc = OCRService(max_workers=4, pdf_workers=2, batch_workers=2)
+    assert svc.engine.thread_limit == 2
+    assert OCRService(max_workers=8, pdf_workers=8, batch_workers=8).engine.thread_limit == 1
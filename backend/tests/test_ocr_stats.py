@@ -0,0 +1,50 @@
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from services.ocr_stats import StrategyStats
+from services.ocr import _schedule_candidates
+
+GRID = ["binarize", "otsu", "clahe", "clahe_pro"]
+CONFIGS = ["--oem 3 --psm 6", "--oem 3 --psm 3"]
+
+
+def test_historical_winner_is_scheduled_first(tmp_path):
+    stats = StrategyStats(tmp_path / "stats.json", min_samples=5, save_every=1)
+    winner = ("clahe", "--oem 3 --psm 3")
+    for _ in range(10):
+        stats.record("small|bright|normal|image", [("binarize", "--oem 3 --psm 6"), winner], winner)
+
+    schedule = _schedule_candidates(GRID, CONFIGS, stats.priors("small|bright|normal|image"))
+    assert schedule[0] == winner
+    # Other buckets keep the default order
+    assert _schedule_candidates(GRID, CONFIGS, stats.priors("large|dark|low|pdf"))[0] == ("binarize", "--oem 3 --psm 6")
+
+    reloaded = StrategyStats(tmp_path / "stats.json", min_samples=5)
+    assert reloaded.snapshot()["buckets"]["small|bright|normal|image"]["images"] == 10
+
+
+def test_candidates_that_never_win_are_losers():
+    stats = StrategyStats(prune_after=3)
+    for _ in range(3):
+        stats.record("b", [("otsu", "--psm 6"), ("binarize", "--psm 6")], ("binarize", "--psm 6"))
+    assert stats.losers("b") == {("otsu", "--psm 6")}
+
+
+def test_ladder_reruns_count_as_one_try_per_image(monkeypatch):
+    import numpy as np
+    import services.ocr as ocr
+    from services.ocr import OCRService
+
+    def image_to_data(image, output_type=None, config="", **kwargs):
+        return {"level": [5], "block_num": [1], "par_num": [1], "line_num": [1], "conf": [40], "text": ["TOTAL"]}
+
+    monkeypatch.setattr(ocr.pytesseract, "image_to_data", image_to_data)
+    stats = StrategyStats()
+    svc = OCRService(strategy_stats=stats, resolution_ladder=[0.5, 1.0], triage=False)
+    result = svc.extract(np.full((200, 1000, 3), 255, dtype=np.uint8))
+    # Every candidate ran at both scales
+    assert result.candidates_tried == 24
+    bucket = stats.snapshot()["buckets"][result.bucket]
+    assert bucket["images"] == 1
+    assert {counts["tries"] for counts in bucket["candidates"].values()} == {1}
+    assert sum(counts["wins"] for counts in bucket["candidates"].values()) == 1
@@ -52,5 +52,57 @@ class TestParserService(unittest.TestCase):
         # Invalid format
         self.assertFalse(self.parser._is_valid_gstin("INVALIDGSTIN"))
 
+    def test_parse_matches_the_reference_rules(self):
+        """
+        parse() must return exactly what the reference rules (the parser as first
+        written, line by line) return, on the receipt corpus and on random texts
+        with matches that span lines and characters that lower() and
+        case-insensitive matching treat differently.
+        """
+        import random
+        from backend.benchmarks.bench_parser import pdf_text, receipt_text
+        from backend.benchmarks.parser_reference import reference_parse
+
+        tokens = [
+            "Total:", "TOTAL", "Grand Total", "Amount Due", "net amount", "Subtotal", "Date:", "dated",
+            "15/09/2025", "3-4-25", "2025-01-31", "12", "Jan", "2025", "GSTIN", "gst no", "29AAFCT6192H1ZV",
+            "29aafct6192h1zv", "CGST", "@ 9%", "sgst", "IGST", "1,350.00", "₹99.99", "100001.00", "0.50",
+            "Invoice No", "inv no:", "INV-22", "Receipt #", "Bill No", "Cafe Mocha", "Pvt Ltd", "9983", "199912",
+            "12345678", "123456789", "_1234", "a1234", "١٢٣٤", "--", "$", "\n", "\n", "\n", "\r\n", "\x0c", "İ", "ı", "ſ",
+            "CGſT", "Tİme", "ΣΣ",
+        ]
+        rng = random.Random(0)
+        texts = [self.sample_gst_invoice_text, "", "  \n\n", "Date:\n15/09/2025", "Paid 12\nJan\n2025",
+                 "GSTIN:\n29AAFCT6192H1ZV\nCGST @ 9%:\n1,350.00", "Total\r5.00\nTotal 7.00", "İ Total 5.00\nTotal 7.00"]
+        texts.extend(receipt_text(seed) for seed in range(200))
+        texts.extend(pdf_text(seed, 10) for seed in range(10))
+        texts.extend(" ".join(rng.choice(tokens) for _ in range(rng.randint(1, 40))) for _ in range(2000))
+        for text in texts:
+            self.assertEqual(self.parser.parse(text), reference_parse(text, self.parser), repr(text))
+
+    def test_parse_many_yields_results_in_input_order(self):
+        """
+        parse_many() on a pool must yield what parse() returns, in order, from a
+        stream it reads lazily; reparse() keeps one output line per input line.
+        """
+        import io
+        import json
+        from backend.services.reparse import reparse
+
+        texts = [f"Invoice No: INV-{n}\nTotal: {n}.00\nHSN 99{n:02d} 1234" for n in range(23)]
+        expected = [self.parser.parse(text) for text in texts]
+        self.assertEqual(list(self.parser.parse_many(iter(texts), chunk_size=4, workers=2)), expected)
+        self.assertEqual(list(self.parser.parse_many(texts, workers=1)), expected)
+
+        archive = "".join(json.dumps({"id": n, "text": text}) + "\n" for n, text in enumerate(texts))
+        archive += "not json\n" + json.dumps({"id": "no text"}) + "\n"
+        sink = io.StringIO()
+        summary = reparse(io.StringIO(archive), sink, workers=2, chunk_size=5)
+        lines = [json.loads(line) for line in sink.getvalue().splitlines()]
+        self.assertEqual((summary["records"], summary["errors"]), (25, 2))
+        self.assertEqual([line["parsed"] for line in lines[:23]], expected)
+        self.assertEqual([line["id"] for line in lines[:23]], list(range(23)))
+        self.assertEqual([line["line"] for line in lines[23:]], [24, 25])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,65 @@
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+import asyncio
+import io
+import time
+import pytest
+
+
+def test_nothing_is_stored_when_the_client_disconnects_during_ocr(monkeypatch, tmp_path):
+    from fastapi import HTTPException
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from models.entities import Base, Receipt
+    from services.image_hash import DuplicateIndex
+    from services.ocr import OCRResult
+
+    # api.receipts creates its upload directory on import
+    monkeypatch.chdir(tmp_path)
+    import api.receipts as receipts
+    monkeypatch.setattr(receipts, "UPLOADS_DIR", tmp_path / "uploads")
+    receipts.UPLOADS_DIR.mkdir(exist_ok=True)
+
+    def extract(img, deadline=None, **kwargs):
+        # OCR that only stops when it is cancelled, returning what it has so far
+        started = time.monotonic()
+        while not deadline.expired() and time.monotonic() - started < 5:
+            time.sleep(0.01)
+        return OCRResult(text="TOTAL 10.00", deadline_hit=True)
+
+    monkeypatch.setattr(receipts.ocr_service, "extract", extract)
+    monkeypatch.setattr(receipts, "DISCONNECT_POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(receipts, "duplicate_index", DuplicateIndex())
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine, expire_on_commit=False)()
+
+    class Upload:
+        content_type = "image/png"
+
+        def __init__(self, filename):
+            self.filename = filename
+            self.file = io.BytesIO(b"not decoded by the fake OCR")
+
+    class Request:
+        async def is_disconnected(self):
+            return True
+
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(receipts.create_receipt(Request(), Upload("receipt.png"), fast=False, duplicates="flag",
+                                            split=False, db=db))
+    assert raised.value.status_code == 499
+
+    saved = []
+    for name in ("a.png", "b.png"):
+        path = receipts.UPLOADS_DIR / name
+        path.write_bytes(name.encode())
+        saved.append((Upload(name), path))
+    results, errors = asyncio.run(receipts.process_uploads(Request(), saved, "flag", db, False, 60))
+    assert not results
+    assert [error["error"] for error in errors] == ["Cancelled: the client disconnected"] * 2
+
+    assert db.query(Receipt).count() == 0
+    assert not list(receipts.UPLOADS_DIR.iterdir())